@@ -0,0 +1,171 @@
+# agents/fanout.py
+from agents import Agent, Runner, WebSearchTool
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+import asyncio, functools, json, os, re, time
+
+from ..utils.context import RequestContext, bind_request
+from ..utils.metrics import Histogram
+from ..utils.prompt import build_user_turn
+from ..utils.run_config import agent_model_settings, get_run_config
+from ..utils.usage import record_run
+from .orchestrator import ATLAS_MODEL
+from .pdf_agent import analyze_pdfs
+from .research_agent import research
+
+
+# Fan-out orchestration: for requests that need several independent sources
+# (attached PDFs plus the web), the branches are planned up front from the
+# request itself and run concurrently, each reporting its own progress; one
+# synthesis turn then writes the answer from the joined results. Wall time is
+# roughly the slowest branch plus the synthesis, instead of one model turn per
+# tool call in sequence.
+FANOUT_BRANCH_CHARS = int(os.getenv("ATLAS_FANOUT_BRANCH_CHARS", "6000"))
+
+BRANCH_SECONDS = Histogram("atlas_fanout_branch_seconds", "Duration of fan-out orchestration branches")
+
+# Questions that need outside information next to the documents
+WEB_CUES = re.compile(
+    r"\b(current|currently|latest|recent|today|news|industry|standards?|market|trends?|"
+    r"best practices?|competitors?|online|web|internet|20\d\d)\b",
+    re.IGNORECASE,
+)
+# Explicit requests for a multi-source investigation go to deep research instead
+RESEARCH_CUES = re.compile(r"\b(research|investigate|in-depth|comprehensive|deep dive|literature)\b", re.IGNORECASE)
+
+WEB_AGENT_INSTRUCTIONS = """
+You are a web search assistant. Search the web for the user's question and reply with
+a concise, factual summary (at most ~10 bullet points) followed by the source URLs.
+Do not ask follow-up questions.
+"""
+
+SYNTHESIS_INSTRUCTIONS = """
+You are Atlas, an assistant for document analysis and web research.
+
+The request below was split into independent branches (document analysis, web search,
+research) that have already run; their results come before the question. Write the final answer
+from those results only:
+- Combine and compare the branches where the question asks for it
+- Keep document citations as [file.pdf, p. N] and list web sources
+- If a branch failed or found nothing, say so briefly instead of guessing
+- Use markdown formatting when appropriate
+"""
+
+
+@dataclass
+class Branch:
+    name: str  # "pdf" | "web" | "research"
+    run: Callable[[], Awaitable[str]]
+    output: str = ""
+    error: Optional[str] = None
+    elapsed_ms: float = 0.0
+    detail: Dict[str, Any] = field(default_factory=dict)
+
+
+@functools.lru_cache(maxsize=None)
+def get_web_agent(model: str = ATLAS_MODEL) -> Agent:
+    """Single-turn web search agent used by the "web" branch (and the router's web tier)."""
+    return Agent(
+        name="Web_Search",
+        model=model,
+        tools=[WebSearchTool()],
+        instructions=WEB_AGENT_INSTRUCTIONS,
+        model_settings=agent_model_settings("Web_Search"),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_synthesis_agent(model: str = ATLAS_MODEL) -> Agent:
+    """Tool-less orchestrator variant that writes the joined answer."""
+    return Agent(
+        name="Atlas_Synthesis",
+        model=model,
+        instructions=SYNTHESIS_INSTRUCTIONS,
+        model_settings=agent_model_settings("Atlas_Synthesis"),
+    )
+
+
+async def _web_search(query: str) -> str:
+    agent = get_web_agent()
+    result = await Runner.run(agent, query, run_config=get_run_config())
+    record_run(agent.name, result.raw_responses)
+    return str(result.final_output or "").strip()
+
+
+def pdf_branch(query: str, doc_ids: List[str], chat_id: str, pdf_mode: Optional[str] = None) -> Branch:
+    return Branch(
+        "pdf", lambda: analyze_pdfs(doc_ids, query, mode=pdf_mode, chat_id=chat_id), detail={"doc_ids": doc_ids},
+    )
+
+
+def plan_branches(query: str, doc_ids: List[str], chat_id: str, pdf_mode: Optional[str] = None) -> List[Branch]:
+    """Independent subtasks for `query`; fan-out only pays off with two or more."""
+    branches: List[Branch] = []
+    if doc_ids:
+        branches.append(pdf_branch(query, doc_ids, chat_id, pdf_mode))
+    if RESEARCH_CUES.search(query):
+        branches.append(Branch("research", lambda: research(query)))
+    elif WEB_CUES.search(query) or not doc_ids:
+        branches.append(Branch("web", lambda: _web_search(query)))
+    return branches if len(branches) > 1 else []
+
+
+async def run_branches(branches: List[Branch], ctx: RequestContext) -> AsyncIterator[Dict[str, Any]]:
+    """Run all branches concurrently, yielding progress events as each starts and ends.
+
+    A failing branch is recorded on its Branch (the others keep going); the
+    synthesis turn is told about it. Leftover branches are cancelled if the
+    consumer stops early (client disconnect).
+    """
+    async def _run(branch: Branch) -> Branch:
+        bind_request(ctx)  # this task's own context: tools see chat_id / pdf_mode
+        started = time.perf_counter()
+        try:
+            branch.output = await branch.run()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            branch.error = f"{type(e).__name__}: {e}"
+        branch.elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        BRANCH_SECONDS.observe(branch.elapsed_ms / 1000, branch=branch.name)
+        return branch
+
+    tasks = [asyncio.create_task(_run(branch)) for branch in branches]
+    started = time.perf_counter()
+    try:
+        for branch in branches:
+            yield {"type": "branch", "branch": branch.name, "status": "started", **branch.detail}
+        for next_done in asyncio.as_completed(tasks):
+            branch = await next_done
+            event = {"type": "branch", "branch": branch.name, "elapsed_ms": branch.elapsed_ms}
+            if branch.error:
+                event.update(status="error", error=branch.error)
+            else:
+                event.update(status="done", chars=len(branch.output))
+            yield event
+        yield {
+            "type": "fanout",
+            "status": "joined",
+            "branches": len(branches),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            "sequential_ms": round(sum(b.elapsed_ms for b in branches), 1),
+        }
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+def synthesis_input(question: str, doc_context: str, branches: List[Branch]) -> str:
+    """The turn handed to the synthesis agent: documents, each branch's result
+    (in plan order), then the question last."""
+    parts = ["Branch results (already gathered; answer from these):"]
+    for branch in branches:
+        if branch.error:
+            body = json.dumps({"success": False, "error": branch.error})
+        else:
+            body = branch.output
+            if len(body) > FANOUT_BRANCH_CHARS:
+                body = body[:FANOUT_BRANCH_CHARS] + "…"
+        parts.append(f"#### {branch.name}\n{body}")
+    return build_user_turn(question, doc_context, "\n\n".join(parts))
@@ -0,0 +1,61 @@
+import os
+import asyncio
+import threading
+from typing import Any, Optional
+
+from ..utils.logs import get_logger
+
+
+# Importing the Agents SDK (and the OpenAI client it pulls in) dominates cold
+# start, so backend.app does not import the agent modules at import time.
+#  - "eager": load and build the agents while the app module is imported
+#  - "warm":  start loading in a background thread at startup; requests that
+#             arrive first wait for it only when they reach the agent run
+#  - "lazy":  load on the first chat request
+STARTUP_MODES = ("eager", "warm", "lazy")
+STARTUP_MODE = os.getenv("ATLAS_STARTUP_MODE", "warm").strip().lower()
+if STARTUP_MODE not in STARTUP_MODES:
+    STARTUP_MODE = "warm"
+
+log = get_logger(__name__)
+
+_lock = threading.Lock()
+_atlas_agent: Optional[Any] = None
+
+
+def agent_graph_loaded() -> bool:
+    return _atlas_agent is not None
+
+
+def load_agent_graph() -> Any:
+    """Import the SDK and build the orchestrator with its sub-agents (blocking)."""
+    global _atlas_agent
+    if _atlas_agent is not None:
+        return _atlas_agent
+    with _lock:
+        if _atlas_agent is None:
+            from .orchestrator import get_atlas_agent
+            from . import router  # noqa: F401  (tier agents used by the first requests)
+            _atlas_agent = get_atlas_agent()
+    return _atlas_agent
+
+
+async def get_agent_graph() -> Any:
+    """The orchestrator agent, loading it off the event loop on first use."""
+    if _atlas_agent is not None:
+        return _atlas_agent
+    return await asyncio.to_thread(load_agent_graph)
+
+
+def start_warmup() -> Optional["asyncio.Task[Any]"]:
+    """Begin loading in the background (warm mode); returns the task, if any."""
+    if STARTUP_MODE != "warm" or _atlas_agent is not None:
+        return None
+
+    async def _warm() -> None:
+        try:
+            await get_agent_graph()
+        except Exception as e:
+            log.warning("agent warm-up failed (will retry on first request): %s", e)
+
+    return asyncio.create_task(_warm())
@@ -1,23 +1,23 @@
 import asyncio
+import functools
 import json
 from uuid import uuid4
 
 from anyio import run_process
-from dotenv import load_dotenv
 
 # OpenAI Agents SDK
 from agents import Agent, Runner, SQLiteSession, function_tool, WebSearchTool
 from typing import Dict, Any
 
-from .research_agent import run_research, research_agent
-from .pdf_agent import run_pdf_analysis
-load_dotenv()
+from .research_agent import get_research_handoff, run_research
+from .pdf_agent import run_multi_pdf_analysis, run_pdf_analysis
+from ..utils.run_config import agent_model_settings, get_run_config
 
 
 
-atlas_agent = Agent(
-    name="AtlasAssistant",
-    instructions="""
+ATLAS_MODEL = "gpt-4.1"
+
+ATLAS_INSTRUCTIONS = """
         You are Atlas, an intelligent assistant that specializes in document analysis and research.
 
         **Core Capabilities:**
@@ -35,16 +35,19 @@ atlas_agent = Agent(
            - Include relevant sources when possible
 
         **How to Use Tools and Handoffs:**
-        - For PDF-related requests: Use the analyze_pdf tool to process document content
-        - For research requests: Handoff to the research_agent
+        - For PDF-related requests: call run_pdf_analysis(doc_id, query) with the doc_id listed next to the document
+        - Never paste document text into tool arguments; the server already holds each document under its doc_id
+        - When a question spans several attached documents, call run_multi_pdf_analysis(doc_ids, query) once instead of one run_pdf_analysis per document, and keep its [document, p. N] citations
+        - PDF content arrives as the most relevant excerpts, tagged like [file.pdf, p. 3]; cite those page references
+        - For research requests: Use the run_research tool (results for repeated questions are cached and shared)
         - For simple web searches: Use WebSearchTool directly
         - Ask clarifying questions when user intent is unclear
 
-        **When to Use Handoffs:**
-        - Use research_agent handoff for complex research tasks that require multiple sources
-        - Use research_agent handoff for questions that need comprehensive analysis
-        - Use research_agent handoff when the user asks for research or investigation
-        - Use research_agent handoff when you need deep analysis with web browsing capabilities
+        **When to Use run_research vs. Handoffs:**
+        - Use run_research for complex research tasks that require multiple sources
+        - Use run_research for questions that need comprehensive analysis
+        - Use run_research when the user asks for research or investigation
+        - Use the research_agent handoff only when the user wants to continue an interactive deep-research conversation
 
         **Response Guidelines:**
         - Provide clear, well-structured responses
@@ -54,11 +57,20 @@ atlas_agent = Agent(
         - Be objective and evidence-based in your findings
 
         When users ask what you do, explain that you're Atlas - an AI assistant for document analysis and web research.
-    """,
-    model="gpt-4.1",
-    tools=[run_pdf_analysis, WebSearchTool()],
-    handoffs=[research_agent]
-)
+    """
+
+
+@functools.lru_cache(maxsize=None)
+def get_atlas_agent() -> Agent:
+    """Build the orchestrator (and its sub-agents) once, on first use."""
+    return Agent(
+        name="AtlasAssistant",
+        instructions=ATLAS_INSTRUCTIONS,
+        model_settings=agent_model_settings("AtlasAssistant"),
+        model=ATLAS_MODEL,
+        tools=[run_pdf_analysis, run_multi_pdf_analysis, run_research, WebSearchTool()],
+        handoffs=[get_research_handoff()],
+    )
 
 def create_ephemeral_session() -> SQLiteSession:
     """Create a fresh session so no prior memory is included.
@@ -72,7 +84,9 @@ def create_ephemeral_session() -> SQLiteSession:
 async def stream_agent(user_text: str):
     # Fallback streaming helper if needed elsewhere; uses a new session per call
     ephemeral_session = create_ephemeral_session()
-    streamed = Runner.run_streamed(atlas_agent, input=user_text, session=ephemeral_session)
+    streamed = Runner.run_streamed(
+        get_atlas_agent(), input=user_text, session=ephemeral_session, run_config=get_run_config()
+    )
 
     async for event in streamed.stream_events():
         yield event
@@ -1,23 +1,30 @@
 # agents/pdf_agent.py
 from agents import Agent, function_tool, Runner, SQLiteSession
-from typing import Dict, Any, List
-from dotenv import load_dotenv
-import json, re, uuid
-
-load_dotenv()
-
-# Define the agent first (tools attached after the function tool is defined)
-pdf_agent = Agent(
-    name="PDF_Analyzer",
-    model="gpt-4.1",
-    tools=[],  # attach later per request
-    instructions="""
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio, functools, json, os, time, uuid
+
+from ..utils.analysis_cache import analysis_cache
+from ..utils.chunks import retrieve_context
+from ..utils.context import PDF_MODE_DIRECT, current_request, emit_event, resolve_pdf_mode
+from ..utils.documents import Document, document_registry
+from ..utils.retrieval import get_sentence_index
+from ..utils.run_config import agent_model_settings, get_run_config
+from ..utils.usage import record_run
+
+
+# Documents analyzed at once by run_multi_pdf_analysis (nested agent turns or analyzer threads)
+MULTI_DOC_CONCURRENCY = int(os.getenv("ATLAS_MULTI_DOC_CONCURRENCY", "4"))
+MULTI_DOC_KEY_POINTS = 12
+
+# Agent instructions; the agent itself is built on first use (see get_pdf_agent)
+PDF_AGENT_INSTRUCTIONS = """
 You are a specialized PDF analysis agent.
 
 WORKFLOW
-1) Read the provided PDF text (already extracted) and the user's query.
+1) Read the provided PDF excerpts (already extracted), the document's doc_id and the user's query.
 2) Identify the most relevant sentences and core facts that answer the query.
-3) Call analyze_pdf_content(pdf_text=<full_text>, user_query="<query>") EXACTLY ONCE.
+3) Call analyze_pdf_content(doc_id="<doc_id>", user_query="<query>") EXACTLY ONCE.
+   Pass the doc_id only; the server holds the document text.
    This is the FINAL step; the tool returns the final JSON payload.
 
 CONSTRAINTS
@@ -25,40 +32,17 @@ CONSTRAINTS
 - Avoid meta-instructions. After calling the tool, do not send further messages.
 - If information is not present, say so explicitly in the final JSON and avoid hallucinating.
 """
-)
 
 # -------------------------
 # Tools (defined below agent)
 # -------------------------
 
-@function_tool
-def analyze_pdf_content(pdf_text: str, user_query: str) -> str:
-    """
-    TERMINAL step: deterministic summarization of PDF text relative to a query.
-    Produces the final JSON payload expected by the caller.
-    """
-    # naive keyword extraction from the query
-    q = (user_query or "").lower()
-    tokens = re.findall(r"[a-zA-Z0-9]+", q)
-    keywords = {t for t in tokens if len(t) >= 3}
+def _summarize(index, user_query: str, content_len: int) -> Dict[str, Any]:
+    hits = index.search(user_query or "", top_k=8)
 
-    # split into rough sentences
-    text = (pdf_text or "")
-    content_len = len(text)
-    raw_sents = re.split(r"(?<=[.!?])\s+", text.strip())
-    sents = [s.strip() for s in raw_sents if s.strip()]
-
-    # score sentences by keyword hits
-    scored: List[tuple[int, str]] = []
-    for s in sents:
-        low = s.lower()
-        score = sum(1 for k in keywords if k in low)
-        if score > 0 or not keywords:
-            scored.append((score, s))
-
-    # choose top sentences; if no keywords, fall back to first few
-    scored.sort(key=lambda x: (-x[0], len(x[1])))
-    top = [s for _, s in (scored[:8] if scored else sents[:6])]
+    # choose top-ranked sentences; if nothing matches, fall back to the opening sentences
+    uids = [uid for _, uid, _ in hits] if hits else list(range(min(6, len(index.units))))
+    top = [index.units[uid] for uid in uids]
 
     # helpers
     def tcut(s: str, n=240):
@@ -72,9 +56,9 @@ def analyze_pdf_content(pdf_text: str, user_query: str) -> str:
     if not answer:
         answer = "The provided PDF text contains insufficient information to answer the query."
 
-    confidence = "high" if scored and scored[0][0] >= 2 else ("medium" if scored else "low")
+    confidence = "high" if hits and hits[0][2] >= 2 else ("medium" if hits else "low")
 
-    result = {
+    return {
         "success": True if key_points else False,
         "query": user_query,
         "content_length": content_len,
@@ -82,29 +66,166 @@ def analyze_pdf_content(pdf_text: str, user_query: str) -> str:
         "key_points": key_points,
         "evidence": evidence,
         "confidence": confidence,
-        "status": "final"
+        "status": "final",
+        "_uids": uids[:8],
     }
 
-    return json.dumps(result)
 
-# Attach tool after definition (per your request that the @function_tool be below the agent)
-pdf_agent.tools = [analyze_pdf_content]
+def analyze_text(pdf_text: str, user_query: str, cache_index: bool = True) -> Dict[str, Any]:
+    """
+    Deterministic summarization of PDF text relative to a query.
+    Plain function so it can also run on partially extracted documents
+    (pass cache_index=False for those).
+    """
+    text = (pdf_text or "")
+    # BM25 over a sentence index that is built once per document and reused
+    result = _summarize(get_sentence_index(text, cache=cache_index), user_query, len(text))
+    result.pop("_uids")
+    return result
+
+
+def analyze_document(doc: Document, user_query: str) -> Dict[str, Any]:
+    """analyze_text over a registered document, with page-tagged citations."""
+    index = doc.index
+    result = _summarize(index, user_query, sum(len(p) for p in doc.pages))
+    uids = result.pop("_uids")
+    result["doc_id"] = doc.doc_id
+    result["document"] = doc.name
+    result["citations"] = [
+        {"doc_id": doc.doc_id, "document": doc.name, "page": index.pages[uid], "text": point}
+        for uid, point in zip(uids, result["key_points"])
+    ]
+    return result
+
+
+def _lookup(doc_id: str, chat_id: Optional[str] = None) -> Tuple[Optional[Document], str]:
+    if chat_id is None:
+        ctx = current_request()
+        chat_id = ctx.chat_id if ctx else "default"
+    return document_registry.get(chat_id, doc_id), chat_id
+
+
+def _unknown_document(doc_id: str, query: str, chat_id: str) -> str:
+    available = [doc.describe() for doc in document_registry.list(chat_id)]
+    return json.dumps({
+        "success": False,
+        "query": query,
+        "error": f"Unknown doc_id {doc_id!r}; use one of the doc_ids listed with the attached documents.",
+        "available_documents": available,
+        "status": "final",
+    })
+
+
+@function_tool
+def analyze_pdf_content(doc_id: str, user_query: str) -> str:
+    """
+    TERMINAL step: deterministic summarization of a registered PDF relative to a query.
+    Produces the final JSON payload expected by the caller.
+
+    Args:
+        doc_id: Document handle from the task (e.g. "doc_1a2b3c4d").
+        user_query: The user's question about the document.
+    """
+    doc, chat_id = _lookup(doc_id)
+    if doc is None:
+        return _unknown_document(doc_id, user_query, chat_id)
+    out = analysis_cache.get(doc.cache_key, user_query, PDF_MODE_DIRECT)
+    if out is not None:
+        return _restamp(out, doc, user_query)
+    out = json.dumps(analyze_document(doc, user_query))
+    analysis_cache.put(doc.cache_key, user_query, PDF_MODE_DIRECT, out)
+    return out
+
+@functools.lru_cache(maxsize=None)
+def get_pdf_agent() -> Agent:
+    """Build PDF_Analyzer once, on first use, with its terminal tool attached."""
+    return Agent(
+        name="PDF_Analyzer",
+        model="gpt-4.1",
+        tools=[analyze_pdf_content],
+        instructions=PDF_AGENT_INSTRUCTIONS,
+        model_settings=agent_model_settings("PDF_Analyzer"),
+    )
 
 @function_tool(name_override="run_pdf_analysis")
-async def run_pdf_analysis(pdf_text: str, query: str) -> str:
+async def run_pdf_analysis(doc_id: str, query: str) -> str:
     """
-    Runs PDF_Analyzer: the agent will call analyze_pdf_content exactly once and stop.
-    Returns the final JSON string produced by the tool.
+    Analyze an attached PDF. Pass its doc_id (never the document text) and the question.
+    Returns the final JSON payload, with page-tagged citations.
+
+    Args:
+        doc_id: Document handle shown with the attached document (e.g. "doc_1a2b3c4d").
+        query: The question to answer from the document.
     """
+    return await analyze_pdf(doc_id, query)
+
+
+async def analyze_pdf(doc_id: str, query: str, mode: Optional[str] = None, chat_id: Optional[str] = None) -> str:
+    """
+    Shared implementation of run_pdf_analysis. Documents are resolved from the
+    server-side registry by `doc_id`, so text never travels through model
+    output. In "direct" mode the analysis engine runs in-process (no nested
+    agent turn); "agent" mode keeps the PDF_Analyzer round-trip. Mode
+    defaults to the current request's pdfMode. Results are memoized per
+    (document key, normalized query text, mode) in utils/analysis_cache.py.
+    """
+    doc, chat_id = _lookup(doc_id, chat_id)
+    if doc is None:
+        return _unknown_document(doc_id, query, chat_id)
+    if mode is None:
+        ctx = current_request()
+        mode = ctx.pdf_mode if ctx else None
+    mode = resolve_pdf_mode(mode)
+
+    # Same document + same question (after normalization) -> stored payload
+    cached = analysis_cache.get(doc.cache_key, query, mode)
+    if cached is not None:
+        emit_event({"type": "analysis_cache", "status": "hit", "doc_id": doc.doc_id, "query": query})
+        return _restamp(cached, doc, query)
+    out = await _analyze_uncached(doc, query, mode)
+    analysis_cache.put(doc.cache_key, query, mode, out)
+    return out
+
+
+def pdf_task(doc: Document, query: str, context: str) -> str:
+    # Document context first, the query last: repeat questions about one
+    # document share the longest possible byte-identical prompt prefix
+    return (f"Document: {doc.name} (doc_id: {doc.doc_id})\nRelevant PDF excerpts follow:\n\n{context}"
+            f"\n\nUser query: {query}")
+
+
+def _restamp(payload: str, doc: Document, query: str) -> str:
+    # Cached by content and normalized query, so the same file may have been
+    # uploaded under another name and the question worded slightly differently
+    data = json.loads(payload)
+    if data.get("document") == doc.name and data.get("query", query) == query:
+        return payload
+    data["document"] = doc.name
+    if "query" in data:
+        data["query"] = query
+    for cite in data.get("citations") or []:
+        cite["document"] = doc.name
+    return json.dumps(data)
+
+
+async def _analyze_uncached(doc: Document, query: str, mode: str) -> str:
+    if mode == PDF_MODE_DIRECT:
+        return json.dumps(await asyncio.to_thread(analyze_document, doc, query))
+
     session = SQLiteSession(f"pdf_session_{uuid.uuid4().hex}")
-    # Safety cap to prevent huge prompts; the tool also avoids echoing everything back.
-    task = f"User query: {query}\nPDF text follows:\n\n{(pdf_text or '')[:200000]}"
+    # Send only the chunks relevant to the query (under a token budget); the
+    # nested agent answers by handle, so it never re-emits these excerpts.
+    context = await asyncio.to_thread(retrieve_context, doc.pages, query, doc.name, doc.sha256)
+    task = pdf_task(doc, query, context)
 
+    agent = get_pdf_agent()
     result = await Runner.run(
-        pdf_agent,
+        agent,
         task,
-        session=session
+        session=session,
+        run_config=get_run_config(),
     )
+    record_run(agent.name, result.raw_responses)
 
     out = (result.final_output or "").strip()
     try:
@@ -115,10 +236,104 @@ async def run_pdf_analysis(pdf_text: str, query: str) -> str:
         return json.dumps({
             "success": False,
             "query": query,
-            "content_length": len(pdf_text or ""),
+            "doc_id": doc.doc_id,
+            "document": doc.name,
+            "content_length": sum(len(p) for p in doc.pages),
             "answer": out[:1500],
             "key_points": [],
             "evidence": [],
+            "citations": [],
             "confidence": "low",
             "status": "final"
-        })
\ No newline at end of file
+        })
+
+
+def _cite(point: Dict[str, Any]) -> str:
+    return f"{point['text']} [{point['document']}, p. {point['page']}]"
+
+
+def merge_results(results: List[Dict[str, Any]], query: str, max_points: int = MULTI_DOC_KEY_POINTS) -> Dict[str, Any]:
+    """Merge per-document payloads, keeping each document's own ranking.
+
+    BM25 scores are not comparable across documents, so key points are
+    interleaved by rank (every document's best point first) rather than
+    re-sorted; each point keeps its document and page.
+    """
+    ranked = [r for r in results if r.get("success")]
+    ranked.sort(key=lambda r: ("high", "medium", "low").index(r.get("confidence", "low")))
+    citations: List[Dict[str, Any]] = []
+    depth = max((len(r.get("citations") or []) for r in ranked), default=0)
+    for rank in range(depth):
+        for r in ranked:
+            cites = r.get("citations") or []
+            if rank < len(cites):
+                citations.append(cites[rank])
+    citations = citations[:max_points]
+
+    sections = [
+        f"{r.get('document') or r.get('doc_id')}: " + " ".join(_cite(c) for c in (r.get("citations") or [])[:2])
+        for r in ranked if r.get("citations")
+    ]
+    confidences = [r.get("confidence", "low") for r in ranked]
+    return {
+        "success": bool(citations),
+        "query": query,
+        "documents": [
+            {k: r.get(k) for k in ("doc_id", "document", "success", "confidence", "answer", "elapsed_ms", "error")}
+            for r in results
+        ],
+        "answer": "\n".join(sections)[:3000] or "None of the documents contain information relevant to the query.",
+        "key_points": [_cite(c) for c in citations],
+        "citations": citations,
+        "confidence": confidences[0] if confidences else "low",
+        "status": "final",
+    }
+
+
+async def analyze_pdfs(doc_ids: List[str], query: str, mode: Optional[str] = None,
+                       chat_id: Optional[str] = None, limit: int = MULTI_DOC_CONCURRENCY) -> str:
+    """Analyze several registered documents concurrently and merge the results.
+
+    Each document goes through analyze_pdf on its own (so "agent" mode runs
+    one nested turn per document), at most `limit` at a time; wall time
+    tracks the slowest document rather than the sum.
+    """
+    if chat_id is None:
+        ctx = current_request()
+        chat_id = ctx.chat_id if ctx else "default"
+    if not doc_ids:
+        doc_ids = [doc.doc_id for doc in document_registry.list(chat_id)]
+    doc_ids = list(dict.fromkeys(doc_ids))
+    semaphore = asyncio.Semaphore(max(limit, 1))
+
+    async def one(doc_id: str) -> Dict[str, Any]:
+        async with semaphore:
+            started = time.perf_counter()
+            out = await analyze_pdf(doc_id, query, mode=mode, chat_id=chat_id)
+        try:
+            result = json.loads(out)
+        except ValueError:
+            result = {"success": False, "doc_id": doc_id, "answer": out[:1500]}
+        result.setdefault("doc_id", doc_id)
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(doc_id) for doc_id in doc_ids))
+    merged = merge_results(list(results), query)
+    merged["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return json.dumps(merged)
+
+
+@function_tool(name_override="run_multi_pdf_analysis")
+async def run_multi_pdf_analysis(doc_ids: List[str], query: str) -> str:
+    """
+    Analyze several attached PDFs at once for the same question. Each document is
+    analyzed concurrently and ranked on its own; the merged answer cites the
+    document and page of every key point.
+
+    Args:
+        doc_ids: Document handles to analyze; pass an empty list for every document in the chat.
+        query: The question to answer from the documents.
+    """
+    return await analyze_pdfs(doc_ids, query)
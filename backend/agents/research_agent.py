@@ -1,19 +1,28 @@
 
 # agents/research_agent.py
-from agents import Agent, function_tool, WebSearchTool, Runner, SQLiteSession
+from agents import Agent, RunContextWrapper, function_tool, handoff, Handoff, WebSearchTool, Runner, SQLiteSession
 from typing import Dict, Any, List
 from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
-from dotenv import load_dotenv
-import json, uuid
+import functools, json, os, re, uuid
 
-load_dotenv()
+from ..utils.cache import LRUCache, SingleFlight
+from ..utils.context import current_request, emit_event
+from ..utils.run_config import agent_model_settings, get_run_config
+from ..utils.scheduler import run_scheduler
+from ..utils.usage import record_run
 
 
-research_agent = Agent(
-    name="Research_Assistant",
-    model="o4-mini-deep-research",
-    tools=["web_search_preview"],
-    instructions="""
+# Deep research runs take minutes: identical (query, focus_area) pairs are
+# served from a TTL'd LRU, and concurrent identical requests share one run.
+RESEARCH_CACHE_TTL_S = float(os.getenv("ATLAS_RESEARCH_CACHE_TTL_S", "1800"))
+RESEARCH_CACHE_SIZE = int(os.getenv("ATLAS_RESEARCH_CACHE_SIZE", "256"))
+RESEARCH_MODEL = os.getenv("ATLAS_RESEARCH_MODEL", "o4-mini-deep-research")
+
+research_cache: LRUCache[str] = LRUCache(max_items=RESEARCH_CACHE_SIZE, ttl_s=RESEARCH_CACHE_TTL_S)
+research_flight = SingleFlight()
+
+
+RESEARCH_AGENT_INSTRUCTIONS = """
     You are a Deep Research agent.
 
     WORKFLOW
@@ -33,40 +42,120 @@ research_agent = Agent(
 
     When you are done, write END OF RESEARCH. 
     """
-)
 
 
+@functools.lru_cache(maxsize=None)
+def get_research_agent() -> Agent:
+    """Build the Deep Research agent once, on first use."""
+    return Agent(
+        name="Research_Assistant",
+        model=RESEARCH_MODEL,
+        tools=[WebSearchTool()],
+        instructions=RESEARCH_AGENT_INSTRUCTIONS,
+        model_settings=agent_model_settings("Research_Assistant"),
+    )
+
+
+async def _hold_research_slot(_ctx: RunContextWrapper[Any]) -> None:
+    # The rest of the streamed run happens on the research model: hold its
+    # slot until the request ends (released by the chat endpoint)
+    model = get_research_agent().model
+    await run_scheduler.acquire_model(model)
+    ctx = current_request()
+    if ctx is not None:
+        ctx.held_models.append(model)
+    else:
+        run_scheduler.release_model(model)
+
+
+@functools.lru_cache(maxsize=None)
+def get_research_handoff() -> Handoff:
+    """The orchestrator's handoff to the research agent, gated on a research-model slot."""
+    return handoff(get_research_agent(), on_handoff=_hold_research_slot)
+
 
 # -------------------------------
 # Orchestrator-callable wrapper
 # -------------------------------
+def research_key(query: str, focus_area: str = "") -> str:
+    """Normalized cache key: case, punctuation and whitespace insensitive."""
+    def norm(text: str) -> str:
+        return " ".join(re.findall(r"[a-z0-9]+", (text or "").lower()))
+    return f"{norm(query)}|{norm(focus_area)}"
+
+
 @function_tool(name_override="run_research")
 async def run_research(query: str, focus_area: str = "", max_steps: int = 20) -> str:
     """
     Runs the Deep Research agent and returns the final JSON string
     produced by summarize_research.
     """
+    return await research(query, focus_area)
+
+
+async def research(query: str, focus_area: str = "") -> str:
+    """Cached, single-flight deep research (shared by run_research and fan-out)."""
+    key = research_key(query, focus_area)
+    cached = research_cache.get(key)
+    if cached is not None:
+        emit_event({"type": "research_cache", "status": "hit", "query": query})
+        return cached
+
+    emit_event({
+        "type": "research_cache",
+        "status": "shared" if research_flight.in_flight(key) else "miss",
+        "query": query,
+    })
+    out, _shared = await research_flight.do(key, lambda: _run_research(query, focus_area, key))
+    return out
+
+
+async def _run_research(query: str, focus_area: str, key: str) -> str:
     session = SQLiteSession(f"research_session_{uuid.uuid4().hex}")
     task = f"User query: {query}\nFocus area: {focus_area or '(general)'}"
 
     # Deep Research can plan and browse on its own; we just cap steps.
-    result = await Runner.run(
-        research_agent,
-        task,
-        session=session
-    )
+    # The per-model slot caps concurrent deep-research runs across requests.
+    agent = get_research_agent()
+    async with run_scheduler.model_slot(agent.model):
+        result = await Runner.run(
+            agent,
+            task,
+            session=session,
+            run_config=get_run_config(),
+        )
+    record_run(agent.name, result.raw_responses)
 
     out = (result.final_output or "").strip()
+    payload = research_payload(query, focus_area, out)
+    if json.loads(payload).get("success", True):
+        research_cache.put(key, payload)  # any non-empty result is reused
+    return payload
+
+
+_URL_RE = re.compile(r"https?://[^\s)\]>\"']+")
+
+
+def research_payload(query: str, focus_area: str, out: str) -> str:
+    """The agent's output as the JSON payload tools return.
+
+    JSON output is passed through; free text (the agent ends with
+    "END OF RESEARCH" rather than a structured call) is wrapped, with the
+    URLs it cites as sources.
+    """
     try:
-        json.loads(out)  # ensure JSON
-        return out
-    except Exception:
-        return json.dumps({
-            "success": False,
-            "query": query,
-            "focus_area": focus_area,
-            "answer": out[:1500],
-            "key_insights": [],
-            "sources": [],
-            "status": "final"
-        })
\ No newline at end of file
+        if isinstance(json.loads(out), dict):
+            return out
+    except ValueError:
+        pass
+    answer = re.sub(r"\s*END OF RESEARCH\.?\s*$", "", out, flags=re.IGNORECASE).strip()
+    sources = list(dict.fromkeys(url.rstrip(".,;:") for url in _URL_RE.findall(answer)))
+    return json.dumps({
+        "success": bool(answer),
+        "query": query,
+        "focus_area": focus_area,
+        "answer": answer,
+        "key_insights": [],
+        "sources": sources,
+        "status": "final"
+    })
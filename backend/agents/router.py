@@ -0,0 +1,164 @@
+# agents/router.py
+from agents import Agent
+from dataclasses import dataclass
+from typing import Any, Dict, List
+import functools, os, re
+
+from ..utils.metrics import Counter, Histogram
+from ..utils.run_config import agent_model_settings
+from .fanout import RESEARCH_CUES, WEB_CUES
+from .orchestrator import ATLAS_MODEL
+
+
+# Local pre-routing: each request is classified with cheap heuristics (no
+# model call) into a latency tier before any agent runs. Simple tiers skip the
+# orchestrator's tool-planning turn:
+#  - "trivial":  greetings / "what can you do?"  -> one small-model turn, no tools
+#  - "pdf":      questions about attached documents -> server-side analysis, then
+#                one answer turn (no tool-call round-trip)
+#  - "web":      quick current-information lookups -> single web-search agent turn
+#  - "research": explicit investigations -> full orchestrator (run_research / handoff)
+#  - "general":  everything else, incl. mixed document + web questions -> full orchestrator
+TIER_TRIVIAL = "trivial"
+TIER_PDF = "pdf"
+TIER_WEB = "web"
+TIER_RESEARCH = "research"
+TIER_GENERAL = "general"
+TIERS = (TIER_TRIVIAL, TIER_PDF, TIER_WEB, TIER_RESEARCH, TIER_GENERAL)
+
+TIER_MODELS: Dict[str, str] = {
+    TIER_TRIVIAL: "gpt-4.1-nano",
+    TIER_PDF: "gpt-4.1-mini",
+    TIER_WEB: "gpt-4.1-mini",
+    TIER_RESEARCH: ATLAS_MODEL,
+    TIER_GENERAL: ATLAS_MODEL,
+}
+# Target end-to-end latency per tier; requests over budget are counted
+TIER_BUDGETS_MS: Dict[str, float] = {
+    TIER_TRIVIAL: 1500.0,
+    TIER_PDF: 5000.0,
+    TIER_WEB: 10000.0,
+    TIER_RESEARCH: 600000.0,
+    TIER_GENERAL: 30000.0,
+}
+# e.g. ATLAS_ROUTE_MODELS="trivial=gpt-4.1-mini,pdf=gpt-4.1" ATLAS_ROUTE_BUDGETS_MS="trivial=1000"
+for _pair in filter(None, os.getenv("ATLAS_ROUTE_MODELS", "").split(",")):
+    _tier, _, _value = _pair.partition("=")
+    if _tier.strip() in TIER_MODELS and _value.strip():
+        TIER_MODELS[_tier.strip()] = _value.strip()
+for _pair in filter(None, os.getenv("ATLAS_ROUTE_BUDGETS_MS", "").split(",")):
+    _tier, _, _value = _pair.partition("=")
+    try:
+        if _tier.strip() in TIER_BUDGETS_MS:
+            TIER_BUDGETS_MS[_tier.strip()] = float(_value)
+    except ValueError:
+        pass
+
+ROUTE_SECONDS = Histogram("atlas_route_seconds", "End-to-end /api/chat latency by routing tier")
+ROUTE_OVER_BUDGET = Counter("atlas_route_over_budget_total", "Requests slower than their tier's latency budget")
+
+TRIVIAL_MAX_WORDS = 12
+_TRIVIAL_PHRASE = (
+    r"(hi|hello|hey|yo|thanks|thank you|thx|ok|okay|cool|great|bye|goodbye|good (morning|afternoon|evening)|"
+    r"how are you|who are you|what are you|what can you do|what do you do|help|what is atlas)"
+    r"(\s+(there|atlas|all|so much|a lot|very much|again|for that|for your help|doing|today))*"
+)
+# The whole message must be small talk: "Hi, can you summarize the contract?" is not trivial
+_TRIVIAL_RE = re.compile(
+    rf"\s*{_TRIVIAL_PHRASE}([\s,!.?:;)-]+{_TRIVIAL_PHRASE})*[\s,!.?:;)-]*",
+    re.IGNORECASE,
+)
+
+# Follow-up turns (documents registered earlier, none attached now) only go to
+# the pdf tier when the question points at the documents; anything else keeps
+# the full orchestrator and its tools
+DOC_REFERENCE_CUES = re.compile(
+    r"\b(the|this|that|these|those|attached|uploaded|my|your|each|both)\s+"
+    r"(pdfs?|documents?|docs?|files?|attachments?|papers?|reports?|contracts?|agreements?|slides?|pages?)\b|"
+    r"\b(page|p\.|section|clause|chapter|table|figure)\s*\d+|\b(doc_[0-9a-f]+|excerpts?)\b",
+    re.IGNORECASE,
+)
+# Requests to produce something (e.g. "generate my resume as a PDF") need the orchestrator's tools
+_GENERATE_RE = re.compile(r"^\s*(please\s+)?(generate|create|make|build|write|draft|export|produce)\b", re.IGNORECASE)
+
+TRIVIAL_INSTRUCTIONS = """
+You are Atlas, an assistant for document analysis and web research. Users can attach PDFs
+and ask questions about them, ask for current information from the web, or request
+in-depth research. Reply briefly and helpfully to greetings, thanks and questions about
+what you can do. Do not invent facts; if the message needs documents or research, say
+what the user can send or ask.
+"""
+
+
+@dataclass
+class Route:
+    tier: str
+    model: str
+    budget_ms: float
+    reason: str
+
+    def to_event(self) -> Dict[str, Any]:
+        return {"type": "route", "tier": self.tier, "model": self.model, "budget_ms": self.budget_ms,
+                "reason": self.reason}
+
+    def finish(self, elapsed_s: float, ttft_s: float = 0.0) -> Dict[str, Any]:
+        """Record the measured latency; returns the per-request report."""
+        ROUTE_SECONDS.observe(elapsed_s, tier=self.tier)
+        within = elapsed_s * 1000 <= self.budget_ms
+        if not within:
+            ROUTE_OVER_BUDGET.inc(tier=self.tier)
+        return {
+            "type": "route_latency",
+            "tier": self.tier,
+            "elapsed_ms": round(elapsed_s * 1000, 1),
+            "ttft_ms": round(ttft_s * 1000, 1) if ttft_s else None,
+            "budget_ms": self.budget_ms,
+            "within_budget": within,
+        }
+
+
+def route_for(tier: str, reason: str) -> Route:
+    return Route(tier, TIER_MODELS[tier], TIER_BUDGETS_MS[tier], reason)
+
+
+def classify(query: str, doc_ids: List[str], attached: bool = False) -> Route:
+    """Pick a tier for this turn from the message text and the chat's documents.
+
+    `attached` is True when this turn itself carries documents; otherwise
+    `doc_ids` are documents registered earlier in the chat.
+    """
+    text = (query or "").strip()
+    web = WEB_CUES.search(text)
+    research = RESEARCH_CUES.search(text)
+    if (not doc_ids and not attached and not web and not research
+            and len(text.split()) <= TRIVIAL_MAX_WORDS and _TRIVIAL_RE.fullmatch(text)):
+        return route_for(TIER_TRIVIAL, "greeting or capability question")
+    if doc_ids:
+        if web or research:
+            return route_for(TIER_GENERAL, "documents plus outside information")
+        if not _GENERATE_RE.match(text) and (attached or DOC_REFERENCE_CUES.search(text)):
+            return route_for(TIER_PDF, "question about attached documents")
+    if research:
+        return route_for(TIER_RESEARCH, "explicit research request")
+    if web:
+        return route_for(TIER_WEB, "current-information lookup")
+    return route_for(TIER_GENERAL, "no specific tier matched")
+
+
+@functools.lru_cache(maxsize=None)
+def get_trivial_agent(model: str = TIER_MODELS[TIER_TRIVIAL]) -> Agent:
+    """Tool-less small-model agent for the trivial tier."""
+    return Agent(
+        name="Atlas_Quick",
+        model=model,
+        instructions=TRIVIAL_INSTRUCTIONS,
+        model_settings=agent_model_settings("Atlas_Quick"),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def orchestrator_for(model: str) -> Agent:
+    """The orchestrator on another model (research / general tier overrides)."""
+    from .orchestrator import get_atlas_agent
+    agent = get_atlas_agent()
+    return agent if agent.model == model else agent.clone(model=model)
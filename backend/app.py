@@ -1,39 +1,61 @@
 import os
 import json
-import base64
-from io import BytesIO
-from typing import List, Optional, Dict
-from pydantic import BaseModel
-from dotenv import load_dotenv
+import time
+import asyncio
+from typing import List, Optional, Dict, Tuple
+from pydantic import BaseModel, ValidationError
 from fastapi import FastAPI, Query
-from fastapi.responses import JSONResponse, StreamingResponse, FileResponse
+from fastapi import Request as HTTPRequest
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse, FileResponse
 from urllib.parse import quote
-from pypdf import PdfReader
-from .utils.prompt import ClientMessage
+from .utils import env  # noqa: F401  (loads .env before any settings are read)
+from .utils.prompt import ClientMessage, build_user_turn, documents_context
+from .utils.analysis_cache import analysis_cache
+from .utils.artifacts import Artifact, artifact_store
 from .utils.attachment import Attachment
-from .agents.orchestrator import atlas_agent, create_ephemeral_session
+from .utils.cancellation import cancel_stats, count_cancel, until_disconnected, watch_disconnect
+from .utils.chunks import RAG_TOKEN_BUDGET, retrieve_context
+from .utils.context import (
+    ORCHESTRATION_FANOUT, ROUTING_AUTO, RequestContext, bind_request, resolve_orchestration, resolve_pdf_mode,
+    resolve_routing, unbind_request,
+)
+from .utils.logs import get_logger, sampled
+from .utils.openai_client import client_stats
+from .utils.metrics import HANDOFF_SECONDS, HANDOFFS, REQUESTS, TOOL_SECONDS, RequestTimer, render_metrics
+from .utils.scheduler import QueueFull, Ticket, run_scheduler
+from .utils.memory import ChatSession, session_manager
+from .utils.documents import DOC_TOKENS_SAVED, document_registry, partial_block
+from .utils.pdf_cache import pdf_text_cache
+from .utils.pdf_extract import ExtractedPdf, extract_attachments
+from .utils.uploads import UploadTooLarge, read_upload_form, save_upload, upload_stats
+from .utils.tokens import count_tokens, enforce_budget
+from .utils.usage import record_usage, request_usage, usage_stats
+from .utils.streaming import (
+    STREAM_MODE_DELTA, DeltaCoalescer, merge_side_events, ndjson, resolve_stream_mode
+)
+from .agents.graph import STARTUP_MODE, agent_graph_loaded, get_agent_graph, load_agent_graph, start_warmup
 # from .agents.resume_agent import get_successful_response_with_base64
-from agents import SQLiteSession  # type: ignore
-from agents import Runner, ItemHelpers  # type: ignore
-from openai.types.responses import ResponseTextDeltaEvent  # type: ignore
-
-# Load environment variables from .env file if it exists
-try:
-    load_dotenv(".env")
-except Exception as e:
-    print(f"[DEBUG] Could not load .env file: {e}")
-    # Continue without .env file
-
-# Debug environment variables
-print(f"[DEBUG] Environment variables:")
-print(f"[DEBUG] VERCEL: {os.getenv('VERCEL')}")
-print(f"[DEBUG] RENDER_WORKER_URL: {os.getenv('RENDER_WORKER_URL')}")
-print(f"[DEBUG] RENDER_WORKER_AUTH: {'***' if os.getenv('RENDER_WORKER_AUTH') else 'None'}")
+
+log = get_logger(__name__)
 
 app = FastAPI()
 
-# Persist agent sessions per chatId so context is preserved across requests
-SESSIONS: Dict[str, SQLiteSession] = {}
+# The Agents SDK and agent graph load per ATLAS_STARTUP_MODE (see agents/graph.py)
+if STARTUP_MODE == "eager":
+    load_agent_graph()
+
+
+@app.on_event("startup")
+async def warm_agents():
+    start_warmup()
+
+ARTIFACT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Rough allowance for tool / handoff JSON schemas sent alongside the instructions
+TOOL_SCHEMA_TOKENS = 600
+
+# Agent sessions per chatId live in a bounded, optionally persistent store
+# (see utils/memory.py) so context is preserved across requests without leaking
 
 # Agents SDK uses a session internally; nothing to instantiate here
 
@@ -41,30 +63,96 @@ class Request(BaseModel):
     messages: List[ClientMessage]
     data: Optional[dict] = None
     chatId: Optional[str] = "default"
+    # "final" (default, legacy full-text frames) or "delta" (incremental frames)
+    streamMode: Optional[str] = None
+    # "direct" (in-process PDF analysis) or "agent" (nested PDF_Analyzer turn)
+    pdfMode: Optional[str] = None
+    # "sequential" (default agent loop) or "fanout" (concurrent branches + one synthesis turn)
+    orchestration: Optional[str] = None
+    # "auto" (default) routes simple requests to a cheaper tier; "off" always uses the orchestrator
+    routing: Optional[str] = None
+
+def _tool_name(item) -> str:
+    raw = getattr(item, "raw_item", None)
+    name = getattr(raw, "name", None) or (raw.get("name") if isinstance(raw, dict) else None)
+    return (
+        name
+        or getattr(item, "tool_name", None)
+        or getattr(getattr(item, "tool", None), "name", None)
+        or getattr(raw, "type", None)
+        or "unknown_tool"
+    )
+
+
+def _call_id(item) -> Optional[str]:
+    raw = getattr(item, "raw_item", None)
+    if isinstance(raw, dict):
+        return raw.get("call_id") or raw.get("id")
+    return getattr(raw, "call_id", None) or getattr(raw, "id", None)
+
+
+# Generated PDFs may only be picked up from these directories
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+GENERATED_DIRS = (os.path.join(PROJECT_ROOT, "generated_resumes"), "/tmp/generated_resumes")
+
+
+def _artifact_from_output(output) -> Optional[Artifact]:
+    """Store a PDF referenced by a tool output (path or base64) and return its artifact."""
+    if isinstance(output, str):
+        # Cheap shape check before parsing: most tool outputs are analysis JSON
+        if not any(key in output for key in ('"pdf_path"', '"output_folder"', '"pdf_b64"')):
+            return None
+        try:
+            output = json.loads(output)
+        except ValueError:
+            return None
+    if not isinstance(output, dict):
+        return None
+
+    pdf_path = output.get("pdf_path")
+    if not pdf_path:
+        out_dir = output.get("output_folder")
+        fname = output.get("filename")
+        if isinstance(out_dir, str) and isinstance(fname, str):
+            pdf_path = os.path.join(out_dir, fname)
+    filename = output.get("filename") or "resume.pdf"
+
+    # Prefer the file on disk; fall back to base64 when the path is unusable
+    if isinstance(pdf_path, str):
+        real = os.path.abspath(pdf_path)
+        if any(real.startswith(base) for base in GENERATED_DIRS) and os.path.isfile(real):
+            return artifact_store.put_file(real, filename, "application/pdf")
+    b64 = output.get("pdf_b64")
+    if isinstance(b64, str) and b64:
+        return artifact_store.put_base64(b64, filename, "application/pdf")
+    return None
+
+
+def _partial_analyze(text: str, query: str) -> dict:
+    # Runs in a worker thread, so a cold pdf_agent import does not block the loop
+    # (partial text: its index is throwaway, keep it out of the index cache)
+    from .agents.pdf_agent import analyze_text
+    return analyze_text(text, query, cache_index=False)
+
 
 @app.post("/api/chat")
-async def handle_chat_data(request: Request):
-    print("Received request in handle_chat_data")
-
-    # Debug: Log chat history and memory info
-    print(f"[DEBUG] Chat ID: {request.chatId or 'default'}")
-    print(f"[DEBUG] Number of messages in history: {len(request.messages)}")
-    if len(request.messages) > 0:
-        print(f"[DEBUG] First message: {request.messages[0].content[:100]}...")
-        print(f"[DEBUG] Last message: {request.messages[-1].content[:100]}...")
-
-        # Calculate approximate token count for chat history
-        total_chars = sum(len(msg.content) for msg in request.messages)
-        estimated_tokens = total_chars // 4  # Rough estimate: 1 token ≈ 4 chars
-        print(f"[DEBUG] Total characters in chat history: {total_chars}")
-        print(f"[DEBUG] Estimated tokens in chat history: {estimated_tokens}")
+async def handle_chat_data(http_request: HTTPRequest):
+    # Parsed by hand so body read + validation shows up as its own stage
+    timer = RequestTimer()
+    with timer.span("parse"):
+        try:
+            request = Request.model_validate_json(await http_request.body())
+        except ValidationError as e:
+            REQUESTS.inc(outcome="invalid")
+            return JSONResponse(content={"detail": json.loads(e.json(include_url=False))}, status_code=422)
 
     # Extract the last user message to use as the prompt
     if not request.messages:
+        REQUESTS.inc(outcome="invalid")
         return JSONResponse(content={"error": "No messages provided"}, status_code=400)
 
+    verbose = sampled()
     user_message = request.messages[-1].content
-    print(f"User message: {user_message}")
 
     # Parse attachments (if any) for PDFs and extract text
     attachments: List[Attachment] = []
@@ -72,61 +160,271 @@ async def handle_chat_data(request: Request):
         try:
             attachments = [Attachment(**att) for att in request.data["attachments"]]
         except Exception as e:
-            print("Failed to parse attachments:", e)
+            log.warning("failed to parse attachments: %s", e)
 
-    pdf_texts: List[str] = []
-    for att in attachments:
-        if att.type == "application/pdf" and att.content:
-            try:
-                # Expecting data URL like: data:application/pdf;base64,<b64>
-                if "," in att.content:
-                    b64 = att.content.split(",", 1)[1]
-                else:
-                    b64 = att.content
-                pdf_bytes = base64.b64decode(b64)
-                pdf_reader = PdfReader(BytesIO(pdf_bytes))
-                text = "".join([(page.extract_text() or "") for page in pdf_reader.pages])
-                if text.strip():
-                    pdf_texts.append(text)
-            except Exception as e:
-                print(f"Failed to extract PDF text from {att.name}:", e)
-
-    combined_text = user_message
-    if pdf_texts:
-        combined_text = user_message + "\n\nPDF Content:\n" + "\n\n".join(pdf_texts)
-
-    # Debug: Log the final combined text length
-    print(f"[DEBUG] Final combined text length: {len(combined_text)}")
-    print(f"[DEBUG] Estimated tokens in combined text: {len(combined_text) // 4}")
-    print(f"[DEBUG] Combined text preview: {combined_text[:200]}...")
+    stream_mode = resolve_stream_mode(request.streamMode)
+
+    chat_id = request.chatId or "default"
+
+    if verbose:
+        log.info(
+            "chat request chat_id=%s messages=%d attachments=%d message_chars=%d",
+            chat_id, len(request.messages), len(attachments), len(user_message),
+        )
+
+    # Fast rejection before any work when the run queue is already full
+    if run_scheduler.saturated():
+        REQUESTS.inc(outcome="rejected")
+        return JSONResponse(
+            content={"error": "Server busy, please retry shortly"},
+            status_code=429,
+            headers={"Retry-After": "5"},
+        )
+
+    disconnected = asyncio.Event()
 
     async def ndjson_stream():
+        session: Optional[ChatSession] = None
+        ticket: Optional[Ticket] = None
+        result = None
+        outcome = "ok"
+        route = None
+        tier = None
+        req_ctx: Optional[RequestContext] = None
+
+        # Closing the tab cancels the whole run tree: the streamed run (and the
+        # nested Runner.run calls inside its tools) plus the generator step in
+        # flight (see until_disconnected), which in turn drops queued extraction
+        # batches. The server's own task is never cancelled.
+        def on_disconnect():
+            if result is not None and not result.is_complete:
+                result.cancel()
+                count_cancel("runs_cancelled")
+            disconnected.set()
+
+        watcher = asyncio.create_task(watch_disconnect(http_request.is_disconnected, on_disconnect))
+        # Cold workers load the agent graph while attachments are being extracted
+        graph = asyncio.ensure_future(get_agent_graph())
         try:
-            yield json.dumps({"event": "thinking", "data": "Starting agent..."}) + "\n"
+            # Decode + extract PDFs in the worker pool; the loop stays free for other streams
+            extracted: List[ExtractedPdf] = []
+            extract_started = time.perf_counter()
+            async for progress in extract_attachments(
+                attachments, extracted, query=user_message, partial_analyzer=_partial_analyze
+            ):
+                yield ndjson({"event": "thinking", "data": progress})
+            if attachments:
+                timer.record("extract", time.perf_counter() - extract_started)
+
+            # Only the excerpts relevant to this question go to the model, with page refs;
+            # the full text stays server-side and tools reach it by doc_id
+            docs = [doc for doc in extracted if doc.text.strip()]
+            # Documents whose extraction failed part-way (e.g. timed out) only serve this
+            # turn's excerpts: never registered, so no tool or cache sees partial text
+            complete = [doc for doc in docs if not doc.error]
+            partial = [doc for doc in docs if doc.error]
+            handles = [
+                document_registry.register(chat_id, doc.name, doc.sha256, doc.pages, doc.total_pages, doc.truncated)
+                for doc in complete
+            ]
+            excerpts: List[str] = []
+            partial_blocks: List[str] = []
+            if docs:
+                per_doc_budget = max(RAG_TOKEN_BUDGET // len(docs), 1)
+                with timer.span("retrieve"):
+                    retrieved = await asyncio.gather(*(
+                        asyncio.to_thread(
+                            retrieve_context, doc.pages, user_message, doc.name, doc.sha256, per_doc_budget
+                        )
+                        for doc in complete + partial
+                    ))
+                excerpts = list(retrieved[:len(complete)])
+                partial_blocks = [
+                    partial_block(doc.name, doc.pages, doc.total_pages, doc.error or "", context)
+                    for doc, context in zip(partial, retrieved[len(complete):])
+                ]
+
+            if not graph.done():
+                yield ndjson({"event": "thinking", "data": {"type": "agent_loading"}})
+            with timer.span("agent_load"):
+                await graph
+            # Imported by the graph load already, so these are cheap now
+            from agents import Runner  # type: ignore
+            from .utils.run_config import get_run_config
+            from .agents import router
+            from .agents.fanout import get_synthesis_agent, get_web_agent, pdf_branch, plan_branches, run_branches, synthesis_input
+
+            # Pre-routing: pick a latency tier (and its model) from the request itself
+            doc_ids = [h.doc_id for h in handles] or [d.doc_id for d in document_registry.list(chat_id)]
+            if resolve_routing(request.routing) == ROUTING_AUTO:
+                route = router.classify(user_message, doc_ids, attached=bool(handles))
+            else:
+                route = router.route_for(router.TIER_GENERAL, "routing off")
+            tier = route.tier
+            yield ndjson({"event": "thinking", "data": route.to_event()})
+            agent_model = route.model
+
+            # Admission: one run per chat, global + per-model limits, bounded wait queue
+            try:
+                ticket = run_scheduler.enqueue(chat_id, agent_model)
+            except QueueFull as e:
+                outcome = "rejected"
+                yield ndjson({"event": "error", "message": str(e), "status": 429})
+                return
+            queue_started = time.perf_counter()
+            async for position in run_scheduler.wait(ticket):
+                yield ndjson({"event": "queued", **position})
+            timer.record("queue", time.perf_counter() - queue_started)
 
-            # Use or create persistent session per chatId
-            chat_id = request.chatId or "default"
-            session = SESSIONS.get(chat_id)
-            if session is None:
-                session = create_ephemeral_session()
-                SESSIONS[chat_id] = session
+            yield json.dumps({"event": "thinking", "data": "Starting agent..."}) + "\n"
 
-            result = Runner.run_streamed(atlas_agent, input=combined_text, session=session)
+            # Use or create the session for this chatId (pinned while the run is active)
+            session = session_manager.acquire(chat_id)
+
+            # Fixed document order (by doc_id) whatever order the files were attached in
+            documents = sorted(zip(handles, excerpts), key=lambda pair: pair[0].doc_id)
+            doc_context = documents_context(
+                [f"{handle.header()}\n{context}" for handle, context in documents] + partial_blocks
+            )
+
+            # Tools read per-request options from this context (copied into the run task)
+            req_ctx = RequestContext(chat_id=chat_id, pdf_mode=resolve_pdf_mode(request.pdfMode))
+
+            # Simple tiers skip the orchestrator's tool-planning turn entirely
+            run_agent = router.orchestrator_for(route.model)
+            branches = []
+            if route.tier == router.TIER_TRIVIAL:
+                run_agent = router.get_trivial_agent(route.model)
+            elif route.tier == router.TIER_WEB:
+                run_agent = get_web_agent(route.model)
+            elif route.tier == router.TIER_PDF:
+                # Analysis runs server-side up front; one answer turn follows
+                branches = [pdf_branch(user_message, doc_ids, chat_id, req_ctx.pdf_mode)]
+            elif resolve_orchestration(request.orchestration) == ORCHESTRATION_FANOUT:
+                # Fan-out: independent branches (documents, web, research) run concurrently
+                # up front, then one synthesis turn answers from their joined results
+                branches = plan_branches(user_message, doc_ids, chat_id, req_ctx.pdf_mode)
+            if branches:
+                with timer.span("fanout"):
+                    async for _source, progress in merge_side_events(run_branches(branches, req_ctx), req_ctx.events):
+                        yield ndjson({"event": "thinking", "data": progress})
+                run_agent = get_synthesis_agent(route.model)
+
+            def turn_input(doc_context: str) -> str:
+                # Document context first, the question last (stable prompt prefix)
+                if branches:
+                    return synthesis_input(user_message, doc_context, branches)
+                return build_user_turn(user_message, doc_context)
+
+            # Fit history + this turn into the model's input budget before the run.
+            # Sized with full excerpts, so swapping some for references below only shrinks it.
+            with timer.span("budget"):
+                budget = await enforce_budget(
+                    session,
+                    turn_input(doc_context),
+                    agent_model,
+                    reserved_tokens=count_tokens(str(run_agent.instructions or "")) + TOOL_SCHEMA_TOKENS,
+                )
+
+            # Documents whose excerpts the (compacted) history still holds (the frontend
+            # re-sends attachments every turn) go in as a short doc_id reference, not again in full
+            if documents:
+                stored = await session.stored_documents()
+                blocks, reused, tokens_saved = [], [], 0
+                for handle, context in documents:
+                    full = f"{handle.header()}\n{context}"
+                    if handle.doc_id in stored:
+                        blocks.append(handle.reference())
+                        reused.append(handle.doc_id)
+                        tokens_saved += max(count_tokens(full) - count_tokens(blocks[-1]), 0)
+                    else:
+                        blocks.append(full)
+                if reused:
+                    doc_context = documents_context(blocks + partial_blocks)
+                    budget.tokens_after = max(budget.tokens_after - tokens_saved, 0)
+                    DOC_TOKENS_SAVED.inc(tokens_saved)
+                    yield ndjson({"event": "thinking", "data": {
+                        "type": "documents", "reused": reused, "tokens_saved": tokens_saved,
+                    }})
+                    if verbose:
+                        log.info("chat_id=%s reused %d stored document(s), %d tokens saved",
+                                 chat_id, len(reused), tokens_saved)
+            run_input = turn_input(doc_context)
+            yield ndjson({"event": "thinking", "data": budget.to_event()})
+            if verbose:
+                log.info("chat_id=%s input budget %s", chat_id, budget.to_event())
+
+            ctx_token = bind_request(req_ctx)
+            try:
+                result = Runner.run_streamed(
+                    run_agent, input=run_input, session=session, run_config=get_run_config()
+                )
+            finally:
+                unbind_request(ctx_token)
 
             accumulated_text = ""
+            text_parts: List[str] = []
+            coalescer = DeltaCoalescer() if stream_mode == STREAM_MODE_DELTA else None
             last_pdf: Optional[dict] = None
+            # call_id -> (tool name, start); hosted web searches are keyed by item id
+            tool_started: Dict[str, Tuple[str, float]] = {}
+            handoff_started: Optional[float] = None
+            current_agent: Optional[str] = None
+
+            async for source, event in merge_side_events(result.stream_events(), req_ctx.events):
+                # Progress reported by tools (cache hits, shared runs, ...)
+                if source == "side":
+                    if coalescer is not None:
+                        pending = coalescer.flush()
+                        if pending:
+                            yield ndjson({"event": "delta", "delta": pending})
+                    yield ndjson({"event": "thinking", "data": event})
+                    continue
 
-            async for event in result.stream_events():
-                # Stream raw token deltas as progressively growing final content
-                if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                if event.type == "raw_response_event" and getattr(event.data, "type", "") == "response.output_text.delta":
                     delta = event.data.delta or ""
-                    if delta:
+                    if not delta:
+                        continue
+                    timer.mark("ttft")
+                    if coalescer is not None:
+                        # Delta mode: only send the new text, merged over a short window
+                        text_parts.append(delta)
+                        merged = coalescer.push(delta)
+                        if merged:
+                            yield ndjson({"event": "delta", "delta": merged})
+                    else:
+                        # Legacy mode: stream raw token deltas as progressively growing final content
                         accumulated_text += delta
-                        yield json.dumps({"event": "final", "response": accumulated_text}) + "\n"
+                        yield ndjson({"event": "final", "response": accumulated_text})
+                    continue
+
+                if event.type == "raw_response_event":
+                    raw_type = getattr(event.data, "type", "")
+                    item_id = getattr(event.data, "item_id", None)
+                    if raw_type == "response.completed":
+                        # Cached vs. uncached input tokens, attributed to the agent that ran the turn
+                        record_usage(current_agent or run_agent.name, getattr(event.data.response, "usage", None), req_ctx)
+                    elif raw_type == "response.web_search_call.in_progress" and item_id:
+                        tool_started[item_id] = ("web_search", time.perf_counter())
+                    elif raw_type == "response.web_search_call.completed" and item_id in tool_started:
+                        name, started = tool_started.pop(item_id)
+                        TOOL_SECONDS.observe(time.perf_counter() - started, tool=name)
                     continue
 
+                # Keep frame order: pending text goes out before any other event
+                if coalescer is not None:
+                    pending = coalescer.flush()
+                    if pending:
+                        yield ndjson({"event": "delta", "delta": pending})
+
                 # Agent switched/updated
                 if event.type == "agent_updated_stream_event":
+                    new_agent = event.new_agent.name
+                    if current_agent is not None and new_agent != current_agent:
+                        HANDOFFS.inc(source=current_agent, target=new_agent)
+                        if handoff_started is not None:
+                            HANDOFF_SECONDS.observe(time.perf_counter() - handoff_started, target=new_agent)
+                    current_agent, handoff_started = new_agent, None
                     payload = {
                         "event": "thinking",
                         "data": {"type": "agent_updated", "new_agent": event.new_agent.name},
@@ -136,107 +434,46 @@ async def handle_chat_data(request: Request):
 
                 # High-level run item events
                 if event.type == "run_item_stream_event":
-                    if event.item.type == "tool_call_item":
-                        # try to extract a readable tool name
-                        tool_name = (
-                            getattr(event.item, "tool_name", None)
-                            or getattr(getattr(event.item, "tool", None), "name", None)
-                            or getattr(getattr(event.item, "tool_call", None), "name", None)
-                            or "unknown_tool"
-                        )
-                        print(f"[DEBUG] Tool call detected: {tool_name}")
+                    if event.item.type == "handoff_call_item":
+                        handoff_started = time.perf_counter()
+                    elif event.item.type == "tool_call_item":
+                        tool_name = _tool_name(event.item)
+                        call_id = _call_id(event.item)
+                        if call_id and call_id not in tool_started and tool_name != "web_search_call":
+                            tool_started[call_id] = (tool_name, time.perf_counter())
+                        if verbose:
+                            log.info("chat_id=%s tool call %s", chat_id, tool_name)
                         yield json.dumps({
                             "event": "thinking",
                             "data": {"type": "tool_call", "tool": tool_name},
                         }) + "\n"
                     elif event.item.type == "tool_call_output_item":
                         # do not forward full tool outputs (can be huge). Only signal completion
-                        tool_name = (
-                            getattr(event.item, "tool_name", None)
-                            or getattr(getattr(event.item, "tool", None), "name", None)
-                            or getattr(getattr(event.item, "tool_call", None), "name", None)
-                            or "unknown_tool"
-                        )
-                        # Surface resume PDF to client if available from resume_builder/rendercv_render
+                        tool_name = _tool_name(event.item)
+                        started_call = tool_started.pop(_call_id(event.item) or "", None)
+                        if started_call is not None:
+                            tool_name = started_call[0]
+                            TOOL_SECONDS.observe(time.perf_counter() - started_call[1], tool=tool_name)
+                        # Surface resume PDF to client if available from resume_builder/rendercv_render.
+                        # The file goes into the artifact store; the stream only carries its URL.
                         try:
                             output = getattr(event.item, "output", None)
-                            print(
-                                f"[tool_call_output_item] tool={tool_name}, output_type={type(output)},\n"
-                                f"snippet={str(output)[:300] if output is not None else '(none)'}\n"
-                            )
-                            # Be robust: sometimes tool metadata is missing. Detect by output shape.
-                            if output is not None:
-                                parsed = None
-                                if isinstance(output, str):
-                                    try:
-                                        parsed = json.loads(output)
-                                    except Exception as e:
-                                        print(f"[resume_ready] json.loads failed: {e}")
-                                elif isinstance(output, dict):
-                                    parsed = output
-
-                                if isinstance(parsed, dict):
-                                    print(f"[resume_ready] parsed keys: {list(parsed.keys())}")
-
-                                    # Check if this is a clean success message - if so, get the real data from global
-                                    # if (parsed.get("success") and parsed.get("has_base64") and
-                                    #     not parsed.get("pdf_b64")):
-                                    #     print(f"[DEBUG] Detected clean success message, checking for full response...")
-                                    #     full_response = get_successful_response_with_base64()
-                                    #     if full_response:
-                                    #         try:
-                                    #             parsed = json.loads(full_response)
-                                    #             print(f"[DEBUG] Using full response with base64 data")
-                                    #         except:
-                                    #             print(f"[DEBUG] Failed to parse full response")
-                                    #             parsed = None
-
-                                    if parsed:
-                                        pdf_path = parsed.get("pdf_path")
-                                        if not pdf_path:
-                                            out_dir = parsed.get("output_folder")
-                                            fname = parsed.get("filename")
-                                            if isinstance(out_dir, str) and isinstance(fname, str):
-                                                pdf_path = os.path.join(out_dir, fname)
-                                        filename = parsed.get("filename") or "resume.pdf"
-
-                                        # Build URL. Prefer file path but allow base64 fallback if path not under base_dir
-                                        file_url = None
-                                        if isinstance(pdf_path, str):
-                                            project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-                                            base_dir = os.path.abspath(os.path.join(project_root, "generated_resumes"))
-                                            real = os.path.abspath(pdf_path)
-                                            if real.startswith(base_dir) and os.path.exists(real):
-                                                file_url = f"/api/file?path={quote(real)}"
-                                            else:
-                                                b64 = parsed.get("pdf_b64")
-                                                if isinstance(b64, str) and len(b64) > 0:
-                                                    file_url = f"data:application/pdf;base64,{b64}"
-                                        else:
-                                            b64 = parsed.get("pdf_b64")
-                                            if isinstance(b64, str) and len(b64) > 0:
-                                                file_url = f"data:application/pdf;base64,{b64}"
-
-                                        print(f"\nHere is that pdf path: {pdf_path}\nHere is the filename: {filename}\nUsing URL: {file_url}\n\n")
-                                        if file_url:
-                                            last_pdf = {"url": file_url, "name": filename, "contentType": "application/pdf"}
-                                            print(f"[DEBUG] About to emit resume_ready event with data: {last_pdf}")
-                                            yield json.dumps({
-                                                "event": "resume_ready",
-                                                "data": last_pdf,
-                                            }) + "\n"
-                                            print(f"[resume_ready] emitted with url={file_url}")
-                                        else:
-                                            print("[resume_ready] No usable URL (no path and no b64)")
+                            artifact = await asyncio.to_thread(_artifact_from_output, output)
+                            if artifact is not None:
+                                last_pdf = {"url": artifact.url, "name": artifact.name, "contentType": artifact.content_type}
+                                yield json.dumps({
+                                    "event": "resume_ready",
+                                    "data": last_pdf,
+                                }) + "\n"
                         except Exception as e:
-                            print(f"\nError: {e}\n")
-                            pass
+                            log.warning("failed to inspect %s output: %s", tool_name, e)
                         yield json.dumps({
                             "event": "thinking",
                             "data": {"type": "tool_output", "tool": tool_name, "status": "completed"},
                         }) + "\n"
                     elif event.item.type == "message_output_item":
                         # Optional: show completed message chunks at item level
+                        from agents import ItemHelpers  # type: ignore
                         text = ItemHelpers.text_message_output(event.item) or ""
                         # keep this concise for the Thinking panel
                         snippet = (text[:200] + ("..." if len(text) > 200 else "")) if text else ""
@@ -246,26 +483,105 @@ async def handle_chat_data(request: Request):
                                 "data": {"type": "message_output", "text": snippet},
                             }) + "\n"
                     continue
+
+            if coalescer is not None:
+                pending = coalescer.flush()
+                if pending:
+                    yield ndjson({"event": "delta", "delta": pending})
+                # One closing frame with the full text so clients can reconcile
+                yield ndjson({"event": "final", "response": "".join(text_parts)})
+
             # After streaming finishes, re-emit resume_ready if we saw a PDF but the client may have missed it
             if last_pdf is not None:
                 yield json.dumps({"event": "resume_ready", "data": last_pdf}) + "\n"
 
+            yield ndjson({"event": "thinking", "data": request_usage(req_ctx)})
+            yield ndjson({"event": "thinking", "data": route.finish(timer.elapsed(), timer.spans.get("ttft", 0.0))})
+            route = None
+
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
         except Exception as e:
             import traceback
+            outcome = "error"
+            log.exception("chat run failed for chat_id=%s", chat_id)
             err = {"event": "error", "message": str(e), "trace": traceback.format_exc()[:2000]}
             yield json.dumps(err) + "\n"
-
-    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+        finally:
+            watcher.cancel()
+            if not graph.done():
+                graph.cancel()
+            if result is not None and not result.is_complete:
+                result.cancel()
+                count_cancel("runs_cancelled")
+                if outcome == "ok":
+                    outcome = "cancelled"
+            if outcome == "cancelled" and not disconnected.is_set():
+                # Starlette noticed the client leave before the watcher's next poll
+                count_cancel("client_disconnects")
+            timer.record("total", timer.elapsed())
+            REQUESTS.inc(outcome=outcome)
+            if route is not None:
+                # Not reported in-stream (error / cancel): still count the tier's latency
+                route.finish(timer.elapsed(), timer.spans.get("ttft", 0.0))
+            if verbose:
+                log.info("chat_id=%s outcome=%s tier=%s stages_ms=%s", chat_id, outcome, tier, timer.summary())
+            if session is not None:
+                await session_manager.release(session)
+            if ticket is not None:
+                run_scheduler.release(ticket)
+            for model in req_ctx.held_models if req_ctx is not None else []:
+                run_scheduler.release_model(model)
+
+    return StreamingResponse(until_disconnected(ndjson_stream(), disconnected), media_type="application/x-ndjson")
+
+
+@app.post("/api/upload")
+async def upload_document(http_request: HTTPRequest):
+    """Binary multipart upload (field `file`); returns a documentId that chat attachments can reference."""
+    try:
+        doc = await save_upload(await read_upload_form(http_request))
+    except UploadTooLarge as e:
+        return JSONResponse(content={"error": str(e)}, status_code=413)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    return JSONResponse(content={
+        "documentId": doc.document_id,
+        "name": doc.name,
+        "type": doc.content_type,
+        "size": doc.size,
+    })
 
 
 @app.get("/api/file")
-async def get_file(path: str):
+async def get_file(http_request: HTTPRequest, id: Optional[str] = None, path: Optional[str] = None):
+    """Serve a stored artifact by content id (cacheable, range-capable).
+
+    `path` is the legacy form for files under generated_resumes.
+    """
+    if id is None:
+        return _legacy_file(path or "")
+    artifact = artifact_store.get(id)
+    if artifact is None:
+        return JSONResponse(content={"error": "Not found"}, status_code=404)
+    # Content-addressed: the ETag is the hash and the body never changes for this URL
+    headers = {"ETag": artifact.etag, "Cache-Control": ARTIFACT_CACHE_CONTROL}
+    if_none_match = http_request.headers.get("if-none-match", "")
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in tags or artifact.etag in tags:
+            return Response(status_code=304, headers=headers)
+    disposition = "inline" if artifact.content_type == "application/pdf" else "attachment"
+    headers["Content-Disposition"] = f"{disposition}; filename*=UTF-8''{quote(artifact.name)}"
+    # FileResponse streams from disk and answers Range / If-Range requests
+    return FileResponse(artifact.path, media_type=artifact.content_type, headers=headers)
+
+
+def _legacy_file(path: str):
     # Only serve files from generated_resumes to prevent arbitrary file access
-    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    base_dir = os.path.abspath(os.path.join(project_root, "generated_resumes"))
-    tmp_base = "/tmp/generated_resumes"
     real = os.path.abspath(path)
-    if not (real.startswith(base_dir) or real.startswith(tmp_base)):
+    if not path or not any(real.startswith(base) for base in GENERATED_DIRS):
         return JSONResponse(content={"error": "Forbidden"}, status_code=403)
     media = "application/pdf" if real.lower().endswith(".pdf") else "application/octet-stream"
     # For PDFs, set inline so browsers can preview; avoid default 'attachment' disposition
@@ -278,6 +594,13 @@ async def get_file(path: str):
     return FileResponse(real, media_type=media, filename=os.path.basename(real))
 
 
+@app.on_event("shutdown")
+async def flush_sessions():
+    # Commit any batched session writes before the worker exits
+    if session_manager.db is not None:
+        await session_manager.db.flush()
+
+
 class ResetRequest(BaseModel):
     chatId: Optional[str] = "default"
 
@@ -285,18 +608,44 @@ class ResetRequest(BaseModel):
 @app.post("/api/session/reset")
 async def reset_session(req: ResetRequest):
     chat_id = req.chatId or "default"
-    print(f"[DEBUG] Session reset requested for chat_id: {chat_id}")
-    print(f"[DEBUG] Sessions before reset: {list(SESSIONS.keys())}")
 
-    # Remove existing session so a new one is created on next message
-    if chat_id in SESSIONS:
-        try:
-            del SESSIONS[chat_id]
-            print(f"[DEBUG] Successfully removed session: {chat_id}")
-        except Exception as e:
-            print(f"[DEBUG] Error removing session: {e}")
-    else:
-        print(f"[DEBUG] Session {chat_id} not found in active sessions")
+    # Remove existing session (and any persisted history) so a new one is created on next message
+    try:
+        removed = await session_manager.reset(chat_id)
+        log.debug("session reset chat_id=%s removed=%s", chat_id, removed)
+    except Exception as e:
+        log.warning("error removing session %s: %s", chat_id, e)
+    document_registry.drop(chat_id)
 
-    print(f"[DEBUG] Sessions after reset: {list(SESSIONS.keys())}")
     return JSONResponse(content={"ok": True, "chatId": chat_id})
+
+
+def _component_stats() -> Dict[str, dict]:
+    research: Dict[str, object] = {}
+    if agent_graph_loaded():
+        from .agents.research_agent import research_cache, research_flight
+        research = {**research_cache.stats(), **research_flight.stats()}
+    return {
+        "pdf_cache": pdf_text_cache.stats(),
+        "documents": document_registry.stats(),
+        "analysis_cache": analysis_cache.stats(),
+        "model_usage": usage_stats(),
+        "sessions": session_manager.stats(),
+        "research_cache": research,
+        "scheduler": run_scheduler.stats(),
+        "cancellations": dict(cancel_stats),
+        "artifacts": artifact_store.stats(),
+        "uploads": dict(upload_stats),
+        "openai_client": client_stats(),
+    }
+
+
+@app.get("/api/stats")
+async def get_stats():
+    return JSONResponse(content=_component_stats())
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus scrape endpoint: stage/tool latency histograms plus component gauges."""
+    return PlainTextResponse(render_metrics(_component_stats()), media_type="text/plain; version=0.0.4")
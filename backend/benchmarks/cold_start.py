@@ -0,0 +1,128 @@
+"""Cold-start cost of backend.app per ATLAS_STARTUP_MODE, tracked against a budget.
+
+    python -m backend.benchmarks.cold_start [--runs 5] [--modes eager,warm,lazy]
+        [--delay-ms 0] [--budget-ms 1500] [--budget-mode warm] [--json out.json]
+
+Each run is a fresh interpreter: it times `import backend.app`, ASGI
+lifespan startup, then one /api/chat request (answered by the zero-latency
+scripted model, so what remains is our own startup work) sent `--delay-ms`
+after startup. Reported per mode as medians: import, first byte and first
+token of the first request, and import + first token ("cold"). Exits with
+status 1 when the `--budget-mode` cold time exceeds `--budget-ms`.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from typing import Any, Dict, List
+
+# Runs in the child interpreter; only the stdlib is imported before the timer
+CHILD = r"""
+import time
+t0 = time.perf_counter()
+import backend.app as atlas
+import_s = time.perf_counter() - t0
+
+import json, asyncio
+from backend.benchmarks.cold_start import first_request
+print(json.dumps(asyncio.run(first_request(atlas.app, import_s, float(__import__("sys").argv[1])))))
+"""
+
+
+async def first_request(app, import_s: float, delay_ms: float) -> Dict[str, Any]:
+    import asyncio
+    import time
+    from .loadtest import call_chat
+
+    # ASGI lifespan: run startup hooks (warm mode starts loading here)
+    inbox: "asyncio.Queue[dict]" = asyncio.Queue()
+    outbox: "asyncio.Queue[dict]" = asyncio.Queue()
+    t0 = time.perf_counter()
+    lifespan = asyncio.create_task(app({"type": "lifespan", "asgi": {"version": "3.0"}}, inbox.get, outbox.put))
+    await inbox.put({"type": "lifespan.startup"})
+    await outbox.get()
+    startup_s = time.perf_counter() - t0
+
+    await asyncio.sleep(delay_ms / 1000)
+    sample = await call_chat(app, {
+        "messages": [{"role": "user", "content": "Hello, what can you do?"}],
+        "chatId": "cold-start",
+        "streamMode": "delta",
+    })
+
+    await inbox.put({"type": "lifespan.shutdown"})
+    await outbox.get()
+    await lifespan
+    return {
+        "import_ms": import_s * 1000,
+        "startup_ms": startup_s * 1000,
+        "first_byte_ms": sample.ttfb_ms,
+        "first_token_ms": sample.ttft_ms,
+        "first_total_ms": sample.total_ms,
+        "error": sample.error,
+    }
+
+
+def run_child(mode: str, delay_ms: float) -> Dict[str, Any]:
+    env = {
+        **os.environ,
+        "ATLAS_STARTUP_MODE": mode,
+        "ATLAS_MODEL_PROVIDER": "backend.benchmarks.fake_model:instant_provider",
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-cold-start"),
+        "OPENAI_AGENTS_DISABLE_TRACING": "1",
+        "PYTHONDONTWRITEBYTECODE": "0",
+    }
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, str(delay_ms)],
+        cwd=root, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modes", default="eager,warm,lazy")
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="idle time between startup and first request")
+    parser.add_argument("--budget-ms", type=float, default=0.0, help="cold (import + first token) budget; 0 = off")
+    parser.add_argument("--budget-mode", default="warm")
+    parser.add_argument("--json", dest="json_path")
+    args = parser.parse_args()
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    run_child(modes[0], 0)  # populate __pycache__ so every mode sees the same disk state
+
+    results: Dict[str, Dict[str, float]] = {}
+    for mode in modes:
+        runs: List[Dict[str, Any]] = [run_child(mode, args.delay_ms) for _ in range(args.runs)]
+        errors = [r["error"] for r in runs if r["error"]]
+        if errors:
+            print(f"{mode}: first request failed: {errors[0]}")
+        keys = ("import_ms", "startup_ms", "first_byte_ms", "first_token_ms")
+        med = {k: statistics.median(r[k] or 0.0 for r in runs) for k in keys}
+        med["cold_ms"] = statistics.median(r["import_ms"] + (r["first_token_ms"] or 0.0) for r in runs)
+        results[mode] = {k: round(v, 1) for k, v in med.items()}
+
+    print(f"{args.runs} runs per mode, first request {args.delay_ms:.0f} ms after startup (medians)")
+    print(f"{'mode':<7} {'import':>9} {'startup':>9} {'1st byte':>9} {'1st token':>10} {'cold':>9}")
+    for mode, r in results.items():
+        print(f"{mode:<7} {r['import_ms']:>9.1f} {r['startup_ms']:>9.1f} {r['first_byte_ms']:>9.1f} "
+              f"{r['first_token_ms']:>10.1f} {r['cold_ms']:>9.1f}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+    if args.budget_ms and args.budget_mode in results:
+        cold = results[args.budget_mode]["cold_ms"]
+        verdict = "within" if cold <= args.budget_ms else "OVER"
+        print(f"budget: {args.budget_mode} cold {cold:.0f} ms {verdict} {args.budget_ms:.0f} ms")
+        if cold > args.budget_ms:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""Offline stand-in for the OpenAI model used by the load-test harness.
+
+`ScriptedModel` plays a fixed script instead of calling the API: optionally
+hand off once, call one function tool (run_pdf_analysis, or run_multi_pdf_analysis
+for several doc_ids, when the turn has PDF excerpts, otherwise run_research), then stream a canned answer as token
+deltas. Latencies are configurable so runs can mimic a real model while the
+tools, session store, scheduler and streaming code run for real.
+
+    from backend.utils.run_config import set_model_provider
+    set_model_provider(ScriptedProvider(Script(token_ms=10)))
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import itertools
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from agents.items import ModelResponse, TResponseStreamEvent  # type: ignore
+from agents.models.interface import Model, ModelProvider  # type: ignore
+from agents.usage import Usage  # type: ignore
+from openai.types.responses import (  # type: ignore
+    Response,
+    ResponseCompletedEvent,
+    ResponseFunctionToolCall,
+    ResponseOutputMessage,
+    ResponseOutputText,
+    ResponseTextDeltaEvent,
+    ResponseUsage,
+)
+from openai.types.responses.response_usage import InputTokensDetails, OutputTokensDetails  # type: ignore
+
+from ..utils.tokens import count_tokens
+
+ANSWER = (
+    "Based on the material provided, the agreement caps liability at twelve months of fees, "
+    "renews annually unless either party gives ninety days notice, and requires quarterly "
+    "security reviews. Key risks are the broad indemnity clause and the short cure period. "
+)
+_DOC_ID_RE = re.compile(r"doc_id: (doc_[0-9a-f]+)")
+_QUESTION_MARK = "\n\nQuestion: "
+
+# Prompt caching stand-in, shaped like the API's: the longest prefix shared
+# with a recent prompt to the same agent counts as cached, in 128-token blocks
+# once it reaches 1024 tokens.
+CACHE_MIN_TOKENS = 1024
+CACHE_BLOCK_TOKENS = 128
+_recent_prompts: Dict[str, Deque[str]] = {}
+
+
+def _cached_tokens(key: str, prompt: str) -> int:
+    recent = _recent_prompts.setdefault(key, deque(maxlen=64))
+    common = max((len(os.path.commonprefix([earlier, prompt])) for earlier in recent), default=0)
+    recent.append(prompt)
+    tokens = count_tokens(prompt[:common]) if common else 0
+    return 0 if tokens < CACHE_MIN_TOKENS else tokens // CACHE_BLOCK_TOKENS * CACHE_BLOCK_TOKENS
+
+
+@dataclass
+class Script:
+    first_token_ms: float = 300.0  # time to first text token of a turn
+    token_ms: float = 20.0         # time between streamed text tokens
+    answer_tokens: int = 120       # words streamed in the final answer
+    tool_call_ms: float = 400.0    # time to produce a tool call / handoff turn
+    tools: bool = True             # call run_pdf_analysis / run_research once per turn
+    handoff: bool = False          # hand off to the first handoff target before answering
+
+
+_ids = itertools.count(1)
+
+
+def _next_id(prefix: str) -> str:
+    return f"{prefix}_{next(_ids):08d}"
+
+
+def _as_items(input: "str | List[Dict[str, Any]]") -> List[Dict[str, Any]]:
+    if isinstance(input, str):
+        return [{"role": "user", "content": input}]
+    return [item if isinstance(item, dict) else item.model_dump() for item in input]  # type: ignore[union-attr]
+
+
+def _text_of(item: Dict[str, Any]) -> str:
+    content = item.get("content")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(str(part.get("text", "")) for part in content if isinstance(part, dict))
+    return ""
+
+
+class ScriptedModel(Model):
+    def __init__(self, model: str, script: Script):
+        self.model = model
+        self.script = script
+
+    def _plan(self, input, tools, handoffs) -> Tuple[str, Optional[str], str]:
+        """Return ("handoff" | "tool" | "text", tool name, arguments) for this turn."""
+        items = _as_items(input)
+        last_user = max((i for i, item in enumerate(items) if item.get("role") == "user"), default=-1)
+        question = _text_of(items[last_user]) if last_user >= 0 else ""
+        turn = items[last_user + 1:]
+        called = {item.get("name") for item in turn if item.get("type") == "function_call"}
+
+        handoff_names = [h.tool_name for h in handoffs]
+        if self.script.handoff and handoff_names and not called & set(handoff_names):
+            return "handoff", handoff_names[0], "{}"
+
+        tool_names = {getattr(t, "name", None) for t in tools}
+        if self.script.tools and not called - set(handoff_names):
+            context, _, query = question.rpartition(_QUESTION_MARK)
+            doc_ids = _DOC_ID_RE.findall(context)
+            if len(doc_ids) > 1 and "run_multi_pdf_analysis" in tool_names:
+                return "tool", "run_multi_pdf_analysis", json.dumps({"doc_ids": doc_ids, "query": query})
+            if doc_ids and "run_pdf_analysis" in tool_names:
+                return "tool", "run_pdf_analysis", json.dumps({"doc_id": doc_ids[0], "query": query})
+            if "run_research" in tool_names:
+                return "tool", "run_research", json.dumps({"query": query})
+        return "text", None, ANSWER
+
+    def _answer_words(self) -> List[str]:
+        words = ANSWER.split()
+        return [words[i % len(words)] + " " for i in range(max(self.script.answer_tokens, 1))]
+
+    def _response(self, system_instructions, input, output: List[Any], output_text: str) -> Response:
+        prompt = (system_instructions or "") + json.dumps(_as_items(input), default=str)
+        input_tokens = count_tokens(prompt)
+        cached_tokens = min(_cached_tokens(system_instructions or "", prompt), input_tokens)
+        output_tokens = count_tokens(output_text)
+        return Response(
+            id=_next_id("resp"),
+            created_at=time.time(),
+            model=self.model,
+            object="response",
+            output=output,
+            parallel_tool_calls=False,
+            tool_choice="auto",
+            tools=[],
+            usage=ResponseUsage(
+                input_tokens=input_tokens,
+                input_tokens_details=InputTokensDetails(cached_tokens=cached_tokens),
+                output_tokens=output_tokens,
+                output_tokens_details=OutputTokensDetails(reasoning_tokens=0),
+                total_tokens=input_tokens + output_tokens,
+            ),
+        )
+
+    def _tool_output(self, name: str, arguments: str) -> List[Any]:
+        return [ResponseFunctionToolCall(
+            id=_next_id("fc"), call_id=_next_id("call"), name=name, arguments=arguments,
+            type="function_call", status="completed",
+        )]
+
+    def _text_output(self, item_id: str, text: str) -> List[Any]:
+        return [ResponseOutputMessage(
+            id=item_id, role="assistant", status="completed", type="message",
+            content=[ResponseOutputText(text=text, type="output_text", annotations=[])],
+        )]
+
+    async def get_response(self, system_instructions, input, model_settings, tools, output_schema,
+                           handoffs, tracing, *, previous_response_id, prompt) -> ModelResponse:
+        kind, name, payload = self._plan(input, tools, handoffs)
+        if kind == "text":
+            text = "".join(self._answer_words())
+            await asyncio.sleep((self.script.first_token_ms + self.script.token_ms * self.script.answer_tokens) / 1000)
+            response = self._response(system_instructions, input, self._text_output(_next_id("msg"), text), text)
+        else:
+            await asyncio.sleep(self.script.tool_call_ms / 1000)
+            response = self._response(system_instructions, input, self._tool_output(name, payload), payload)
+        usage = response.usage
+        return ModelResponse(
+            output=response.output,
+            usage=Usage(
+                requests=1,
+                input_tokens=usage.input_tokens,
+                output_tokens=usage.output_tokens,
+                total_tokens=usage.total_tokens,
+                input_tokens_details=usage.input_tokens_details,
+                output_tokens_details=usage.output_tokens_details,
+            ),
+            response_id=response.id,
+        )
+
+    async def stream_response(self, system_instructions, input, model_settings, tools, output_schema,
+                              handoffs, tracing, *, previous_response_id, prompt
+                              ) -> AsyncIterator[TResponseStreamEvent]:
+        kind, name, payload = self._plan(input, tools, handoffs)
+        seq = itertools.count()
+        if kind != "text":
+            await asyncio.sleep(self.script.tool_call_ms / 1000)
+            response = self._response(system_instructions, input, self._tool_output(name, payload), payload)
+            yield ResponseCompletedEvent(type="response.completed", response=response, sequence_number=next(seq))
+            return
+
+        item_id = _next_id("msg")
+        parts: List[str] = []
+        await asyncio.sleep(self.script.first_token_ms / 1000)
+        for i, word in enumerate(self._answer_words()):
+            if i:
+                await asyncio.sleep(self.script.token_ms / 1000)
+            parts.append(word)
+            yield ResponseTextDeltaEvent(
+                type="response.output_text.delta", item_id=item_id, output_index=0,
+                content_index=0, delta=word, logprobs=[], sequence_number=next(seq),
+            )
+        text = "".join(parts)
+        response = self._response(system_instructions, input, self._text_output(item_id, text), text)
+        yield ResponseCompletedEvent(type="response.completed", response=response, sequence_number=next(seq))
+
+
+class ScriptedProvider(ModelProvider):
+    def __init__(self, script: Optional[Script] = None):
+        self.script = script or Script()
+
+    def get_model(self, model_name: Optional[str]) -> Model:
+        return ScriptedModel(model_name or "scripted", self.script)
+
+
+def instant_provider() -> ScriptedProvider:
+    """Zero-latency script for ATLAS_MODEL_PROVIDER (cold-start measurements)."""
+    return ScriptedProvider(Script(first_token_ms=0, token_ms=0, answer_tokens=20, tool_call_ms=0, tools=False))
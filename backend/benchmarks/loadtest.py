@@ -0,0 +1,295 @@
+"""Offline load test for /api/chat: the real app, a scripted model, no API calls.
+
+    python -m backend.benchmarks.loadtest [--sessions 16] [--turns 4] [--pdf-ratio 0.5]
+        [--pages 20] [--docs 1] [--resend]
+        [--orchestration sequential|fanout] [--first-token-ms 300] [--token-ms 20] [--tool-ms 400] [--handoff]
+        [--json results.json]
+
+`--sessions` chats run concurrently, each sending `--turns` messages in
+order (so history, budget compaction and per-chat serialization are
+exercised). A `--pdf-ratio` share of chats attach `--docs` generated PDFs. Requests
+are driven straight through the ASGI interface so time-to-first-byte is the
+moment the first body chunk leaves the app (httpx's ASGITransport buffers
+whole responses). Reports requests/sec, p50/p99 TTFB and time-to-first-token,
+bytes streamed and RSS growth; `--json` writes the same numbers for tracking
+over time.
+"""
+import os
+import sys
+import json
+import time
+import base64
+import random
+import asyncio
+import argparse
+import resource
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from .retrieval import build_document, percentile
+
+
+@dataclass
+class Sample:
+    status: int
+    ttfb_ms: float
+    ttft_ms: Optional[float]
+    total_ms: float
+    bytes: int
+    frames: int
+    error: Optional[str] = None
+
+
+def rss_bytes() -> int:
+    """Current resident set size (falls back to peak RSS off Linux)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def make_pdf(pages: List[str]) -> bytes:
+    """Minimal text-only PDF (one Helvetica text block per page) that pypdf can read."""
+    def escape(text: str) -> str:
+        return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects: List[bytes] = []
+    n = len(pages)
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(n))
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {n} >>".encode())
+    font_id = 3 + 2 * n
+    for i, text in enumerate(pages):
+        lines = [text[j:j + 90] for j in range(0, len(text), 90)] or [""]
+        body = "BT /F1 9 Tf 36 800 Td 11 TL " + " ".join(f"({escape(line)}) '" for line in lines) + " ET"
+        stream = body.encode("latin-1", "replace")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {4 + 2 * i} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def pdf_attachment(pages: int, seed: int) -> Dict[str, Any]:
+    text, _ = build_document(pages, random.Random(seed))
+    per_page = max(len(text) // max(pages, 1), 1)
+    pdf = make_pdf([text[i:i + per_page] for i in range(0, len(text), per_page)][:pages])
+    return {
+        "name": f"contract-{seed}.pdf",
+        "type": "application/pdf",
+        "content": "data:application/pdf;base64," + base64.b64encode(pdf).decode(),
+    }
+
+
+async def call_chat(app, payload: Dict[str, Any]) -> Sample:
+    """POST /api/chat through the ASGI interface, timing the first body chunk."""
+    body = json.dumps(payload).encode()
+    finished = asyncio.Event()
+    sent = False
+    status = 0
+    first_byte: Optional[float] = None
+    first_token: Optional[float] = None
+    size = 0
+    frames = 0
+    buffer = b""
+    error: Optional[str] = None
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status, first_byte, first_token, size, frames, buffer, error
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            return
+        chunk = message.get("body", b"")
+        if not chunk:
+            return
+        now = time.perf_counter()
+        if first_byte is None:
+            first_byte = now
+        size += len(chunk)
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if not line:
+                continue
+            frames += 1
+            event = json.loads(line)
+            if first_token is None and event.get("event") in ("delta", "final"):
+                first_token = now
+            if event.get("event") == "error":
+                error = event.get("message")
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/api/chat",
+        "raw_path": b"/api/chat",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 0),
+        "server": ("loadtest", 80),
+    }
+    started = time.perf_counter()
+    try:
+        await app(scope, receive, send)
+    finally:
+        finished.set()
+    ended = time.perf_counter()
+    return Sample(
+        status=status,
+        ttfb_ms=((first_byte or ended) - started) * 1000,
+        ttft_ms=(first_token - started) * 1000 if first_token else None,
+        total_ms=(ended - started) * 1000,
+        bytes=size,
+        frames=frames,
+        error=error,
+    )
+
+
+async def run_chat(app, chat: int, turns: int, attachments: List[Dict[str, Any]], stream_mode: str,
+                   samples: List[Sample], resend: bool = False, orchestration: Optional[str] = None) -> None:
+    messages: List[Dict[str, Any]] = []
+    for turn in range(turns):
+        question = f"Chat {chat} turn {turn}: what is the liability cap and notice period?"
+        if orchestration == "fanout":
+            question += " How does that compare with current industry standards?"
+        messages.append({"role": "user", "content": question})
+        payload: Dict[str, Any] = {"messages": messages, "chatId": f"loadtest-{chat}", "streamMode": stream_mode}
+        if orchestration:
+            payload["orchestration"] = orchestration
+        if attachments and (turn == 0 or resend):
+            payload["data"] = {"attachments": attachments}
+        sample = await call_chat(app, payload)
+        samples.append(sample)
+        messages.append({"role": "assistant", "content": "ok"})
+
+
+def summarize(samples: List[Sample], wall_s: float, rss_start: int, rss_end: int) -> Dict[str, Any]:
+    ok = [s for s in samples if s.status == 200 and not s.error]
+    ttfb = [s.ttfb_ms for s in ok]
+    ttft = [s.ttft_ms for s in ok if s.ttft_ms is not None]
+    return {
+        "requests": len(samples),
+        "ok": len(ok),
+        "errors": len(samples) - len(ok),
+        "wall_s": round(wall_s, 2),
+        "rps": round(len(samples) / wall_s, 2) if wall_s else 0.0,
+        "ttfb_p50_ms": round(percentile(ttfb, 50), 1) if ttfb else None,
+        "ttfb_p99_ms": round(percentile(ttfb, 99), 1) if ttfb else None,
+        "ttft_p50_ms": round(percentile(ttft, 50), 1) if ttft else None,
+        "ttft_p99_ms": round(percentile(ttft, 99), 1) if ttft else None,
+        "total_p50_ms": round(percentile([s.total_ms for s in ok], 50), 1) if ok else None,
+        "bytes_streamed": sum(s.bytes for s in samples),
+        "frames": sum(s.frames for s in samples),
+        "rss_start_mb": round(rss_start / 2**20, 1),
+        "rss_end_mb": round(rss_end / 2**20, 1),
+        "rss_growth_mb": round((rss_end - rss_start) / 2**20, 1),
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    # No real key is needed; keep anything that would reach the network offline
+    os.environ.setdefault("OPENAI_API_KEY", "sk-loadtest")
+    os.environ.setdefault("OPENAI_AGENTS_DISABLE_TRACING", "1")
+
+    from ..app import app
+    from ..utils.run_config import set_model_provider
+    from .fake_model import Script, ScriptedProvider
+
+    set_model_provider(ScriptedProvider(Script(
+        first_token_ms=args.first_token_ms,
+        token_ms=args.token_ms,
+        answer_tokens=args.answer_tokens,
+        tool_call_ms=args.tool_ms,
+        tools=not args.no_tools,
+        handoff=args.handoff,
+    )))
+
+    rng = random.Random(args.seed)
+    attachments = [
+        [pdf_attachment(args.pages, seed=chat * 100 + d) for d in range(args.docs)] if rng.random() < args.pdf_ratio else []
+        for chat in range(args.sessions)
+    ]
+
+    samples: List[Sample] = []
+    # Warm-up request so imports, pools and caches are not billed to the run
+    await call_chat(app, {"messages": [{"role": "user", "content": "warm up"}], "chatId": "loadtest-warmup"})
+    rss_start = rss_bytes()
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        run_chat(app, chat, args.turns, attachments[chat], args.stream_mode, samples, args.resend, args.orchestration)
+        for chat in range(args.sessions)
+    ))
+    wall_s = time.perf_counter() - started
+    summary = summarize(samples, wall_s, rss_start, rss_bytes())
+    summary["config"] = {**vars(args), "pdf_chats": sum(bool(a) for a in attachments)}
+    errors = [s.error for s in samples if s.error]
+    if errors:
+        summary["first_error"] = errors[0]
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=16, help="concurrent chats")
+    parser.add_argument("--turns", type=int, default=4, help="messages per chat, sent in order")
+    parser.add_argument("--pdf-ratio", type=float, default=0.5, help="share of chats with a PDF attachment")
+    parser.add_argument("--pages", type=int, default=20, help="pages per generated PDF")
+    parser.add_argument("--docs", type=int, default=1, help="PDFs attached per PDF chat")
+    parser.add_argument("--resend", action="store_true", help="re-send attachments every turn, like the web UI")
+    parser.add_argument("--stream-mode", default="delta", choices=("delta", "final"))
+    parser.add_argument("--orchestration", choices=("sequential", "fanout"),
+                        help="send this orchestration mode (fanout questions also ask for industry comparison)")
+    parser.add_argument("--first-token-ms", type=float, default=300.0)
+    parser.add_argument("--token-ms", type=float, default=20.0)
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    parser.add_argument("--tool-ms", type=float, default=400.0, help="model latency of tool-call turns")
+    parser.add_argument("--no-tools", action="store_true", help="answer directly without tool calls")
+    parser.add_argument("--handoff", action="store_true", help="hand off to the research agent first")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run(args))
+    print(f"{summary['requests']} requests ({summary['errors']} errors) in {summary['wall_s']} s "
+          f"-> {summary['rps']} req/s")
+    print(f"{'metric':<10} {'p50 ms':>9} {'p99 ms':>9}")
+    print(f"{'ttfb':<10} {summary['ttfb_p50_ms'] or 0:>9.1f} {summary['ttfb_p99_ms'] or 0:>9.1f}")
+    print(f"{'ttft':<10} {summary['ttft_p50_ms'] or 0:>9.1f} {summary['ttft_p99_ms'] or 0:>9.1f}")
+    print(f"streamed {summary['bytes_streamed'] / 1024:.0f} KiB in {summary['frames']} frames; "
+          f"RSS {summary['rss_start_mb']} -> {summary['rss_end_mb']} MiB (+{summary['rss_growth_mb']})")
+    if summary.get("first_error"):
+        print(f"first error: {summary['first_error']}")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""End-to-end latency and token cost of run_pdf_analysis: "direct" (in-process
+analyzer) vs. "agent" (nested PDF_Analyzer turn).
+
+    python -m backend.benchmarks.pdf_modes [--pages 200] [--runs 5] [--live]
+
+Both paths resolve the document by doc_id from the server-side registry.
+The direct row is always measured. Without --live the agent row is an
+estimate, not a measurement: it is computed from token counts (the nested
+model reads the task and emits a short tool call by handle) as
+2 x --ttft-ms + output tokens / --output-tps, and is labelled as such. With
+--live and OPENAI_API_KEY set it is measured against the real API, including
+the SDK's reported usage.
+"""
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+from ..agents.pdf_agent import PDF_AGENT_INSTRUCTIONS, analyze_pdf, get_pdf_agent, pdf_task
+from ..utils.analysis_cache import analysis_cache
+from ..utils.cache import content_hash
+from ..utils.chunks import retrieve_context
+from ..utils.documents import Document, document_registry
+from ..utils.run_config import get_run_config
+from ..utils.tokens import count_tokens
+from .retrieval import build_document
+
+QUERY = "What is the liability cap amount?"
+CHAT_ID = "pdf-modes-benchmark"
+
+
+def _task(doc: Document) -> str:
+    context = retrieve_context(doc.pages, QUERY, doc.name, doc.sha256)
+    return pdf_task(doc, QUERY, context)
+
+
+async def measure_direct(doc: Document, runs: int) -> float:
+    latencies = []
+    analysis_cache.disk = None  # measure the analysis itself, not a memoized repeat
+    for _ in range(runs):
+        analysis_cache.memory.clear()
+        t0 = time.perf_counter()
+        await analyze_pdf(doc.doc_id, QUERY, mode="direct", chat_id=CHAT_ID)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(latencies)
+
+
+async def measure_agent_live(doc: Document, runs: int):
+    from agents import Runner  # type: ignore
+    from ..utils.context import RequestContext, bind_request
+
+    bind_request(RequestContext(chat_id=CHAT_ID))  # analyze_pdf_content resolves doc_id in this chat
+    latencies, inputs, outputs = [], [], []
+    task = _task(doc)
+    analysis_cache.disk = None
+    for _ in range(runs):
+        analysis_cache.memory.clear()
+        t0 = time.perf_counter()
+        result = await Runner.run(get_pdf_agent(), task, run_config=get_run_config())
+        latencies.append((time.perf_counter() - t0) * 1000)
+        usage = result.context_wrapper.usage
+        inputs.append(usage.input_tokens)
+        outputs.append(usage.output_tokens)
+    return statistics.median(latencies), statistics.median(inputs), statistics.median(outputs)
+
+
+def model_agent(doc: Document, ttft_ms: float, output_tps: float):
+    task = _task(doc)
+    instructions = PDF_AGENT_INSTRUCTIONS
+    # turn 1: read task, emit analyze_pdf_content(doc_id=..., user_query=...)
+    in_1 = count_tokens(instructions) + count_tokens(task)
+    out_1 = count_tokens(doc.doc_id) + count_tokens(QUERY) + 20
+    # turn 2: read the tool result and write the final answer
+    in_2 = in_1 + out_1 + 400
+    out_2 = 300
+    latency = 2 * ttft_ms + (out_1 + out_2) / output_tps * 1000
+    return latency, in_1 + in_2, out_1 + out_2
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--live", action="store_true")
+    parser.add_argument("--ttft-ms", type=float, default=600.0)
+    parser.add_argument("--output-tps", type=float, default=80.0)
+    args = parser.parse_args()
+
+    text, _ = build_document(args.pages, random.Random(11))
+    pages = [text]
+    doc = document_registry.register(CHAT_ID, "benchmark.pdf", content_hash(text.encode("utf-8")), pages)
+    direct_ms = asyncio.run(measure_direct(doc, args.runs))
+
+    if args.live:
+        agent_ms, agent_in, agent_out = asyncio.run(measure_agent_live(doc, args.runs))
+        label = "agent (measured)"
+    else:
+        agent_ms, agent_in, agent_out = model_agent(doc, args.ttft_ms, args.output_tps)
+        label = "agent (ESTIMATE)*"
+
+    print(f"document: {args.pages} pages; query: {QUERY!r}")
+    print(f"\n{'path':<18} {'latency ms':>11} {'input tok':>10} {'output tok':>11}")
+    print(f"{'direct (measured)':<18} {direct_ms:>11.1f} {0:>10} {0:>11}")
+    print(f"{label:<18} {agent_ms:>11.1f} {agent_in:>10} {agent_out:>11}")
+    if not args.live:
+        print(f"\n* not measured: 2 x {args.ttft_ms:g} ms TTFT + {agent_out} output tokens at "
+              f"{args.output_tps:g} tok/s, tokens counted locally; run with --live to measure")
+    print("\n(both paths share the orchestrator's own tool-call tokens, which are not counted here)")
+
+
+if __name__ == "__main__":
+    main()
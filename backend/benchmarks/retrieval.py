@@ -0,0 +1,115 @@
+"""Query latency and ranking quality of the BM25 sentence index vs. the legacy
+substring counter on a synthetic 1k-page document.
+
+    python -m backend.benchmarks.retrieval [--pages 1000] [--queries 50]
+"""
+import re
+import time
+import random
+import argparse
+import statistics
+from typing import List, Tuple
+
+from ..utils.retrieval import BM25Index, split_sentences
+
+FILLER = (
+    "market operating corporate strategy segment customer product region quarter annual "
+    "report management board capital expense margin supply demand pricing contract "
+    "partner employee program initiative portfolio investment risk compliance policy"
+).split()
+TOPICS = [
+    ("warranty claims", "extended"), ("lease termination", "penalty"),
+    ("carbon emissions", "target"), ("data retention", "period"),
+    ("liability cap", "amount"), ("inventory turnover", "ratio"),
+    ("churn rate", "enterprise"), ("interest coverage", "covenant"),
+    ("renewal notice", "days"), ("safety incidents", "reported"),
+]
+
+
+def legacy_rank(sentences: List[str], query: str, k: int = 8) -> List[int]:
+    """The pre-index scorer: count query keywords appearing as substrings."""
+    keywords = {t for t in re.findall(r"[a-zA-Z0-9]+", query.lower()) if len(t) >= 3}
+    scored: List[Tuple[int, int, int]] = []
+    for i, s in enumerate(sentences):
+        low = s.lower()
+        score = sum(1 for kw in keywords if kw in low)
+        if score > 0:
+            scored.append((-score, len(s), i))
+    scored.sort()
+    return [i for _, _, i in scored[:k]]
+
+
+def build_document(pages: int, rng: random.Random) -> Tuple[str, List[Tuple[str, str]]]:
+    """Filler pages with one planted answer sentence per query plus decoys that
+    mention the same words out of order or as substrings of longer words."""
+    sentences: List[str] = []
+    for _ in range(pages * 25):
+        words = rng.choices(FILLER, k=rng.randint(8, 20))
+        sentences.append(" ".join(words).capitalize() + ".")
+
+    cases = []
+    for phrase, detail in TOPICS:
+        a, b = phrase.split()
+        answer = f"The {phrase} {detail} is defined in section {rng.randint(2, 40)}."
+        decoys = [
+            f"{b.capitalize()} figures and {a} notes appear with {detail} {detail} remarks elsewhere.",
+            f"Overall {a}{'s' if not a.endswith('s') else ''} and {b}-related {detail}s were discussed by {rng.choice(FILLER)} teams.",
+            f"Whatever the {a} terms, the other {b} were {detail} elsewhere in the appendix.",
+            f"Sub{a} {detail} and pre{b} review.",
+        ]
+        for s in [answer] + decoys:
+            sentences.insert(rng.randrange(len(sentences)), s)
+        cases.append((f"What is the {phrase} {detail}?", answer))
+    return " ".join(sentences), cases
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    text, cases = build_document(args.pages, rng)
+
+    t0 = time.perf_counter()
+    sentences = split_sentences(text)
+    legacy_split_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    index = BM25Index(sentences)
+    build_s = time.perf_counter() - t0
+    print(f"document: {args.pages} pages, {len(sentences)} sentences, {len(text) / 1e6:.1f} MB")
+    print(f"index build: {build_s * 1000:.0f} ms (one-off per document)")
+
+    workload = [cases[i % len(cases)] for i in range(args.queries)]
+    results = {}
+    for name in ("legacy", "bm25"):
+        latencies, rr, p1 = [], [], 0
+        for query, answer in workload:
+            t0 = time.perf_counter()
+            if name == "legacy":
+                # legacy re-split the document on every call
+                ranked = legacy_rank(split_sentences(text), query)
+            else:
+                ranked = [uid for _, uid, _ in index.search(query, top_k=8)]
+            latencies.append((time.perf_counter() - t0) * 1000)
+            ranked_text = [sentences[i] for i in ranked]
+            rank = ranked_text.index(answer) + 1 if answer in ranked_text else 0
+            rr.append(1.0 / rank if rank else 0.0)
+            p1 += rank == 1
+        results[name] = (latencies, statistics.mean(rr), p1 / len(workload))
+
+    print(f"\n{'engine':<8} {'p50 ms':>9} {'p99 ms':>9} {'MRR@8':>7} {'P@1':>6}")
+    for name, (lat, mrr, p1) in results.items():
+        print(f"{name:<8} {percentile(lat, 50):>9.2f} {percentile(lat, 99):>9.2f} {mrr:>7.2f} {p1:>6.2f}")
+    print(f"\n(legacy split alone: {legacy_split_s * 1000:.0f} ms per query)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the backend as `backend.*`, the way `uvicorn backend.app:app` loads it
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
@@ -0,0 +1,26 @@
+from backend.utils.chunks import ChunkedDocument, retrieve_context
+
+
+PAGES = [
+    "The liability cap is twelve months of fees. Either party may renew annually.",
+    "Security reviews happen every quarter. The vendor keeps audit logs.",
+]
+
+
+def test_matching_query_selects_its_chunk():
+    doc = ChunkedDocument(PAGES)
+    picked = doc.select("quarterly security reviews")
+    assert [c.page for c in picked] == [2]
+
+
+def test_query_without_matches_falls_back_to_opening_chunks():
+    doc = ChunkedDocument(PAGES)
+    picked = doc.select("termination notice period")
+    assert picked == doc.chunks[:len(picked)]
+    assert picked
+
+
+def test_retrieve_context_never_returns_zero_excerpts():
+    context = retrieve_context(PAGES, "termination notice period", "a.pdf", digest="test-digest")
+    assert not context.startswith("(0 of")
+    assert "[a.pdf, p. 1]" in context
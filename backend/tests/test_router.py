@@ -0,0 +1,27 @@
+from backend.agents.router import TIER_GENERAL, TIER_PDF, TIER_RESEARCH, TIER_TRIVIAL, classify
+
+
+def test_greeting_alone_is_trivial():
+    assert classify("Hello, what can you do?", []).tier == TIER_TRIVIAL
+    assert classify("thanks so much!", []).tier == TIER_TRIVIAL
+
+
+def test_greeting_before_a_document_question_is_not_trivial():
+    route = classify("Hi, can you summarize the attached contract?", ["doc_1a2b3c4d"], attached=True)
+    assert route.tier == TIER_PDF
+
+
+def test_acknowledgement_before_a_question_is_not_trivial():
+    route = classify("ok, what is the termination notice period?", ["doc_1a2b3c4d"], attached=True)
+    assert route.tier == TIER_PDF
+    assert classify("ok, what is the termination notice period?", []).tier == TIER_GENERAL
+
+
+def test_thanks_before_a_research_request_is_not_trivial():
+    route = classify("Thanks! Now research the history of liability caps in SaaS contracts", [])
+    assert route.tier == TIER_RESEARCH
+
+
+def test_no_trivial_tier_with_documents():
+    assert classify("thanks!", ["doc_1a2b3c4d"]).tier != TIER_TRIVIAL
+    assert classify("hello", ["doc_1a2b3c4d"], attached=True).tier != TIER_TRIVIAL
@@ -0,0 +1,95 @@
+import os
+import re
+import json
+import hashlib
+from typing import Any, Dict, Optional
+
+from .cache import DiskCache, LRUCache
+from .metrics import Counter
+
+
+# Users re-ask the same question about the same file (retries, refreshes,
+# shared documents). Final analysis payloads are memoized by document key
+# (content hash + extracted page count and size, so a partial extraction never
+# shares entries with the full one) + normalized query text + PDF mode, in a TTL'd LRU with an optional
+# disk tier, so repeats skip retrieval and any nested agent turn.
+ANALYSIS_CACHE_SIZE = int(os.getenv("ATLAS_ANALYSIS_CACHE_SIZE", "1024"))
+ANALYSIS_CACHE_TTL_S = float(os.getenv("ATLAS_ANALYSIS_CACHE_TTL_S", "86400"))
+ANALYSIS_CACHE_DIR = os.getenv("ATLAS_ANALYSIS_CACHE_DIR", "")  # empty disables the disk tier
+# Bump when the analyzer's output changes so stale payloads are not served
+ANALYSIS_VERSION = "3"
+
+ANALYSIS_CACHE = Counter("atlas_analysis_cache_requests_total", "PDF analysis result cache lookups")
+
+
+# Leading courtesy phrases only; question words and negations ("who", "when",
+# "not") change the answer and stay in the key
+_FILLER_RE = re.compile(
+    r"^(?:(?:please|kindly|hey|hi|(?:can|could|would|will) you|tell me|i want to know|i'd like to know)\s+)+"
+)
+
+
+def normalize_query(query: str) -> str:
+    """Case-, punctuation-, whitespace- and leading-filler-insensitive form of a question."""
+    text = " ".join(re.findall(r"[a-z0-9']+", (query or "").lower()))
+    return _FILLER_RE.sub("", text + " ").strip()
+
+
+def analysis_key(doc_key: str, query: str, mode: str) -> str:
+    # doc_key is Document.cache_key; hashed so it is safe as a file name
+    doc = hashlib.sha256(doc_key.encode("utf-8")).hexdigest()[:32]
+    terms = hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()[:16]
+    return f"{doc}_{mode}_{ANALYSIS_VERSION}_{terms}"
+
+
+class AnalysisCache:
+    """Two-tier (memory LRU + optional disk) cache of final analysis JSON payloads."""
+
+    def __init__(self, max_items: int = ANALYSIS_CACHE_SIZE, ttl_s: float = ANALYSIS_CACHE_TTL_S,
+                 directory: str = ANALYSIS_CACHE_DIR):
+        self.memory: LRUCache[str] = LRUCache(max_items=max_items, ttl_s=ttl_s, sizeof=len)
+        self.disk: Optional[DiskCache] = DiskCache(directory, ttl_s=ttl_s) if directory else None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, doc_key: str, query: str, mode: str) -> Optional[str]:
+        key = analysis_key(doc_key, query, mode)
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            raw = self.disk.get(key)
+            if isinstance(raw, dict) and isinstance(raw.get("payload"), str):
+                value = raw["payload"]
+                self.memory.put(key, value)  # promote to the memory tier
+        if value is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+        ANALYSIS_CACHE.inc(result="hit" if value is not None else "miss")
+        return value
+
+    def put(self, doc_key: str, query: str, mode: str, payload: str) -> None:
+        # Only successful, well-formed payloads are reused
+        try:
+            if not json.loads(payload).get("success"):
+                return
+        except (ValueError, AttributeError):
+            return
+        key = analysis_key(doc_key, query, mode)
+        self.memory.put(key, payload)
+        if self.disk is not None:
+            self.disk.put(key, {"payload": payload})
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        out: Dict[str, Any] = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "memory": self.memory.stats(),
+        }
+        if self.disk is not None:
+            out["disk"] = self.disk.stats()
+        return out
+
+
+analysis_cache = AnalysisCache()
@@ -0,0 +1,167 @@
+import os
+import re
+import json
+import base64
+import hashlib
+import tempfile
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional
+
+from .logs import get_logger
+
+
+# Generated files (e.g. rendered PDFs) are stored once under their sha256 and
+# handed to the client as a short /api/file?id=... URL instead of a path or an
+# inline base64 data URL. Content never changes for an id, so responses can be
+# cached as immutable. The least recently served artifacts are removed once
+# the directory exceeds ATLAS_ARTIFACT_MAX_BYTES.
+ARTIFACT_DIR = os.getenv("ATLAS_ARTIFACT_DIR", os.path.join(tempfile.gettempdir(), "atlas_artifacts"))
+ARTIFACT_MAX_BYTES = int(os.getenv("ATLAS_ARTIFACT_MAX_BYTES", str(512 * 1024 * 1024)))
+ARTIFACT_CHUNK_BYTES = 1024 * 1024
+
+_ARTIFACT_ID_RE = re.compile(r"^[0-9a-f]{64}$")
+
+log = get_logger(__name__)
+
+
+@dataclass
+class Artifact:
+    artifact_id: str
+    name: str
+    content_type: str
+    size: int
+    path: str = ""
+
+    @property
+    def url(self) -> str:
+        return f"/api/file?id={self.artifact_id}"
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.artifact_id}"'
+
+
+class ArtifactStore:
+    def __init__(self, directory: str = ARTIFACT_DIR, max_bytes: int = ARTIFACT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.writes = 0
+        self.dedup_hits = 0
+        self.evictions = 0
+
+    def _blob(self, artifact_id: str) -> str:
+        return os.path.join(self.directory, artifact_id)
+
+    def _meta(self, artifact_id: str) -> str:
+        return os.path.join(self.directory, f"{artifact_id}.json")
+
+    def put_bytes(self, data: bytes, name: str, content_type: str = "application/octet-stream") -> Artifact:
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                out.write(data)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        return self._commit(tmp, hashlib.sha256(data).hexdigest(), len(data), name, content_type)
+
+    def put_file(self, path: str, name: Optional[str] = None,
+                 content_type: str = "application/octet-stream") -> Artifact:
+        """Copy a file into the store chunk by chunk, hashing as it goes."""
+        os.makedirs(self.directory, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        try:
+            with open(path, "rb") as src, os.fdopen(fd, "wb") as out:
+                while True:
+                    chunk = src.read(ARTIFACT_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    size += len(chunk)
+                    out.write(chunk)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        return self._commit(tmp, digest.hexdigest(), size, name or os.path.basename(path), content_type)
+
+    def put_base64(self, b64: str, name: str, content_type: str = "application/octet-stream") -> Artifact:
+        return self.put_bytes(base64.b64decode(b64.split(",", 1)[-1]), name, content_type)
+
+    def _commit(self, tmp: str, artifact_id: str, size: int, name: str, content_type: str) -> Artifact:
+        artifact = Artifact(artifact_id=artifact_id, name=name, content_type=content_type, size=size,
+                            path=self._blob(artifact_id))
+        with self._lock:
+            if os.path.exists(artifact.path):
+                os.remove(tmp)  # identical content already stored
+                os.utime(artifact.path)
+                self.dedup_hits += 1
+            else:
+                os.replace(tmp, artifact.path)
+                self.writes += 1
+            # Metadata is written once per blob; a dedup hit keeps the first name
+            if not os.path.exists(self._meta(artifact_id)):
+                meta = {k: v for k, v in asdict(artifact).items() if k != "path"}
+                with open(self._meta(artifact_id), "w", encoding="utf-8") as f:
+                    json.dump(meta, f)
+        self.cleanup(keep=artifact_id)
+        return artifact
+
+    def get(self, artifact_id: str) -> Optional[Artifact]:
+        """Stored artifact for `artifact_id`, or None for malformed / unknown ids."""
+        if not _ARTIFACT_ID_RE.match(artifact_id or ""):
+            return None
+        path = self._blob(artifact_id)
+        try:
+            with open(self._meta(artifact_id), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            os.utime(path)  # recency for size-based cleanup
+        except (OSError, ValueError):
+            return None
+        return Artifact(path=path, **meta)
+
+    def cleanup(self, keep: Optional[str] = None) -> int:
+        """Delete least recently used artifacts until the store fits `max_bytes`."""
+        if not self.max_bytes:
+            return 0
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if not _ARTIFACT_ID_RE.match(entry.name):
+                    continue
+                st = entry.stat()
+                entries.append((st.st_mtime, entry.name, st.st_size))
+                total += st.st_size
+            removed = 0
+            for _mtime, artifact_id, size in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if artifact_id == keep:
+                    continue
+                for path in (self._blob(artifact_id), self._meta(artifact_id)):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                total -= size
+                removed += 1
+            self.evictions += removed
+        if removed:
+            log.info("artifact cleanup removed %d files", removed)
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "writes": self.writes,
+            "dedup_hits": self.dedup_hits,
+            "evictions": self.evictions,
+            "max_bytes": self.max_bytes,
+        }
+
+
+artifact_store = ArtifactStore()
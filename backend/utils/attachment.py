@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseModel
 
 
@@ -10,4 +11,6 @@ class ClientAttachment(BaseModel):
 class Attachment(BaseModel):
     name: str
     type: str
-    content: str
+    # Inline data URL / base64 (legacy) or a documentId from POST /api/upload
+    content: str = ""
+    documentId: Optional[str] = None
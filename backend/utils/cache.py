@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Generic, Optional, Tuple, TypeVar
+
+from .logs import get_logger
+
+V = TypeVar("V")
+log = get_logger(__name__)
+
+
+def content_hash(data: bytes) -> str:
+    """Stable content address used as cache key for uploaded documents."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class LRUCache(Generic[V]):
+    """Thread-safe in-memory LRU with an optional byte budget and TTL.
+
+    `sizeof` estimates the resident size of a value; entries are evicted from
+    the cold end until both `max_items` and `max_bytes` are satisfied.
+    """
+
+    def __init__(
+        self,
+        max_items: int = 0,
+        max_bytes: int = 0,
+        ttl_s: float = 0,
+        sizeof: Optional[Callable[[V], int]] = None,
+    ):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.sizeof = sizeof or (lambda _v: 1)
+        self._data: "OrderedDict[str, Tuple[V, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._data
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: str) -> Optional[V]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, stored_at = entry
+            if self.ttl_s and time.monotonic() - stored_at > self.ttl_s:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: V) -> None:
+        size = max(int(self.sizeof(value)), 0)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            # A single value larger than the whole budget is never cached
+            if self.max_bytes and size > self.max_bytes:
+                return
+            self._data[key] = (value, size, time.monotonic())
+            self._bytes += size
+            while self._data and (
+                (self.max_items and len(self._data) > self.max_items)
+                or (self.max_bytes and self._bytes > self.max_bytes)
+            ):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def pop(self, key: str) -> Optional[V]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            self._remove(key)
+            return entry[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _remove(self, key: str) -> None:
+        _value, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class DiskCache:
+    """Optional JSON-file tier that survives restarts (one file per key)."""
+
+    def __init__(self, directory: str, ttl_s: float = 0):
+        self.directory = directory
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        safe = "".join(c for c in key if c.isalnum() or c in "-_")
+        return os.path.join(self.directory, f"{safe}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            if self.ttl_s and time.time() - os.path.getmtime(path) > self.ttl_s:
+                os.remove(path)
+                self.misses += 1
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(value, f)
+            os.replace(tmp, path)  # atomic so readers never see partial files
+            self.writes += 1
+        except OSError as e:
+            log.warning("disk write failed for %s: %s", key, e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "writes": self.writes}
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one in-flight task.
+
+    The shared task is shielded from individual callers; it is only cancelled
+    when every caller waiting on it has been cancelled.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, "asyncio.Task[Any]"] = {}
+        self._waiters: Dict[str, int] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._calls
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run `fn()` or join the running call for `key`; returns (result, shared)."""
+        task = self._calls.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda _t: self._forget(key, _t))
+            self.leaders += 1
+        else:
+            self.shared += 1
+
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task), shared
+        except asyncio.CancelledError:
+            if not task.done() and self._calls.get(key) is task:
+                self._waiters[key] -= 1
+                if self._waiters[key] <= 0:
+                    task.cancel()
+            raise
+        finally:
+            if self._calls.get(key) is task and task.done():
+                self._forget(key, task)
+
+    def _forget(self, key: str, task: "asyncio.Task[Any]") -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+            self._waiters.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._calls), "leaders": self.leaders, "shared": self.shared}
@@ -0,0 +1,77 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+
+# When the browser tab closes mid-answer the streamed run, nested Runner.run
+# calls inside tools, and queued extraction jobs should stop consuming model
+# tokens and worker capacity. These counters feed /api/stats.
+DISCONNECT_POLL_S = 0.5
+
+cancel_stats: Dict[str, int] = {
+    "client_disconnects": 0,   # disconnects noticed by the watcher
+    "runs_cancelled": 0,       # agent runs stopped before completion
+    "extraction_jobs_cancelled": 0,
+}
+
+
+def count_cancel(kind: str, n: int = 1) -> None:
+    cancel_stats[kind] = cancel_stats.get(kind, 0) + n
+
+
+async def watch_disconnect(
+    is_disconnected: Callable[[], Awaitable[bool]],
+    on_disconnect: Callable[[], Any],
+    poll_s: float = DISCONNECT_POLL_S,
+) -> None:
+    """Poll the client connection and fire `on_disconnect` once it goes away."""
+    while True:
+        await asyncio.sleep(poll_s)
+        try:
+            gone = await is_disconnected()
+        except Exception:
+            gone = True
+        if gone:
+            count_cancel("client_disconnects")
+            on_disconnect()
+            return
+
+
+def consume_result(fut: "asyncio.Future[Any]") -> None:
+    """Mark a finished future's outcome as retrieved (no "never retrieved" warning)."""
+    if fut.done() and not fut.cancelled():
+        fut.exception()
+
+
+async def until_disconnected(events: AsyncIterator[T], disconnected: asyncio.Event) -> AsyncIterator[T]:
+    """Relay `events` until `disconnected` is set, then stop quietly.
+
+    Each step of `events` runs in its own task; on disconnect only that step is
+    cancelled, so the generator's own cleanup runs there and no CancelledError
+    reaches the server's task.
+    """
+    it = events.__aiter__()
+    gone = asyncio.ensure_future(disconnected.wait())
+    step = None
+    try:
+        while not disconnected.is_set():
+            step = asyncio.ensure_future(it.__anext__())
+            await asyncio.wait({step, gone}, return_when=asyncio.FIRST_COMPLETED)
+            if not step.done():
+                break
+            try:
+                item = step.result()
+            except StopAsyncIteration:
+                return
+            yield item
+        if step is not None and not step.done():
+            step.cancel()
+            await asyncio.wait({step})
+    finally:
+        for fut in (step, gone):
+            if fut is None:
+                continue
+            if not fut.done():
+                fut.cancel()
+            fut.add_done_callback(consume_result)
@@ -0,0 +1,116 @@
+import os
+from dataclasses import dataclass
+from typing import List, Optional
+
+from .cache import LRUCache
+from .retrieval import BM25Index, pages_key, query_terms, split_sentences
+from .tokens import count_tokens
+
+
+# Retrieval stage in front of the model: documents are cut into page-tagged
+# chunks once, and only the chunks relevant to the current question are sent,
+# under a token budget, instead of the full extracted text.
+RAG_CHUNK_CHARS = int(os.getenv("ATLAS_RAG_CHUNK_CHARS", "1500"))
+RAG_TOP_K = int(os.getenv("ATLAS_RAG_TOP_K", "8"))
+RAG_TOKEN_BUDGET = int(os.getenv("ATLAS_RAG_TOKEN_BUDGET", "6000"))
+CHUNK_CACHE_SIZE = int(os.getenv("ATLAS_CHUNK_CACHE_SIZE", "32"))
+
+
+@dataclass
+class Chunk:
+    text: str
+    page: Optional[int]  # 1-based page number, None when the source had no page map
+    position: int        # order within the document
+
+
+class ChunkedDocument:
+    """Page-tagged chunks of one document plus a BM25 index over them."""
+
+    def __init__(self, pages: List[str], chunk_chars: int = RAG_CHUNK_CHARS, paged: bool = True):
+        self.chunks: List[Chunk] = []
+        for page_no, page in enumerate(pages, start=1):
+            buf: List[str] = []
+            size = 0
+            for sent in self._pieces(page, chunk_chars):
+                if buf and size + len(sent) > chunk_chars:
+                    self._add(" ".join(buf), page_no if paged else None)
+                    buf, size = [], 0
+                buf.append(sent)
+                size += len(sent) + 1
+            if buf:
+                self._add(" ".join(buf), page_no if paged else None)
+        self.index = BM25Index([c.text for c in self.chunks])
+        self.total_pages = len(pages)
+
+    @staticmethod
+    def _pieces(page: str, chunk_chars: int) -> List[str]:
+        # Extracted text often lacks punctuation; hard-wrap runaway "sentences"
+        out: List[str] = []
+        for sent in split_sentences(page):
+            while len(sent) > chunk_chars:
+                out.append(sent[:chunk_chars])
+                sent = sent[chunk_chars:]
+            if sent:
+                out.append(sent)
+        return out
+
+    def _add(self, text: str, page: Optional[int]) -> None:
+        self.chunks.append(Chunk(text=text, page=page, position=len(self.chunks)))
+
+    def select(self, query: str, token_budget: int = RAG_TOKEN_BUDGET, top_k: int = RAG_TOP_K) -> List[Chunk]:
+        """Top-k chunks for `query` that fit in `token_budget`, in document order.
+
+        Queries without usable terms (e.g. "summarize this"), or whose terms match
+        nothing in the document, get the opening chunks.
+        """
+        candidates: List[Chunk] = []
+        if query_terms(query):
+            candidates = [self.chunks[uid] for _, uid, _ in self.index.search(query, top_k=top_k)]
+        if not candidates:
+            candidates = self.chunks[:top_k]
+        picked: List[Chunk] = []
+        used = 0
+        for chunk in candidates:
+            cost = count_tokens(chunk.text)
+            if picked and used + cost > token_budget:
+                continue
+            picked.append(chunk)
+            used += cost
+        return sorted(picked, key=lambda c: c.position)
+
+
+_chunked_docs: LRUCache[ChunkedDocument] = LRUCache(max_items=CHUNK_CACHE_SIZE)
+
+
+def get_chunked_document(pages: List[str], digest: str = "", paged: bool = True) -> ChunkedDocument:
+    """Chunked + indexed document, built once per distinct page set."""
+    key = f"{pages_key(pages, digest)}:{'paged' if paged else 'flat'}"
+    doc = _chunked_docs.get(key)
+    if doc is None:
+        doc = ChunkedDocument(pages, paged=paged)
+        _chunked_docs.put(key, doc)
+    return doc
+
+
+def format_chunks(chunks: List[Chunk], source: str = "") -> str:
+    parts = []
+    for c in chunks:
+        label = ", ".join(x for x in (source, f"p. {c.page}" if c.page else "") if x)
+        parts.append(f"[{label}] {c.text}" if label else c.text)
+    return "\n\n".join(parts)
+
+
+def retrieve_context(
+    pages: List[str],
+    query: str,
+    source: str = "",
+    digest: str = "",
+    token_budget: int = RAG_TOKEN_BUDGET,
+    paged: bool = True,
+) -> str:
+    """Relevant excerpts of a document, with page references, under a token budget."""
+    doc = get_chunked_document(pages, digest=digest, paged=paged)
+    chunks = doc.select(query, token_budget=token_budget)
+    header = f"({len(chunks)} of {len(doc.chunks)} sections"
+    header += f" from {doc.total_pages} pages)" if paged else ")"
+    return header + "\n" + format_chunks(chunks, source)
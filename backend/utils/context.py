@@ -0,0 +1,88 @@
+import os
+import asyncio
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+# Per-request options that tools need to see. Function tools are module-level
+# singletons shared by every request, so options travel in a ContextVar that
+# is bound before Runner.run_streamed (its background task copies the context).
+PDF_MODE_DIRECT = "direct"  # run the deterministic analyzer in-process
+PDF_MODE_AGENT = "agent"    # nested PDF_Analyzer agent turn (legacy)
+PDF_MODES = (PDF_MODE_DIRECT, PDF_MODE_AGENT)
+DEFAULT_PDF_MODE = os.getenv("ATLAS_PDF_MODE", PDF_MODE_DIRECT)
+
+
+def resolve_pdf_mode(requested: Optional[str]) -> str:
+    mode = (requested or "").strip().lower()
+    if mode in PDF_MODES:
+        return mode
+    return DEFAULT_PDF_MODE if DEFAULT_PDF_MODE in PDF_MODES else PDF_MODE_DIRECT
+
+
+# How the orchestrator handles requests that need several sources
+ORCHESTRATION_SEQUENTIAL = "sequential"  # one agent loop, tool calls turn by turn
+ORCHESTRATION_FANOUT = "fanout"          # plan branches up front, run them concurrently, then synthesize
+ORCHESTRATION_MODES = (ORCHESTRATION_SEQUENTIAL, ORCHESTRATION_FANOUT)
+DEFAULT_ORCHESTRATION = os.getenv("ATLAS_ORCHESTRATION", ORCHESTRATION_SEQUENTIAL)
+
+
+def resolve_orchestration(requested: Optional[str]) -> str:
+    mode = (requested or "").strip().lower()
+    if mode in ORCHESTRATION_MODES:
+        return mode
+    return DEFAULT_ORCHESTRATION if DEFAULT_ORCHESTRATION in ORCHESTRATION_MODES else ORCHESTRATION_SEQUENTIAL
+
+
+# Pre-routing: "auto" classifies each request into a latency tier (agents/router.py),
+# "off" sends everything through the full orchestrator
+ROUTING_AUTO = "auto"
+ROUTING_OFF = "off"
+ROUTING_MODES = (ROUTING_AUTO, ROUTING_OFF)
+DEFAULT_ROUTING = os.getenv("ATLAS_ROUTING", ROUTING_AUTO)
+
+
+def resolve_routing(requested: Optional[str]) -> str:
+    mode = (requested or "").strip().lower()
+    if mode in ROUTING_MODES:
+        return mode
+    return DEFAULT_ROUTING if DEFAULT_ROUTING in ROUTING_MODES else ROUTING_AUTO
+
+
+@dataclass
+class RequestContext:
+    chat_id: str = "default"
+    pdf_mode: str = DEFAULT_PDF_MODE
+    # Side-channel for tools: payloads are streamed to the client as `thinking` events
+    events: "asyncio.Queue[Dict[str, Any]]" = field(default_factory=asyncio.Queue)
+    # Model token usage of this request per agent (see utils/usage.py)
+    usage: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    # Per-model scheduler slots taken mid-run (research handoff); released when the request ends
+    held_models: List[str] = field(default_factory=list)
+
+
+_current: ContextVar[Optional[RequestContext]] = ContextVar("atlas_request", default=None)
+
+
+def current_request() -> Optional[RequestContext]:
+    return _current.get()
+
+
+def bind_request(ctx: RequestContext) -> Token:
+    return _current.set(ctx)
+
+
+def unbind_request(token: Token) -> None:
+    try:
+        _current.reset(token)
+    except ValueError:
+        # Token created in another context (e.g. generator resumed elsewhere)
+        _current.set(None)
+
+
+def emit_event(payload: Dict[str, Any]) -> None:
+    """Send a progress payload to the current request's stream (no-op outside one)."""
+    ctx = _current.get()
+    if ctx is not None:
+        ctx.events.put_nowait(payload)
@@ -0,0 +1,171 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from .metrics import Counter
+from .retrieval import BM25Index, get_paged_sentence_index, pages_key
+
+
+# Server-side registry of extracted documents, scoped per chat. The model
+# only ever sees a short handle (doc_id) and excerpts; tools resolve the
+# handle back to the text, page map and sentence index here, so document
+# text never has to be generated as tool-call arguments. Page lists are
+# shared with the PDF text cache rather than copied.
+DOC_REGISTRY_MAX_CHATS = int(os.getenv("ATLAS_DOC_REGISTRY_MAX_CHATS", "512"))
+DOC_REGISTRY_TTL_S = float(os.getenv("ATLAS_DOC_REGISTRY_TTL_S", "3600"))
+DOC_ID_CHARS = 8
+# Any document header (full excerpts or a short reference)
+_DOC_MARKER_RE = re.compile(r"\(doc_id: (doc_[0-9a-f]+)")
+# Only the header written in front of full excerpts; chat history is scanned
+# for it to tell which documents a session still holds (references don't count)
+_DOC_EXCERPTS_RE = re.compile(r"\(doc_id: (doc_[0-9a-f]+), \d+ pages\)")
+
+DOC_TOKENS_SAVED = Counter(
+    "atlas_document_tokens_saved_total", "Prompt tokens not re-sent for documents a session already holds"
+)
+
+
+def make_doc_id(sha256: str) -> str:
+    """Short, stable handle for a document (same content -> same id)."""
+    return f"doc_{sha256[:DOC_ID_CHARS]}"
+
+
+@dataclass
+class Document:
+    doc_id: str
+    name: str
+    sha256: str
+    pages: List[str]
+    total_pages: int = 0
+    truncated: bool = False
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.pages)
+
+    @property
+    def cache_key(self) -> str:
+        """Content hash plus page count / text size: differs between a partial and a full extraction."""
+        return pages_key(self.pages, self.sha256)
+
+    @property
+    def index(self) -> BM25Index:
+        """Page-aware sentence index (built once per content hash)."""
+        return get_paged_sentence_index(self.pages, self.sha256)
+
+    def header(self) -> str:
+        return f"### {self.name} (doc_id: {self.doc_id}, {len(self.pages)} pages)"
+
+    def reference(self) -> str:
+        """Short marker used once the excerpts are already in the conversation."""
+        return (f"### {self.name} (doc_id: {self.doc_id}, excerpts sent earlier)\n[Excerpts provided earlier "
+                f"in this conversation; call run_pdf_analysis with this doc_id for anything else.]")
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "doc_id": self.doc_id,
+            "name": self.name,
+            "pages": len(self.pages),
+            "total_pages": self.total_pages,
+            "truncated": self.truncated,
+        }
+
+
+def partial_block(name: str, pages: List[str], total_pages: int, reason: str, context: str) -> str:
+    """Excerpts of a document whose extraction did not finish. Such documents are
+    not registered (no doc_id, tools cannot reach them) and not cached."""
+    done = sum(1 for page in pages if page.strip())
+    return (f"### {name} (incomplete: {reason}; excerpts from {done} of {total_pages} pages, "
+            f"no doc_id)\n{context}")
+
+
+def find_doc_ids(text: str) -> List[str]:
+    """doc_ids whose headers appear in `text`."""
+    return _DOC_MARKER_RE.findall(text or "")
+
+
+def find_excerpt_doc_ids(text: str) -> List[str]:
+    """doc_ids whose full excerpts (not just a reference) appear in `text`."""
+    return _DOC_EXCERPTS_RE.findall(text or "")
+
+
+@dataclass
+class _ChatDocuments:
+    docs: "OrderedDict[str, Document]" = field(default_factory=OrderedDict)
+    touched: float = field(default_factory=time.monotonic)
+
+
+class DocumentRegistry:
+    def __init__(self, max_chats: int = DOC_REGISTRY_MAX_CHATS, ttl_s: float = DOC_REGISTRY_TTL_S):
+        self.max_chats = max_chats
+        self.ttl_s = ttl_s
+        self._chats: "OrderedDict[str, _ChatDocuments]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.misses = 0
+
+    def register(self, chat_id: str, name: str, sha256: str, pages: List[str],
+                 total_pages: int = 0, truncated: bool = False) -> Document:
+        doc = Document(
+            doc_id=make_doc_id(sha256),
+            name=name,
+            sha256=sha256,
+            pages=pages,
+            total_pages=total_pages or len(pages),
+            truncated=truncated,
+        )
+        with self._lock:
+            chat = self._chat(chat_id, create=True)
+            chat.docs[doc.doc_id] = doc
+            chat.docs.move_to_end(doc.doc_id)
+            self._evict()
+        return doc
+
+    def get(self, chat_id: str, doc_id: str) -> Optional[Document]:
+        with self._lock:
+            self.lookups += 1
+            chat = self._chat(chat_id)
+            doc = chat.docs.get((doc_id or "").strip()) if chat else None
+            if doc is None:
+                self.misses += 1
+            return doc
+
+    def list(self, chat_id: str) -> List[Document]:
+        with self._lock:
+            chat = self._chat(chat_id)
+            return list(chat.docs.values()) if chat else []
+
+    def drop(self, chat_id: str) -> None:
+        with self._lock:
+            self._chats.pop(chat_id, None)
+
+    def _chat(self, chat_id: str, create: bool = False) -> Optional[_ChatDocuments]:
+        chat = self._chats.get(chat_id)
+        if chat is not None and self.ttl_s and time.monotonic() - chat.touched > self.ttl_s:
+            del self._chats[chat_id]
+            chat = None
+        if chat is None and create:
+            chat = self._chats[chat_id] = _ChatDocuments()
+        if chat is not None:
+            chat.touched = time.monotonic()
+            self._chats.move_to_end(chat_id)
+        return chat
+
+    def _evict(self) -> None:
+        while self.max_chats and len(self._chats) > self.max_chats:
+            self._chats.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "chats": len(self._chats),
+            "documents": sum(len(c.docs) for c in self._chats.values()),
+            "lookups": self.lookups,
+            "misses": self.misses,
+        }
+
+
+document_registry = DocumentRegistry()
@@ -0,0 +1,12 @@
+import logging
+
+from dotenv import load_dotenv
+
+
+# Loaded once, before any module reads its ATLAS_* / OPENAI_* settings:
+# backend.app imports this first. Existing environment variables win.
+try:
+    load_dotenv(".env")  # working directory (local dev)
+    load_dotenv()        # nearest .env above this package
+except Exception as e:
+    logging.getLogger(__name__).warning("could not load .env file: %s", e)
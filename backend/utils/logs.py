@@ -0,0 +1,32 @@
+import os
+import random
+import logging
+
+
+# Structured logging replaces the old print debugging. Warnings and errors
+# are always logged; per-request detail (message sizes, tool calls, stage
+# timings) is only logged for a sampled fraction of requests.
+LOG_LEVEL = os.getenv("ATLAS_LOG_LEVEL", "INFO").upper()
+# 0 disables verbose request logs, 1 logs every request, 0.05 logs ~5%
+LOG_SAMPLE_RATE = float(os.getenv("ATLAS_LOG_SAMPLE_RATE", "0"))
+
+_configured = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    global _configured
+    if not _configured:
+        _configured = True
+        root = logging.getLogger("backend")
+        if not root.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+            root.addHandler(handler)
+        root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+        root.propagate = False
+    return logging.getLogger(name)
+
+
+def sampled(rate: float = LOG_SAMPLE_RATE) -> bool:
+    """Decide once per request whether its verbose logs are emitted."""
+    return rate >= 1 or (rate > 0 and random.random() < rate)
@@ -0,0 +1,385 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+
+from .documents import find_excerpt_doc_ids
+
+if TYPE_CHECKING:
+    from agents.items import TResponseInputItem  # type: ignore
+else:
+    # Keep the Agents SDK out of import time (cold start); items are plain dicts here
+    TResponseInputItem = Dict[str, Any]
+
+
+# Chat memory for /api/chat. Resident sessions live in a bounded LRU (max
+# count, idle TTL, total byte budget). When ATLAS_SESSION_DB points to a file,
+# every chat shares one WAL-mode SQLite database with batched writes, so
+# evicted sessions (or sessions from before a restart) are rehydrated lazily.
+# Without it, eviction forgets the conversation, like a session reset.
+SESSION_MAX_RESIDENT = int(os.getenv("ATLAS_SESSION_MAX_RESIDENT", "256"))
+SESSION_IDLE_TTL_S = float(os.getenv("ATLAS_SESSION_IDLE_TTL_S", "3600"))
+SESSION_MAX_BYTES = int(os.getenv("ATLAS_SESSION_MAX_BYTES", str(128 * 1024 * 1024)))
+SESSION_DB = os.getenv("ATLAS_SESSION_DB", "")
+SESSION_BATCH_SIZE = int(os.getenv("ATLAS_SESSION_BATCH_SIZE", "64"))
+SESSION_FLUSH_MS = int(os.getenv("ATLAS_SESSION_FLUSH_MS", "250"))
+
+
+def _item_size(item: Any) -> int:
+    return len(json.dumps(item, default=str))
+
+
+def _item_doc_ids(item: Any) -> List[str]:
+    # Only user turns carry document excerpts (tool-call JSON does not match the header)
+    if not isinstance(item, dict) or item.get("role") != "user":
+        return []
+    content = item.get("content")
+    return find_excerpt_doc_ids(content if isinstance(content, str) else json.dumps(content, default=str))
+
+
+class SessionDatabase:
+    """Single file-backed SQLite store shared by all chats.
+
+    Uses the same tables as the Agents SDK `SQLiteSession`, one connection in
+    WAL mode, and a write-behind queue committed in one transaction per batch.
+    """
+
+    def __init__(self, path: str, batch_size: int = SESSION_BATCH_SIZE, flush_ms: int = SESSION_FLUSH_MS):
+        self.path = path
+        self.batch_size = max(batch_size, 1)
+        self.flush_s = max(flush_ms, 0) / 1000.0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS agent_sessions (
+                session_id TEXT PRIMARY KEY,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS agent_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                message_data TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (session_id) REFERENCES agent_sessions (session_id) ON DELETE CASCADE
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_agent_messages_session_id ON agent_messages (session_id, id)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()  # guards _pending only
+        self._conn_lock = threading.Lock()  # serializes use of _conn
+        self._pending: List[Tuple[str, str]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self.batches = 0
+        self.rows_written = 0
+
+    def enqueue(self, session_id: str, items: List[TResponseInputItem]) -> None:
+        with self._lock:
+            self._pending.extend((session_id, json.dumps(item)) for item in items)
+            size = len(self._pending)
+        if size >= self.batch_size:
+            asyncio.get_running_loop().create_task(self.flush())
+        elif self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(
+                self.flush_s, lambda: loop.create_task(self.flush())
+            )
+
+    def has_pending(self, session_id: str) -> bool:
+        with self._lock:
+            return any(sid == session_id for sid, _ in self._pending)
+
+    async def flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        await asyncio.to_thread(self._flush_sync)
+
+    def _flush_sync(self) -> None:
+        # Take the connection first so readers that find nothing pending still
+        # wait for rows already swapped out; enqueue only needs _lock and is
+        # never blocked by the transaction.
+        with self._conn_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return
+            sessions = {(sid,) for sid, _ in rows}
+            with self._conn:  # one transaction per batch
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO agent_sessions (session_id) VALUES (?)", sessions
+                )
+                self._conn.executemany(
+                    "INSERT INTO agent_messages (session_id, message_data) VALUES (?, ?)", rows
+                )
+                self._conn.executemany(
+                    "UPDATE agent_sessions SET updated_at = CURRENT_TIMESTAMP WHERE session_id = ?",
+                    sessions,
+                )
+            self.batches += 1
+            self.rows_written += len(rows)
+
+    async def load(self, session_id: str) -> List[TResponseInputItem]:
+        if self.has_pending(session_id):
+            await self.flush()
+
+        def _load() -> List[TResponseInputItem]:
+            with self._conn_lock:
+                rows = self._conn.execute(
+                    "SELECT message_data FROM agent_messages WHERE session_id = ? ORDER BY id",
+                    (session_id,),
+                ).fetchall()
+            items = []
+            for (data,) in rows:
+                try:
+                    items.append(json.loads(data))
+                except json.JSONDecodeError:
+                    continue
+            return items
+
+        return await asyncio.to_thread(_load)
+
+    async def delete_last(self, session_id: str) -> None:
+        await self.flush()
+
+        def _delete() -> None:
+            with self._conn_lock, self._conn:
+                self._conn.execute(
+                    """DELETE FROM agent_messages WHERE id = (
+                        SELECT MAX(id) FROM agent_messages WHERE session_id = ?
+                    )""",
+                    (session_id,),
+                )
+
+        await asyncio.to_thread(_delete)
+
+    async def clear(self, session_id: str) -> None:
+        await self.flush()
+
+        def _clear() -> None:
+            with self._conn_lock, self._conn:
+                self._conn.execute("DELETE FROM agent_messages WHERE session_id = ?", (session_id,))
+                self._conn.execute("DELETE FROM agent_sessions WHERE session_id = ?", (session_id,))
+
+        await asyncio.to_thread(_clear)
+
+    async def replace(self, session_id: str, items: List[TResponseInputItem]) -> None:
+        """Atomically swap the stored history of one session."""
+        await self.flush()
+        rows = [(session_id, json.dumps(item)) for item in items]
+
+        def _replace() -> None:
+            with self._conn_lock, self._conn:
+                self._conn.execute("DELETE FROM agent_messages WHERE session_id = ?", (session_id,))
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO agent_sessions (session_id) VALUES (?)", (session_id,)
+                )
+                self._conn.executemany(
+                    "INSERT INTO agent_messages (session_id, message_data) VALUES (?, ?)", rows
+                )
+
+        await asyncio.to_thread(_replace)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+        return {"batches": self.batches, "rows_written": self.rows_written, "pending_rows": pending}
+
+
+class ChatSession:
+    """Agents SDK session (implements the `agents.memory.Session` protocol) whose
+    items stay resident in memory while the chat is hot.
+
+    History is loaded lazily from the shared database (if configured) on first
+    use; writes go to the resident list immediately and to disk in batches.
+    Documents whose excerpts are already in the history are tracked by doc_id
+    (derived from the items, so it survives rehydration and compaction).
+    """
+
+    def __init__(self, session_id: str, db: Optional[SessionDatabase] = None):
+        self.session_id = session_id
+        self.db = db
+        self.approx_bytes = 0
+        self.last_used = time.monotonic()
+        self.in_use = 0
+        self._items: Optional[List[TResponseInputItem]] = None
+        self._hydrate_lock = asyncio.Lock()
+        self.hydrated_from_db = False
+        self._doc_ids: Set[str] = set()
+
+    async def _resident(self) -> List[TResponseInputItem]:
+        if self._items is None:
+            async with self._hydrate_lock:
+                if self._items is None:
+                    items = await self.db.load(self.session_id) if self.db else []
+                    self.hydrated_from_db = bool(items)
+                    self.approx_bytes = sum(_item_size(i) for i in items)
+                    self._items = items
+                    self._index_documents()
+        return self._items
+
+    def _index_documents(self) -> None:
+        self._doc_ids = {doc_id for item in self._items or [] for doc_id in _item_doc_ids(item)}
+
+    async def stored_documents(self) -> Set[str]:
+        """doc_ids whose excerpts this conversation already holds."""
+        await self._resident()
+        return set(self._doc_ids)
+
+    async def get_items(self, limit: Optional[int] = None) -> List[TResponseInputItem]:
+        items = await self._resident()
+        return list(items if limit is None else items[-limit:] if limit > 0 else [])
+
+    async def add_items(self, items: List[TResponseInputItem]) -> None:
+        if not items:
+            return
+        resident = await self._resident()
+        resident.extend(items)
+        self.approx_bytes += sum(_item_size(i) for i in items)
+        for item in items:
+            self._doc_ids.update(_item_doc_ids(item))
+        if self.db is not None:
+            self.db.enqueue(self.session_id, items)
+
+    async def pop_item(self) -> Optional[TResponseInputItem]:
+        resident = await self._resident()
+        if not resident:
+            return None
+        item = resident.pop()
+        self.approx_bytes -= _item_size(item)
+        if _item_doc_ids(item):
+            self._index_documents()
+        if self.db is not None:
+            await self.db.delete_last(self.session_id)
+        return item
+
+    async def clear_session(self) -> None:
+        self._items = []
+        self.approx_bytes = 0
+        self._doc_ids = set()
+        if self.db is not None:
+            await self.db.clear(self.session_id)
+
+    async def replace_items(self, items: List[TResponseInputItem]) -> None:
+        self._items = list(items)
+        self.approx_bytes = sum(_item_size(i) for i in items)
+        self._index_documents()
+        if self.db is not None:
+            await self.db.replace(self.session_id, items)
+
+
+class SessionManager:
+    """Bounded set of resident chat sessions: LRU + idle TTL + total byte budget."""
+
+    def __init__(
+        self,
+        max_resident: int = SESSION_MAX_RESIDENT,
+        idle_ttl_s: float = SESSION_IDLE_TTL_S,
+        max_bytes: int = SESSION_MAX_BYTES,
+        db_path: str = SESSION_DB,
+    ):
+        self.max_resident = max_resident
+        self.idle_ttl_s = idle_ttl_s
+        self.max_bytes = max_bytes
+        self.db: Optional[SessionDatabase] = SessionDatabase(db_path) if db_path else None
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self.evictions: Dict[str, int] = {"lru": 0, "idle": 0, "memory": 0}
+        self.created = 0
+        self.rehydrated = 0
+
+    def get(self, chat_id: str) -> ChatSession:
+        session = self._sessions.get(chat_id)
+        if session is None:
+            session = ChatSession(f"atlas_chat_{chat_id}", self.db)
+            self._sessions[chat_id] = session
+            self.created += 1
+        else:
+            self._sessions.move_to_end(chat_id)
+        session.last_used = time.monotonic()
+        self._evict(keep=chat_id)
+        return session
+
+    def acquire(self, chat_id: str) -> ChatSession:
+        """Get the session and pin it so it is not evicted mid-run."""
+        session = self.get(chat_id)
+        session.in_use += 1
+        return session
+
+    async def release(self, session: ChatSession) -> None:
+        session.in_use = max(session.in_use - 1, 0)
+        session.last_used = time.monotonic()
+        if session.hydrated_from_db:
+            self.rehydrated += 1
+            session.hydrated_from_db = False
+        if self.db is not None:
+            await self.db.flush()  # end of turn: commit this turn's items
+        self._evict()
+
+    async def reset(self, chat_id: str) -> bool:
+        session = self._sessions.pop(chat_id, None)
+        if session is not None:
+            await session.clear_session()
+        elif self.db is not None:
+            await self.db.clear(f"atlas_chat_{chat_id}")
+        return session is not None
+
+    def resident_bytes(self) -> int:
+        return sum(s.approx_bytes for s in self._sessions.values())
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        now = time.monotonic()
+        for chat_id, session in list(self._sessions.items()):
+            if chat_id != keep and not session.in_use and now - session.last_used > self.idle_ttl_s:
+                del self._sessions[chat_id]
+                self.evictions["idle"] += 1
+
+        def _victim() -> Optional[str]:
+            # Oldest unpinned session first
+            for chat_id, session in self._sessions.items():
+                if chat_id != keep and not session.in_use:
+                    return chat_id
+            return None
+
+        while len(self._sessions) > self.max_resident:
+            victim = _victim()
+            if victim is None:
+                break
+            del self._sessions[victim]
+            self.evictions["lru"] += 1
+
+        if self.max_bytes:
+            total = self.resident_bytes()
+            while total > self.max_bytes:
+                victim = _victim()
+                if victim is None:
+                    break
+                total -= self._sessions.pop(victim).approx_bytes
+                self.evictions["memory"] += 1
+
+    def __contains__(self, chat_id: str) -> bool:
+        return chat_id in self._sessions
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "resident_sessions": len(self._sessions),
+            "resident_bytes": self.resident_bytes(),
+            "created": self.created,
+            "rehydrated": self.rehydrated,
+            "evictions": dict(self.evictions),
+            "persistent": self.db is not None,
+        }
+        if self.db is not None:
+            out["db"] = self.db.stats()
+        return out
+
+
+session_manager = SessionManager()
@@ -0,0 +1,161 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+# Minimal Prometheus text-format metrics (exposition format 0.0.4) so the
+# backend can be scraped without adding prometheus_client as a dependency.
+# Latency histograms cover the per-request stages of /api/chat; component
+# stats (caches, sessions, scheduler, ...) are exported as gauges at scrape time.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+registry: List[Any] = []
+
+
+def _labels(values: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in values.items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + body + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        # labels -> (per-bucket counts, sum, count)
+        self._series: Dict[Labels, Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            counts, total, n = self._series.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._series[key] = (counts, total + value, n + 1)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, n) in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', _format_value(float(bound))))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {n}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {n}")
+        return lines
+
+
+# Stages: parse, decode, extract, retrieve, queue, budget, ttft, total
+STAGE_SECONDS = Histogram("atlas_stage_seconds", "Duration of /api/chat request stages")
+TOOL_SECONDS = Histogram("atlas_tool_seconds", "Duration of agent tool calls")
+HANDOFF_SECONDS = Histogram("atlas_handoff_seconds", "Time from handoff call to the new agent taking over")
+HANDOFFS = Counter("atlas_handoffs_total", "Agent handoffs")
+REQUESTS = Counter("atlas_chat_requests_total", "Chat requests by outcome")
+
+
+class RequestTimer:
+    """Per-request stage timings; every span is also recorded in STAGE_SECONDS."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: Dict[str, float] = {}
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def record(self, stage: str, seconds: float) -> None:
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+        STAGE_SECONDS.observe(seconds, stage=stage)
+
+    def mark(self, stage: str) -> None:
+        """Record the time since the request started (e.g. time-to-first-token)."""
+        if stage not in self.spans:
+            self.record(stage, self.elapsed())
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def summary(self) -> Dict[str, float]:
+        return {stage: round(seconds * 1000, 1) for stage, seconds in self.spans.items()}
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Record a stage outside of a RequestTimer (e.g. inside utils)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def _flatten(prefix: str, value: Any, out: List[Tuple[str, float]]) -> None:
+    if isinstance(value, bool):
+        out.append((prefix, float(value)))
+    elif isinstance(value, (int, float)):
+        out.append((prefix, value))
+    elif isinstance(value, dict):
+        for key, inner in value.items():
+            name = "".join(c if c.isalnum() else "_" for c in str(key))
+            _flatten(f"{prefix}_{name}", inner, out)
+
+
+def render_metrics(gauges: Optional[Dict[str, Any]] = None) -> str:
+    """Render all registered metrics plus numeric leaves of `gauges` as atlas_* gauges."""
+    lines: List[str] = []
+    for metric in registry:
+        lines.extend(metric.render())
+    flat: List[Tuple[str, float]] = []
+    _flatten("atlas", gauges or {}, flat)
+    for name, value in flat:
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,127 @@
+import os
+import functools
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+from . import env  # noqa: F401  (OPENAI_API_KEY may come from .env)
+from .metrics import Counter
+
+if TYPE_CHECKING:
+    import httpx
+    from openai import AsyncOpenAI
+    from agents.models.interface import Model, ModelProvider  # type: ignore
+
+
+# One process-wide AsyncOpenAI client (one httpx connection pool with
+# keep-alive) behind every agent run: the streamed orchestrator and the
+# nested PDF / research runs. Per-model clients are `with_options` views of
+# it, so they differ in timeout and retry budget but share connections.
+# Retries use the SDK's exponential backoff with jitter and honour
+# Retry-After. Built on first use to keep cold start cheap.
+MAX_CONNECTIONS = int(os.getenv("ATLAS_OPENAI_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE = int(os.getenv("ATLAS_OPENAI_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY_S = float(os.getenv("ATLAS_OPENAI_KEEPALIVE_S", "60"))
+CONNECT_TIMEOUT_S = float(os.getenv("ATLAS_OPENAI_CONNECT_TIMEOUT_S", "10"))
+DEFAULT_TIMEOUT_S = float(os.getenv("ATLAS_OPENAI_TIMEOUT_S", "120"))
+DEFAULT_MAX_RETRIES = int(os.getenv("ATLAS_OPENAI_MAX_RETRIES", "2"))
+# Deep research turns run for minutes; retrying one is rarely worth it
+MODEL_TIMEOUTS: Dict[str, float] = {"o4-mini-deep-research": 900.0}
+MODEL_MAX_RETRIES: Dict[str, int] = {"o4-mini-deep-research": 0}
+# e.g. ATLAS_OPENAI_MODEL_TIMEOUTS="gpt-4.1=90,o4-mini-deep-research=1200"
+for _pair in filter(None, os.getenv("ATLAS_OPENAI_MODEL_TIMEOUTS", "").split(",")):
+    _model, _, _value = _pair.partition("=")
+    try:
+        MODEL_TIMEOUTS[_model.strip()] = float(_value)
+    except ValueError:
+        pass
+for _pair in filter(None, os.getenv("ATLAS_OPENAI_MODEL_RETRIES", "").split(",")):
+    _model, _, _value = _pair.partition("=")
+    if _value.strip().isdigit():
+        MODEL_MAX_RETRIES[_model.strip()] = int(_value)
+
+OPENAI_REQUESTS = Counter("atlas_openai_requests_total", "HTTP requests sent to the OpenAI API")
+OPENAI_RETRIES = Counter("atlas_openai_retries_total", "Requests that were SDK retries of an earlier attempt")
+OPENAI_CONNECTIONS = Counter("atlas_openai_connections_total", "New TCP connections opened to the OpenAI API")
+OPENAI_TLS_HANDSHAKES = Counter("atlas_openai_tls_handshakes_total", "TLS handshakes with the OpenAI API")
+
+_pool_stats: Dict[str, int] = {"requests": 0, "retries": 0, "connections": 0, "tls_handshakes": 0}
+
+
+async def _trace(event_name: str, info: Dict[str, Any]) -> None:
+    # httpcore reports connection setup; a request without these events reused a pooled connection
+    if event_name == "connection.connect_tcp.complete":
+        _pool_stats["connections"] += 1
+        OPENAI_CONNECTIONS.inc()
+    elif event_name == "connection.start_tls.complete":
+        _pool_stats["tls_handshakes"] += 1
+        OPENAI_TLS_HANDSHAKES.inc()
+
+
+async def _on_request(request: "httpx.Request") -> None:
+    request.extensions["trace"] = _trace
+    _pool_stats["requests"] += 1
+    OPENAI_REQUESTS.inc()
+    if request.headers.get("x-stainless-retry-count", "0") not in ("", "0"):
+        _pool_stats["retries"] += 1
+        OPENAI_RETRIES.inc()
+
+
+@functools.lru_cache(maxsize=1)
+def get_async_client() -> "AsyncOpenAI":
+    import httpx
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE,
+            keepalive_expiry=KEEPALIVE_EXPIRY_S,
+        ),
+        timeout=httpx.Timeout(DEFAULT_TIMEOUT_S, connect=CONNECT_TIMEOUT_S),
+        event_hooks={"request": [_on_request]},
+    )
+    return AsyncOpenAI(
+        api_key=os.environ.get("OPENAI_API_KEY"),
+        http_client=http_client,
+        max_retries=DEFAULT_MAX_RETRIES,
+    )
+
+
+def model_limits(model: str) -> Tuple[float, int]:
+    """(timeout seconds, max retries) for `model`."""
+    return MODEL_TIMEOUTS.get(model, DEFAULT_TIMEOUT_S), MODEL_MAX_RETRIES.get(model, DEFAULT_MAX_RETRIES)
+
+
+@functools.lru_cache(maxsize=None)
+def client_for_model(model: str) -> "AsyncOpenAI":
+    import httpx
+
+    timeout_s, retries = model_limits(model)
+    return get_async_client().with_options(
+        timeout=httpx.Timeout(timeout_s, connect=CONNECT_TIMEOUT_S),
+        max_retries=retries,
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def get_model_provider() -> "ModelProvider":
+    """Responses-API provider whose models all share the pooled client."""
+    from agents.models.interface import ModelProvider  # type: ignore
+    from agents.models.openai_provider import DEFAULT_MODEL  # type: ignore
+    from agents.models.openai_responses import OpenAIResponsesModel  # type: ignore
+
+    class PooledOpenAIProvider(ModelProvider):
+        def get_model(self, model_name: Optional[str]) -> "Model":
+            name = model_name or DEFAULT_MODEL
+            return OpenAIResponsesModel(model=name, openai_client=client_for_model(name))
+
+    return PooledOpenAIProvider()
+
+
+def client_stats() -> Dict[str, Any]:
+    requests = _pool_stats["requests"]
+    return {
+        **_pool_stats,
+        "connection_reuse_ratio": round(1 - _pool_stats["connections"] / requests, 4) if requests else 0.0,
+        "max_connections": MAX_CONNECTIONS,
+        "max_keepalive": MAX_KEEPALIVE,
+    }
@@ -0,0 +1,56 @@
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from .cache import DiskCache, LRUCache
+
+
+# The frontend re-sends the same attachments on every turn; extracted text is
+# cached by the SHA-256 of the PDF bytes so follow-up questions skip pypdf.
+PDF_CACHE_MAX_BYTES = int(os.getenv("ATLAS_PDF_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+PDF_CACHE_DIR = os.getenv("ATLAS_PDF_CACHE_DIR", "")  # empty disables the disk tier
+
+
+@dataclass
+class CachedPdfText:
+    pages: List[str]
+    total_pages: int
+
+
+def _sizeof(value: CachedPdfText) -> int:
+    # Rough resident size of the page strings (Python str overhead ignored)
+    return sum(len(p) for p in value.pages) + 64 * len(value.pages)
+
+
+class PdfTextCache:
+    """Two-tier (memory LRU + optional disk) cache of extracted PDF pages."""
+
+    def __init__(self, max_bytes: int = PDF_CACHE_MAX_BYTES, directory: str = PDF_CACHE_DIR):
+        self.memory: LRUCache[CachedPdfText] = LRUCache(max_bytes=max_bytes, sizeof=_sizeof)
+        self.disk: Optional[DiskCache] = DiskCache(directory) if directory else None
+
+    def get(self, digest: str) -> Optional[CachedPdfText]:
+        value = self.memory.get(digest)
+        if value is not None or self.disk is None:
+            return value
+        raw = self.disk.get(digest)
+        if not isinstance(raw, dict) or not isinstance(raw.get("pages"), list):
+            return None
+        value = CachedPdfText(pages=raw["pages"], total_pages=int(raw.get("total_pages") or 0))
+        self.memory.put(digest, value)  # promote to the memory tier
+        return value
+
+    def put(self, digest: str, pages: List[str], total_pages: int) -> None:
+        value = CachedPdfText(pages=pages, total_pages=total_pages)
+        self.memory.put(digest, value)
+        if self.disk is not None:
+            self.disk.put(digest, {"pages": pages, "total_pages": total_pages})
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"memory": self.memory.stats()}
+        if self.disk is not None:
+            out["disk"] = self.disk.stats()
+        return out
+
+
+pdf_text_cache = PdfTextCache()
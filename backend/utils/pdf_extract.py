@@ -0,0 +1,424 @@
+import os
+import time
+import base64
+import asyncio
+import tempfile
+import threading
+import concurrent.futures
+from io import BytesIO
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from .attachment import Attachment
+from .cache import content_hash
+from .cancellation import count_cancel
+from .logs import get_logger
+from .metrics import timed
+from .pdf_cache import pdf_text_cache
+from .uploads import upload_path
+
+
+# Extraction runs outside the event loop so one large upload cannot stall
+# every other stream on the worker. "process" gives real parallelism for the
+# pure-Python pypdf parser; "thread" is the fallback for environments where
+# subprocesses are unavailable (e.g. serverless).
+_default_executor = "thread" if os.getenv("VERCEL") else "process"
+PDF_EXECUTOR = os.getenv("ATLAS_PDF_EXECUTOR", _default_executor).lower()
+PDF_WORKERS = int(os.getenv("ATLAS_PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Per document, from the moment its batches are queued. Batches still queued
+# at the deadline are dropped; a batch already running stops at its next page
+# boundary (a single page being parsed cannot be interrupted).
+PDF_TIMEOUT_S = float(os.getenv("ATLAS_PDF_TIMEOUT_S", "60"))
+PDF_MAX_PAGES = int(os.getenv("ATLAS_PDF_MAX_PAGES", "500"))
+PDF_PROGRESS_INTERVAL_S = float(os.getenv("ATLAS_PDF_PROGRESS_INTERVAL_S", "1.0"))
+# Pages per extraction job; batches of one document run in parallel across workers
+PDF_BATCH_PAGES = int(os.getenv("ATLAS_PDF_BATCH_PAGES", "16"))
+# Minimum seconds between partial key-point previews for one document
+PDF_PARTIAL_INTERVAL_S = float(os.getenv("ATLAS_PDF_PARTIAL_INTERVAL_S", "2.0"))
+# Jobs receive a file path, not the PDF bytes: uploads are read from the upload
+# store, inline attachments are spooled here for the duration of the request.
+# Each worker keeps its last few parsed documents, so a document is read and
+# parsed once per worker rather than once per batch.
+PDF_SPOOL_DIR = os.getenv("ATLAS_PDF_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "atlas_pdf_spool"))
+_READERS_PER_WORKER = 2
+
+# (text_so_far, query) -> analysis payload with "key_points"
+PartialAnalyzer = Callable[[str, str], Dict[str, Any]]
+
+log = get_logger(__name__)
+
+
+@dataclass
+class ExtractedPdf:
+    name: str
+    pages: List[str] = field(default_factory=list)
+    total_pages: int = 0
+    truncated: bool = False
+    error: Optional[str] = None
+    sha256: str = ""
+    cached: bool = False
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.pages)
+
+
+def decode_data_url(content: str) -> bytes:
+    """Decode a `data:application/pdf;base64,<b64>` URL (or bare base64)."""
+    b64 = content.split(",", 1)[1] if "," in content else content
+    return base64.b64decode(b64)
+
+
+def extract_pdf_pages(pdf_bytes: bytes, max_pages: int = PDF_MAX_PAGES) -> Tuple[List[str], int]:
+    """Extract per-page text. Runs inside a worker, so keep it picklable and top-level.
+
+    Returns (page_texts, total_page_count); only the first `max_pages` pages are read.
+    """
+    from pypdf import PdfReader
+
+    reader = PdfReader(BytesIO(pdf_bytes))
+    total = len(reader.pages)
+    limit = total if max_pages <= 0 else min(total, max_pages)
+    pages = [(reader.pages[i].extract_text() or "") for i in range(limit)]
+    return pages, total
+
+
+_worker_state = threading.local()
+
+
+def _reader(path: str, digest: str) -> Any:
+    """Parsed PDF for `digest`, cached per worker (per thread in thread mode)."""
+    from pypdf import PdfReader
+
+    readers = getattr(_worker_state, "readers", None)
+    if readers is None:
+        readers = _worker_state.readers = OrderedDict()
+    reader = readers.get(digest)
+    if reader is None:
+        reader = readers[digest] = PdfReader(path)
+        while len(readers) > _READERS_PER_WORKER:
+            readers.popitem(last=False)
+    else:
+        readers.move_to_end(digest)
+    return reader
+
+
+def count_pdf_pages(path: str) -> int:
+    """Page count, read in the calling process.
+
+    Runs on the event loop's default executor, so it deliberately skips the
+    per-worker reader cache: parsed readers would otherwise stay pinned to
+    those threads for the life of the server.
+    """
+    from pypdf import PdfReader
+
+    with open(path, "rb") as f:
+        return len(PdfReader(f).pages)
+
+
+def extract_pdf_page_range(path: str, digest: str, start: int, end: int, deadline: float = 0.0) -> List[str]:
+    """Extract pages [start, end). Worker entry point for batched extraction.
+
+    Stops early (returning fewer pages) once the wall-clock `deadline` passes.
+    """
+    reader = _reader(path, digest)
+    end = min(end, len(reader.pages))
+    texts = []
+    for i in range(start, end):
+        if deadline and time.time() > deadline:
+            break
+        texts.append(reader.pages[i].extract_text() or "")
+    return texts
+
+
+def _load_attachment(att: Attachment) -> Tuple[Optional[bytes], Optional[str], str]:
+    """(inline bytes, stored path, sha256); uploads are never read into memory here."""
+    if att.documentId:
+        path = upload_path(att.documentId)
+        if path is None:
+            raise FileNotFoundError(f"unknown documentId {att.documentId!r}")
+        # Uploads are stored under their SHA-256, so the id is already the cache key
+        return None, path, att.documentId
+    pdf_bytes = decode_data_url(att.content)
+    return pdf_bytes, None, content_hash(pdf_bytes)
+
+
+def _spool(pdf_bytes: bytes) -> str:
+    os.makedirs(PDF_SPOOL_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=PDF_SPOOL_DIR, suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        f.write(pdf_bytes)
+    return path
+
+
+def extract_pdf_text_cached(pdf_bytes: bytes, max_pages: int = PDF_MAX_PAGES) -> str:
+    """Synchronous, cache-aware extraction for callers outside the request stream."""
+    digest = content_hash(pdf_bytes)
+    cached = pdf_text_cache.get(digest)
+    if cached is None:
+        pages, total = extract_pdf_pages(pdf_bytes, max_pages)
+        pdf_text_cache.put(digest, pages, total)
+        return "\n".join(pages)
+    return "\n".join(cached.pages)
+
+
+_executor: Optional[concurrent.futures.Executor] = None
+
+
+def get_executor() -> concurrent.futures.Executor:
+    """Lazily create the bounded extraction pool shared by all requests."""
+    global _executor
+    if _executor is None:
+        workers = max(PDF_WORKERS, 1)
+        if PDF_EXECUTOR == "process":
+            try:
+                _executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+            except (OSError, NotImplementedError) as e:
+                log.warning("process pool unavailable (%s); using threads", e)
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="pdf-extract"
+            )
+    return _executor
+
+
+async def extract_attachments(
+    attachments: List[Attachment],
+    results: List[ExtractedPdf],
+    query: str = "",
+    partial_analyzer: Optional[PartialAnalyzer] = None,
+) -> AsyncIterator[dict]:
+    """Extract every PDF attachment in page batches spread over the worker pool.
+
+    Yields progress payloads (suitable for `thinking` events) as batches
+    finish: per-document pages done / total, and, for multi-batch documents,
+    early key points from `partial_analyzer` over the pages extracted so far.
+    Finished documents are appended to `results` in attachment order.
+    """
+    pdfs = [
+        att for att in attachments
+        if att.type == "application/pdf" and (att.content or att.documentId)
+    ]
+    if not pdfs:
+        return
+
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    started = time.monotonic()
+    docs = [ExtractedPdf(name=att.name) for att in pdfs]
+
+    yield {"type": "pdf_extract", "status": "started", "documents": [att.name for att in pdfs]}
+
+    # Uploaded documents are keyed by id: check the cache before touching the bytes
+    preloaded: Dict[int, Any] = {}
+    for i, att in enumerate(pdfs):
+        if att.documentId:
+            hit = pdf_text_cache.get(att.documentId)
+            if hit is not None:
+                preloaded[i] = hit
+
+    # Decode + hash off the loop, then serve repeats from the content-addressed cache
+    with timed("decode"):
+        loaded = await asyncio.gather(
+            *(asyncio.to_thread(_load_attachment, att) for i, att in enumerate(pdfs) if i not in preloaded),
+            return_exceptions=True,
+        )
+    loaded_iter = iter(loaded)
+    decoded = [
+        (None, None, pdfs[i].documentId) if i in preloaded else next(loaded_iter)
+        for i in range(len(pdfs))
+    ]
+    misses: Dict[int, Tuple[Optional[bytes], Optional[str]]] = {}
+    for i, item in enumerate(decoded):
+        doc = docs[i]
+        if isinstance(item, BaseException):
+            doc.error = str(item)
+            log.warning("failed to load PDF %s: %s", doc.name, item)
+            yield {"type": "pdf_extract", "status": "failed", "document": doc.name}
+            continue
+        pdf_bytes, path, doc.sha256 = item
+        cached = preloaded[i] if i in preloaded else pdf_text_cache.get(doc.sha256)
+        if cached is not None:
+            doc.pages, doc.total_pages, doc.cached = cached.pages, cached.total_pages, True
+            doc.truncated = doc.total_pages > len(doc.pages)
+            yield {
+                "type": "pdf_extract",
+                "status": "cached",
+                "document": doc.name,
+                "pages": len(doc.pages),
+                "total_pages": doc.total_pages,
+            }
+            continue
+        misses[i] = (pdf_bytes, path)
+
+    spooled: List[str] = []
+    pending: set = set()
+    try:
+        # Workers get a path: inline attachments are written to disk once, never pickled per batch
+        paths: Dict[int, str] = {}
+        for i, (pdf_bytes, path) in misses.items():
+            if path is None:
+                path = await asyncio.to_thread(_spool, pdf_bytes)
+                spooled.append(path)
+            paths[i] = path
+        misses.clear()
+
+        # Plan page batches for every miss so all documents share the pool
+        counts = await asyncio.gather(
+            *(asyncio.to_thread(count_pdf_pages, path) for i, path in paths.items()),
+            return_exceptions=True,
+        )
+        slots: Dict[int, List[Optional[str]]] = {}
+        batches_left: Dict[int, int] = {}
+        deadlines: Dict[int, float] = {}
+        last_partial: Dict[int, float] = {}
+        jobs: Dict["asyncio.Future[List[str]]", Tuple[int, int, int]] = {}
+        batch = max(PDF_BATCH_PAGES, 1)
+        for (i, path), total in zip(paths.items(), counts):
+            doc = docs[i]
+            if isinstance(total, BaseException):
+                doc.error = str(total)
+                log.warning("failed to read PDF %s: %s", doc.name, total)
+                yield {"type": "pdf_extract", "status": "failed", "document": doc.name}
+                continue
+            doc.total_pages = total
+            limit = total if PDF_MAX_PAGES <= 0 else min(total, PDF_MAX_PAGES)
+            doc.truncated = total > limit
+            slots[i] = [None] * limit
+            batches_left[i] = 0
+            deadlines[i] = time.monotonic() + PDF_TIMEOUT_S
+            wall_deadline = time.time() + PDF_TIMEOUT_S if PDF_TIMEOUT_S > 0 else 0.0
+            for start in range(0, limit, batch):
+                end = min(start + batch, limit)
+                fut = loop.run_in_executor(
+                    executor, extract_pdf_page_range, path, doc.sha256, start, end, wall_deadline
+                )
+                jobs[fut] = (i, start, end)
+                batches_left[i] += 1
+            if not batches_left[i]:
+                pdf_text_cache.put(doc.sha256, [], total)
+
+        pending = set(jobs)
+        while pending:
+            # Each document has its own deadline
+            now = time.monotonic()
+            expired = {jobs[f][0] for f in pending if PDF_TIMEOUT_S > 0 and now >= deadlines[jobs[f][0]]}
+            for i in sorted(expired):
+                doc = docs[i]
+                dropped = {f for f in pending if jobs[f][0] == i}
+                for fut in dropped:
+                    fut.cancel()  # queued batches; a running one stops at its own deadline
+                pending -= dropped
+                _timed_out(doc, slots[i])
+                yield {"type": "pdf_extract", "status": "timeout", "document": doc.name}
+            if not pending:
+                break
+
+            wait_s = PDF_PROGRESS_INTERVAL_S
+            if PDF_TIMEOUT_S > 0:
+                wait_s = min(wait_s, min(deadlines[jobs[f][0]] for f in pending) - now)
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=max(wait_s, 0.0),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            touched = set()
+            for fut in done:
+                i, start, end = jobs[fut]
+                doc = docs[i]
+                if doc.error:
+                    continue
+                try:
+                    texts = fut.result()
+                except Exception as e:
+                    doc.error = str(e)
+                    log.warning("failed to extract PDF text from %s: %s", doc.name, e)
+                    dropped = {f for f in pending if jobs[f][0] == i}
+                    for other in dropped:
+                        other.cancel()
+                    pending -= dropped
+                    yield {"type": "pdf_extract", "status": "failed", "document": doc.name}
+                    continue
+                slots[i][start:start + len(texts)] = texts
+                if len(texts) < end - start:
+                    # The batch hit the document's deadline in the worker
+                    dropped = {f for f in pending if jobs[f][0] == i}
+                    for other in dropped:
+                        other.cancel()
+                    pending -= dropped
+                    _timed_out(doc, slots[i])
+                    yield {"type": "pdf_extract", "status": "timeout", "document": doc.name}
+                    continue
+                batches_left[i] -= 1
+                touched.add(i)
+            for i in sorted(touched):
+                doc = docs[i]
+                if doc.error:
+                    continue
+                done_pages = sum(1 for p in slots[i] if p is not None)
+                yield {
+                    "type": "pdf_progress",
+                    "document": doc.name,
+                    "pages_done": done_pages,
+                    "pages_total": len(slots[i]),
+                }
+                if batches_left[i] == 0:
+                    doc.pages = [p or "" for p in slots[i]]
+                    pdf_text_cache.put(doc.sha256, doc.pages, doc.total_pages)
+                    yield {
+                        "type": "pdf_extract",
+                        "status": "completed",
+                        "document": doc.name,
+                        "pages": len(doc.pages),
+                        "total_pages": doc.total_pages,
+                        "truncated": doc.truncated,
+                    }
+                elif partial_analyzer is not None and query:
+                    now = time.monotonic()
+                    if now - last_partial.get(i, 0.0) < PDF_PARTIAL_INTERVAL_S:
+                        continue
+                    last_partial[i] = now
+                    text_so_far = "\n".join(p for p in slots[i] if p is not None)
+                    try:
+                        preview = await asyncio.to_thread(partial_analyzer, text_so_far, query)
+                    except Exception as e:
+                        log.warning("partial analysis failed for %s: %s", doc.name, e)
+                        continue
+                    yield {
+                        "type": "pdf_partial",
+                        "document": doc.name,
+                        "pages_done": done_pages,
+                        "pages_total": len(slots[i]),
+                        "key_points": (preview.get("key_points") or [])[:5],
+                    }
+
+            if pending and not done:
+                yield {
+                    "type": "pdf_extract",
+                    "status": "running",
+                    "pending": sorted({docs[jobs[f][0]].name for f in pending}),
+                    "elapsed_s": round(time.monotonic() - started, 1),
+                }
+    finally:
+        # Client went away (or the stream was cancelled): drop queued batches.
+        # Batches already running finish (or hit their deadline) in the worker.
+        leftover = [fut for fut in pending if not fut.done()]
+        for fut in leftover:
+            fut.cancel()
+        if leftover:
+            count_cancel("extraction_jobs_cancelled", len(leftover))
+        for path in spooled:
+            try:
+                os.remove(path)  # workers that still hold it keep their parsed copy
+            except OSError:
+                pass
+
+    results.extend(docs)
+
+
+def _timed_out(doc: ExtractedPdf, slots: List[Optional[str]]) -> None:
+    doc.error = f"timed out after {PDF_TIMEOUT_S:g}s"
+    # Keep whatever finished so the agent still gets partial content; pages not
+    # extracted stay as "" so later page numbers (p. N citations) keep their position
+    doc.pages = [p if p is not None else "" for p in slots]
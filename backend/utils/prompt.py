@@ -1,12 +1,13 @@
 import json
 from enum import Enum
-from openai.types.chat.chat_completion_message_param import ChatCompletionMessageParam
 from pydantic import BaseModel
-import base64
-from io import BytesIO
-from pypdf import PdfReader
-from typing import List, Optional, Any
+from typing import TYPE_CHECKING, List, Optional, Any
 from .attachment import ClientAttachment, Attachment
+from .pdf_extract import decode_data_url, extract_pdf_text_cached
+from .uploads import read_upload
+
+if TYPE_CHECKING:
+    from openai.types.chat.chat_completion_message_param import ChatCompletionMessageParam
 
 
 class ToolInvocationState(str, Enum):
@@ -30,7 +31,7 @@ class ClientMessage(BaseModel):
     toolInvocations: Optional[List[ToolInvocation]] = None
 
 
-def convert_to_openai_messages(messages: List[ClientMessage], attachments: Optional[List[Attachment]] = None) -> List[ChatCompletionMessageParam]:
+def convert_to_openai_messages(messages: List[ClientMessage], attachments: Optional[List[Attachment]] = None) -> List["ChatCompletionMessageParam"]:
     openai_messages = []
 
     for index, message in enumerate(messages):
@@ -53,13 +54,12 @@ def convert_to_openai_messages(messages: List[ClientMessage], attachments: Optio
                         }
                     })
                 elif attachment.type == 'application/pdf':
-                    pdf_bytes = base64.b64decode(attachment.content.split(',')[1])
-                    pdf_file = BytesIO(pdf_bytes)
-                    pdf_reader = PdfReader(pdf_file)
-                    
-                    pdf_text = ""
-                    for page in pdf_reader.pages:
-                        pdf_text += page.extract_text() or ""
+                    pdf_bytes = (
+                        read_upload(attachment.documentId)
+                        if attachment.documentId
+                        else decode_data_url(attachment.content)
+                    )
+                    pdf_text = extract_pdf_text_cached(pdf_bytes)
 
                     parts.append({
                         'type': 'text',
@@ -110,3 +110,23 @@ def convert_to_openai_messages(messages: List[ClientMessage], attachments: Optio
                 openai_messages.append(tool_message)
 
     return openai_messages
+
+
+# Layout of the user turn sent to the agents. Everything that can repeat
+# across turns or requests (document context, gathered results) comes first
+# in a fixed order and the user's question comes last, so prompts share the
+# longest possible byte-identical prefix for upstream prompt caching.
+DOCUMENTS_HEADER = "PDF Content (relevant excerpts):"
+QUESTION_HEADER = "Question:"
+
+
+def documents_context(blocks: List[str]) -> str:
+    return DOCUMENTS_HEADER + "\n" + "\n\n".join(blocks) if blocks else ""
+
+
+def build_user_turn(question: str, *context: str) -> str:
+    """`context` sections (in the given order) followed by the question."""
+    sections = [c for c in context if c]
+    if not sections:
+        return question
+    return "\n\n".join(sections) + f"\n\n{QUESTION_HEADER} {question}"
@@ -0,0 +1,181 @@
+import os
+import re
+import math
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from .cache import LRUCache, content_hash
+
+
+# Lexical retrieval used by the PDF tools: documents are tokenized once into
+# an inverted index (term -> unit -> positions) and queried with BM25 plus
+# small phrase / proximity boosts. Indexes are cached per document content.
+BM25_K1 = 1.2
+BM25_B = 0.75
+PHRASE_BOOST = 0.5      # per adjacent query-term pair found in order, scaled by idf
+PROXIMITY_BOOST = 0.3   # scaled by 1 / (1 + gap) between distinct query terms
+PROXIMITY_WINDOW = 8
+INDEX_CACHE_SIZE = int(os.getenv("ATLAS_INDEX_CACHE_SIZE", "32"))
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can could did do does for from had has have how i if in
+into is it its may me my no not of on or our so than that the their them then there these
+they this to was we were what when where which who why will with would you your about also
+please tell show give find explain describe summarize summary document pdf
+""".split())
+
+
+def _stem(token: str) -> str:
+    # Light plural folding keeps "reports"/"report" together without a stemmer dependency
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(t) for t in _TOKEN_RE.findall((text or "").lower())]
+
+
+def query_terms(query: str) -> List[str]:
+    """Query tokens in order, without stopwords (duplicates kept for phrase matching)."""
+    raw = _TOKEN_RE.findall((query or "").lower())
+    return [_stem(t) for t in raw if t not in STOPWORDS and len(t) >= 2]
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_RE.split((text or "").strip()) if s.strip()]
+
+
+class BM25Index:
+    """Inverted index over text units (sentences or chunks) with BM25 scoring."""
+
+    def __init__(self, units: List[str], pages: Optional[List[int]] = None):
+        self.units = units
+        self.pages = pages
+        self.postings: Dict[str, Dict[int, List[int]]] = defaultdict(dict)
+        self.lengths: List[int] = []
+        for uid, unit in enumerate(units):
+            tokens = tokenize(unit)
+            self.lengths.append(len(tokens))
+            for pos, tok in enumerate(tokens):
+                self.postings[tok].setdefault(uid, []).append(pos)
+        self.postings = dict(self.postings)
+        self.avg_len = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        self._idf: Dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self.units)
+
+    def idf(self, term: str) -> float:
+        cached = self._idf.get(term)
+        if cached is None:
+            n = len(self.units)
+            df = len(self.postings.get(term, ()))
+            cached = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            self._idf[term] = cached
+        return cached
+
+    def search(self, query: str, top_k: int = 8) -> List[Tuple[float, int, int]]:
+        """Return (score, unit_id, matched_distinct_terms) best-first."""
+        terms = query_terms(query)
+        unique = list(dict.fromkeys(terms))
+        if not unique or not self.units:
+            return []
+
+        scores: Dict[int, float] = defaultdict(float)
+        matched: Dict[int, int] = defaultdict(int)
+        avg_len = self.avg_len or 1.0
+        for term in unique:
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = self.idf(term)
+            for uid, positions in posting.items():
+                tf = len(positions)
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[uid] / avg_len)
+                scores[uid] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+                matched[uid] += 1
+
+        # Phrase and proximity boosts only matter for units matching 2+ terms
+        pairs = [(a, b) for a, b in zip(terms, terms[1:]) if a != b]
+        for uid, hits in matched.items():
+            if hits < 2:
+                continue
+            scores[uid] += self._phrase_boost(uid, pairs) + self._proximity_boost(uid, unique)
+
+        ranked = sorted(scores.items(), key=lambda kv: (-kv[1], self.lengths[kv[0]]))
+        return [(score, uid, matched[uid]) for uid, score in ranked[:top_k]]
+
+    def _positions(self, term: str, uid: int) -> List[int]:
+        return self.postings.get(term, {}).get(uid, [])
+
+    def _phrase_boost(self, uid: int, pairs: List[Tuple[str, str]]) -> float:
+        boost = 0.0
+        for a, b in pairs:
+            following = set(self._positions(b, uid))
+            if any(p + 1 in following for p in self._positions(a, uid)):
+                boost += PHRASE_BOOST * (self.idf(a) + self.idf(b))
+        return boost
+
+    def _proximity_boost(self, uid: int, terms: List[str]) -> float:
+        hits = sorted((p, t) for t in terms for p in self._positions(t, uid))
+        best = None
+        for (p1, t1), (p2, t2) in zip(hits, hits[1:]):
+            if t1 != t2:
+                gap = p2 - p1
+                best = gap if best is None else min(best, gap)
+        if best is None or best > PROXIMITY_WINDOW:
+            return 0.0
+        return PROXIMITY_BOOST * len(terms) / (1 + best)
+
+
+_sentence_indexes: LRUCache[BM25Index] = LRUCache(max_items=INDEX_CACHE_SIZE)
+
+
+def pages_key(pages: List[str], digest: str = "") -> str:
+    """Cache key for derived structures over `pages`.
+
+    The file digest alone is not enough: a timed-out extraction has the same
+    digest as the full document but fewer (or blank) pages, so the page count
+    and text size go into the key too.
+    """
+    if not digest:
+        return content_hash("\f".join(pages).encode("utf-8", "ignore"))
+    return f"{digest}:{len(pages)}:{sum(len(p) for p in pages)}"
+
+
+def get_sentence_index(text: str, cache: bool = True) -> BM25Index:
+    """Sentence-level index for `text`, built once per distinct document.
+
+    Pass cache=False for throwaway text (e.g. partially extracted documents)
+    so it does not push real document indexes out of the LRU.
+    """
+    if not cache:
+        return BM25Index(split_sentences(text))
+    key = content_hash((text or "").encode("utf-8", "ignore"))
+    index = _sentence_indexes.get(key)
+    if index is None:
+        index = BM25Index(split_sentences(text))
+        _sentence_indexes.put(key, index)
+    return index
+
+
+def get_paged_sentence_index(pages: List[str], digest: str = "") -> BM25Index:
+    """Sentence index whose `pages[uid]` gives the 1-based page of each sentence."""
+    key = "paged:" + pages_key(pages, digest)
+    index = _sentence_indexes.get(key)
+    if index is None:
+        units: List[str] = []
+        page_map: List[int] = []
+        for page_no, page in enumerate(pages, start=1):
+            for sentence in split_sentences(page):
+                units.append(sentence)
+                page_map.append(page_no)
+        index = BM25Index(units, pages=page_map)
+        _sentence_indexes.put(key, index)
+    return index
@@ -0,0 +1,48 @@
+import os
+import importlib
+from typing import Optional
+
+from agents import ModelSettings, RunConfig  # type: ignore
+from agents.models.interface import ModelProvider  # type: ignore
+
+from .openai_client import get_model_provider
+
+
+# Every Runner call (the streamed orchestrator run and the nested tool runs)
+# takes its RunConfig from here. By default all models share the pooled
+# client from utils/openai_client.py; the provider can be swapped
+# process-wide, e.g. for the offline stub in benchmarks/fake_model.py.
+# ATLAS_MODEL_PROVIDER="package.module:factory" installs one without code changes.
+MODEL_PROVIDER = os.getenv("ATLAS_MODEL_PROVIDER", "")
+# Requests sharing a prompt_cache_key are routed to the same prompt cache;
+# one key per agent keeps each agent's static prefix warm. Empty disables.
+PROMPT_CACHE_KEY = os.getenv("ATLAS_PROMPT_CACHE_KEY", "atlas")
+
+_model_provider: Optional[ModelProvider] = None
+
+
+def set_model_provider(provider: Optional[ModelProvider]) -> None:
+    """Route all agent runs through `provider` (None restores the pooled OpenAI provider)."""
+    global _model_provider
+    _model_provider = provider
+
+
+def _load_provider(spec: str) -> ModelProvider:
+    module, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module), attr)()
+
+
+def get_run_config() -> RunConfig:
+    global _model_provider
+    if _model_provider is None and MODEL_PROVIDER:
+        _model_provider = _load_provider(MODEL_PROVIDER)
+    if _model_provider is None:
+        return RunConfig(model_provider=get_model_provider())
+    return RunConfig(model_provider=_model_provider, tracing_disabled=True)
+
+
+def agent_model_settings(agent_name: str) -> ModelSettings:
+    """Model settings shared by every agent: a stable per-agent prompt cache key."""
+    if not PROMPT_CACHE_KEY:
+        return ModelSettings()
+    return ModelSettings(extra_args={"prompt_cache_key": f"{PROMPT_CACHE_KEY}-{agent_name.lower()}"})
@@ -0,0 +1,226 @@
+import os
+import time
+import asyncio
+import contextlib
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+
+# Admission control in front of agent runs:
+#  - one active run per chatId (requests on the same chat run in order)
+#  - a global cap and per-model caps on concurrent model streams
+#  - a bounded FIFO wait queue; when it is full, requests are rejected fast
+#  - model turns nested inside an admitted run (run_research, the research
+#    handoff, fan-out research branches) take a per-model slot of their own,
+#    so e.g. the deep-research cap holds whatever model the request started on
+MAX_CONCURRENT_RUNS = int(os.getenv("ATLAS_MAX_CONCURRENT_RUNS", "16"))
+MAX_QUEUED_RUNS = int(os.getenv("ATLAS_MAX_QUEUED_RUNS", "64"))
+QUEUE_TIMEOUT_S = float(os.getenv("ATLAS_QUEUE_TIMEOUT_S", "120"))
+QUEUE_POLL_S = 1.0
+DEFAULT_MODEL_CONCURRENCY = int(os.getenv("ATLAS_MODEL_CONCURRENCY_DEFAULT", "8"))
+MODEL_CONCURRENCY: Dict[str, int] = {"o4-mini-deep-research": 2}
+# e.g. ATLAS_MODEL_CONCURRENCY="gpt-4.1=8,o4-mini-deep-research=2"
+for _pair in filter(None, os.getenv("ATLAS_MODEL_CONCURRENCY", "").split(",")):
+    _model, _, _value = _pair.partition("=")
+    if _value.strip().isdigit():
+        MODEL_CONCURRENCY[_model.strip()] = int(_value)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class QueueTimeout(Exception):
+    pass
+
+
+@dataclass
+class Ticket:
+    chat_id: str
+    model: str
+    enqueued_at: float = field(default_factory=time.monotonic)
+    granted: "asyncio.Future[None]" = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+    released: bool = False
+
+
+class RunScheduler:
+    def __init__(
+        self,
+        max_concurrent: int = MAX_CONCURRENT_RUNS,
+        max_queued: int = MAX_QUEUED_RUNS,
+        model_limits: Optional[Dict[str, int]] = None,
+        default_model_limit: int = DEFAULT_MODEL_CONCURRENCY,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.model_limits = dict(MODEL_CONCURRENCY if model_limits is None else model_limits)
+        self.default_model_limit = default_model_limit
+        self._waiting: List[Ticket] = []
+        self._active_chats: Dict[str, Ticket] = {}
+        self._active_models: Dict[str, int] = {}
+        self._active = 0
+        self._model_waiters: List[Tuple[str, "asyncio.Future[None]"]] = []
+        self.nested_admitted = 0
+        self.nested_waited = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.queued_total = 0
+
+    def saturated(self) -> bool:
+        """True when a new request would be rejected (queue already full)."""
+        return len(self._waiting) >= self.max_queued
+
+    def enqueue(self, chat_id: str, model: str) -> Ticket:
+        ticket = Ticket(chat_id=chat_id, model=model)
+        if self._can_run(ticket) and not self._waiting:
+            self._grant(ticket)
+            return ticket
+        if self.saturated():
+            self.rejected += 1
+            raise QueueFull(f"run queue is full ({self.max_queued} waiting)")
+        self._waiting.append(ticket)
+        self.queued_total += 1
+        self._dispatch()
+        return ticket
+
+    def position(self, ticket: Ticket) -> int:
+        try:
+            return self._waiting.index(ticket) + 1
+        except ValueError:
+            return 0
+
+    async def wait(self, ticket: Ticket, timeout_s: float = QUEUE_TIMEOUT_S) -> AsyncIterator[Dict[str, Any]]:
+        """Wait for admission, yielding `queued` payloads whenever the position changes."""
+        last = None
+        deadline = ticket.enqueued_at + timeout_s
+        while not ticket.granted.done():
+            pos = self.position(ticket)
+            if pos != last:
+                last = pos
+                yield {"position": pos, "waiting": len(self._waiting), "active": self._active}
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._abandon(ticket)
+                self.timeouts += 1
+                raise QueueTimeout(f"waited {timeout_s:.0f}s for a run slot")
+            try:
+                await asyncio.wait_for(asyncio.shield(ticket.granted), timeout=min(QUEUE_POLL_S, remaining))
+            except asyncio.TimeoutError:
+                continue
+            except asyncio.CancelledError:
+                self._abandon(ticket)
+                raise
+
+    async def acquire_model(self, model: str, timeout_s: float = QUEUE_TIMEOUT_S) -> None:
+        """Take a per-model slot for a nested model turn (no chat or global slot).
+
+        Nested turns run inside an admitted request, so they are served before
+        new requests; pair with release_model().
+        """
+        if not self._model_waiters and self._active_models.get(model, 0) < self._model_limit(model):
+            self._active_models[model] = self._active_models.get(model, 0) + 1
+            self.nested_admitted += 1
+            return
+        granted: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        self._model_waiters.append((model, granted))
+        self.nested_waited += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(granted), timeout=timeout_s)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if (model, granted) in self._model_waiters:
+                self._model_waiters.remove((model, granted))
+            if granted.done() and not granted.cancelled():
+                self.release_model(model)  # granted just as the wait ended
+            else:
+                granted.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                self.timeouts += 1
+                raise QueueTimeout(f"waited {timeout_s:.0f}s for a {model} slot") from None
+            raise
+        self.nested_admitted += 1
+
+    def release_model(self, model: str) -> None:
+        self._active_models[model] = max(self._active_models.get(model, 1) - 1, 0)
+        self._dispatch()
+
+    @contextlib.asynccontextmanager
+    async def model_slot(self, model: str) -> AsyncIterator[None]:
+        await self.acquire_model(model)
+        try:
+            yield
+        finally:
+            self.release_model(model)
+
+    def release(self, ticket: Ticket) -> None:
+        if ticket.released:
+            return
+        ticket.released = True
+        if not ticket.granted.done():
+            self._abandon(ticket)
+            return
+        self._active -= 1
+        self._active_models[ticket.model] = self._active_models.get(ticket.model, 1) - 1
+        if self._active_chats.get(ticket.chat_id) is ticket:
+            del self._active_chats[ticket.chat_id]
+        self._dispatch()
+
+    def _abandon(self, ticket: Ticket) -> None:
+        if ticket in self._waiting:
+            self._waiting.remove(ticket)
+        if ticket.granted.done() and not ticket.released:
+            self.release(ticket)
+        elif not ticket.granted.done():
+            ticket.granted.cancel()
+        ticket.released = True
+        self._dispatch()
+
+    def _model_limit(self, model: str) -> int:
+        return self.model_limits.get(model, self.default_model_limit)
+
+    def _can_run(self, ticket: Ticket) -> bool:
+        return (
+            self._active < self.max_concurrent
+            and self._active_models.get(ticket.model, 0) < self._model_limit(ticket.model)
+            and ticket.chat_id not in self._active_chats
+        )
+
+    def _grant(self, ticket: Ticket) -> None:
+        self._active += 1
+        self._active_models[ticket.model] = self._active_models.get(ticket.model, 0) + 1
+        self._active_chats[ticket.chat_id] = ticket
+        self.admitted += 1
+        if not ticket.granted.done():
+            ticket.granted.set_result(None)
+
+    def _dispatch(self) -> None:
+        # Nested turns first (their request already holds a run slot), in FIFO order
+        for model, granted in list(self._model_waiters):
+            if self._active_models.get(model, 0) < self._model_limit(model):
+                self._model_waiters.remove((model, granted))
+                self._active_models[model] = self._active_models.get(model, 0) + 1
+                granted.set_result(None)
+        # FIFO, but a waiter blocked on its chat or model does not hold up others
+        for ticket in list(self._waiting):
+            if self._active >= self.max_concurrent:
+                break
+            if self._can_run(ticket):
+                self._waiting.remove(ticket)
+                self._grant(ticket)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self._active,
+            "waiting": len(self._waiting),
+            "active_by_model": {m: n for m, n in self._active_models.items() if n},
+            "nested_waiting": len(self._model_waiters),
+            "nested_admitted": self.nested_admitted,
+            "nested_waited": self.nested_waited,
+            "admitted": self.admitted,
+            "queued_total": self.queued_total,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+
+run_scheduler = RunScheduler()
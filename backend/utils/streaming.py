@@ -0,0 +1,98 @@
+import os
+import json
+import time
+import asyncio
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+from .cancellation import consume_result
+
+
+# Streaming modes negotiated per request.
+#  - "final": legacy mode, every token re-sends the full accumulated answer
+#  - "delta": only new text is sent in `delta` events, followed by one `final`
+STREAM_MODE_FINAL = "final"
+STREAM_MODE_DELTA = "delta"
+STREAM_MODES = (STREAM_MODE_FINAL, STREAM_MODE_DELTA)
+
+# Coalescing window for delta mode: tiny token deltas are merged until either
+# the window elapses or the buffered text reaches the size limit.
+DELTA_WINDOW_MS = int(os.getenv("ATLAS_DELTA_WINDOW_MS", "30"))
+DELTA_MAX_CHARS = int(os.getenv("ATLAS_DELTA_MAX_CHARS", "256"))
+
+
+def resolve_stream_mode(requested: Optional[str]) -> str:
+    """Return a supported stream mode, defaulting to the legacy "final" mode."""
+    mode = (requested or "").strip().lower()
+    return mode if mode in STREAM_MODES else STREAM_MODE_FINAL
+
+
+def ndjson(payload: dict) -> str:
+    return json.dumps(payload) + "\n"
+
+
+class DeltaCoalescer:
+    """Buffers token deltas and releases them in merged frames.
+
+    `push()` returns the merged text once the time or size window is exceeded,
+    otherwise None. `flush()` drains whatever is left (call it before emitting
+    any non-text event so frame order matches generation order).
+    """
+
+    def __init__(self, window_ms: int = DELTA_WINDOW_MS, max_chars: int = DELTA_MAX_CHARS):
+        self.window_s = max(window_ms, 0) / 1000.0
+        self.max_chars = max(max_chars, 1)
+        self._parts: List[str] = []
+        self._size = 0
+        self._opened_at = 0.0
+
+    def push(self, delta: str) -> Optional[str]:
+        if not delta:
+            return None
+        if not self._parts:
+            self._opened_at = time.monotonic()
+        self._parts.append(delta)
+        self._size += len(delta)
+        if self._size >= self.max_chars or time.monotonic() - self._opened_at >= self.window_s:
+            return self.flush()
+        return None
+
+    def flush(self) -> Optional[str]:
+        if not self._parts:
+            return None
+        text = "".join(self._parts)
+        self._parts = []
+        self._size = 0
+        return text
+
+
+async def merge_side_events(
+    events: AsyncIterator[Any], side: "asyncio.Queue[Any]"
+) -> AsyncIterator[Tuple[str, Any]]:
+    """Interleave run events with side-channel payloads as soon as either arrives.
+
+    Yields ("run", event) or ("side", payload). Side payloads still queued when
+    the run ends are drained before returning.
+    """
+    it = events.__aiter__()
+    next_event: "asyncio.Future[Any]" = asyncio.ensure_future(it.__anext__())
+    next_side: "asyncio.Future[Any]" = asyncio.ensure_future(side.get())
+    try:
+        while True:
+            done, _ = await asyncio.wait({next_event, next_side}, return_when=asyncio.FIRST_COMPLETED)
+            if next_side in done:
+                yield "side", next_side.result()
+                next_side = asyncio.ensure_future(side.get())
+            if next_event in done:
+                try:
+                    event = next_event.result()
+                except StopAsyncIteration:
+                    break
+                yield "run", event
+                next_event = asyncio.ensure_future(it.__anext__())
+        while not side.empty():
+            yield "side", side.get_nowait()
+    finally:
+        for fut in (next_event, next_side):
+            if not fut.done():
+                fut.cancel()
+            fut.add_done_callback(consume_result)
@@ -0,0 +1,192 @@
+import os
+import json
+import functools
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional
+
+from .logs import get_logger
+
+
+# Token accounting in front of Runner.run_streamed. Counts use tiktoken when
+# it is installed (optional dependency) and fall back to ~4 chars per token.
+# Older session items that push a turn over the model's input budget are
+# folded into one compact rolling summary item.
+DEFAULT_INPUT_BUDGET = int(os.getenv("ATLAS_INPUT_TOKEN_BUDGET", "32000"))
+MODEL_INPUT_BUDGETS: Dict[str, int] = {
+    "gpt-4.1": DEFAULT_INPUT_BUDGET,
+    "gpt-4.1-mini": DEFAULT_INPUT_BUDGET,
+    "gpt-4.1-nano": DEFAULT_INPUT_BUDGET // 2,
+    "o4-mini-deep-research": DEFAULT_INPUT_BUDGET,
+}
+# e.g. ATLAS_INPUT_TOKEN_BUDGETS="gpt-4.1=60000,gpt-4.1-mini=20000"
+for _pair in filter(None, os.getenv("ATLAS_INPUT_TOKEN_BUDGETS", "").split(",")):
+    _model, _, _value = _pair.partition("=")
+    if _value.strip().isdigit():
+        MODEL_INPUT_BUDGETS[_model.strip()] = int(_value)
+
+# After compaction, recent history keeps at most this share of the budget
+KEEP_RATIO = float(os.getenv("ATLAS_HISTORY_KEEP_RATIO", "0.5"))
+SUMMARY_MAX_TOKENS = int(os.getenv("ATLAS_SUMMARY_MAX_TOKENS", "800"))
+SUMMARY_PREFIX = "Summary of earlier conversation (compacted):"
+ITEM_OVERHEAD_TOKENS = 4
+
+log = get_logger(__name__)
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding() -> Any:
+    try:
+        import tiktoken  # type: ignore
+    except ImportError:
+        log.warning("tiktoken not installed; token budgets use a len/4 estimate (pip install -r requirements.txt)")
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        log.info("tiktoken unavailable (%s); using estimates", e)
+        return None
+
+
+@functools.lru_cache(maxsize=2048)
+def _count_cached(text: str) -> int:
+    enc = _encoding()
+    if enc is None:
+        return (len(text) + 3) // 4
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def count_tokens(text: str) -> int:
+    return _count_cached(text) if text else 0
+
+
+def budget_for(model: Optional[str]) -> int:
+    return MODEL_INPUT_BUDGETS.get(model or "", DEFAULT_INPUT_BUDGET)
+
+
+def item_text(item: Any) -> str:
+    """Best-effort text of a Responses API input item (message, tool call, tool output)."""
+    if isinstance(item, str):
+        return item
+    if not isinstance(item, dict):
+        return str(item)
+    content = item.get("content")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = []
+        for part in content:
+            if isinstance(part, dict):
+                parts.append(str(part.get("text") or part.get("refusal") or ""))
+            else:
+                parts.append(str(part))
+        return "".join(parts)
+    for key in ("arguments", "output", "summary"):
+        value = item.get(key)
+        if value:
+            return value if isinstance(value, str) else json.dumps(value, default=str)
+    return ""
+
+
+def item_tokens(item: Any) -> int:
+    return count_tokens(item_text(item)) + ITEM_OVERHEAD_TOKENS
+
+
+def _is_summary(item: Any) -> bool:
+    return isinstance(item, dict) and item_text(item).startswith(SUMMARY_PREFIX)
+
+
+def _is_turn_start(item: Any) -> bool:
+    return isinstance(item, dict) and item.get("role") == "user" and not _is_summary(item)
+
+
+def summarize_items(items: List[Any], previous: str = "", max_tokens: int = SUMMARY_MAX_TOKENS) -> str:
+    """Extractive rolling summary: one short line per message, newest kept first."""
+    lines: List[str] = []
+    if previous:
+        lines.extend(l for l in previous.splitlines()[1:] if l.strip())
+    for item in items:
+        if not isinstance(item, dict) or _is_summary(item):
+            continue
+        role = item.get("role") or item.get("type") or "item"
+        if role in ("function_call", "function_call_output"):
+            name = item.get("name") or "tool"
+            lines.append(f"- {role}: {name}")
+            continue
+        text = " ".join(item_text(item).split())
+        if text:
+            lines.append(f"- {role}: {text[:240]}{'…' if len(text) > 240 else ''}")
+
+    kept: List[str] = []
+    used = count_tokens(SUMMARY_PREFIX)
+    for line in reversed(lines):
+        cost = count_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join([SUMMARY_PREFIX] + list(reversed(kept)))
+
+
+@dataclass
+class BudgetReport:
+    model: str
+    budget: int
+    history_tokens: int
+    input_tokens: int
+    action: str = "none"
+    compacted_items: int = 0
+    summary_tokens: int = 0
+    tokens_after: int = 0
+    tokenizer: str = "estimate"
+
+    def to_event(self) -> Dict[str, Any]:
+        return {"type": "token_budget", **asdict(self)}
+
+
+async def enforce_budget(session: Any, new_input: str, model: Optional[str], reserved_tokens: int = 0) -> BudgetReport:
+    """Compact `session` so history + new input fit the model's input budget.
+
+    `reserved_tokens` covers fixed prompt parts (instructions, tool schemas).
+    The session must provide `get_items()` and `replace_items()`.
+    """
+    budget = budget_for(model)
+    items = await session.get_items()
+    history = [item_tokens(i) for i in items]
+    input_tokens = count_tokens(new_input) + reserved_tokens
+    report = BudgetReport(
+        model=model or "",
+        budget=budget,
+        history_tokens=sum(history),
+        input_tokens=input_tokens,
+        tokenizer="tiktoken" if _encoding() is not None else "estimate",
+    )
+    report.tokens_after = report.history_tokens + input_tokens
+    if report.tokens_after <= budget or not items:
+        return report
+
+    # Keep the newest whole turns that fit in the recent-history allowance
+    allowance = max(int(budget * KEEP_RATIO) - input_tokens, 0)
+    cut = len(items)
+    used = 0
+    for idx in range(len(items) - 1, -1, -1):
+        used += history[idx]
+        if used > allowance:
+            break
+        if _is_turn_start(items[idx]):
+            cut = idx
+    older, recent = items[:cut], items[cut:]
+    if not older:
+        return report
+
+    previous = item_text(older[0]) if _is_summary(older[0]) else ""
+    room = budget - input_tokens - sum(history[cut:])
+    summary_cap = max(min(SUMMARY_MAX_TOKENS, room), budget // 10)
+    summary = summarize_items(older, previous=previous, max_tokens=summary_cap)
+    summary_item = {"role": "system", "content": summary}
+    await session.replace_items([summary_item] + recent)
+
+    report.action = "compacted"
+    report.compacted_items = len(older)
+    report.summary_tokens = item_tokens(summary_item)
+    report.tokens_after = report.summary_tokens + sum(history[cut:]) + input_tokens
+    return report
@@ -0,0 +1,192 @@
+import os
+import re
+import time
+import asyncio
+import hashlib
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from fastapi import Request, UploadFile
+from starlette.datastructures import UploadFile as FormFile
+
+from .logs import get_logger
+
+
+# Binary upload path for attachments: multipart bodies are streamed in chunks
+# to a temp file while hashing, then moved into a content-addressed directory.
+# Chat requests reference the returned documentId instead of inlining base64.
+# The size cap is enforced on the request body itself (Content-Length, then a
+# byte count while the multipart form is parsed), so oversized uploads are
+# refused before they are spooled. Stored uploads older than
+# ATLAS_UPLOAD_MAX_AGE_S, then the least recently used ones beyond
+# ATLAS_UPLOAD_DIR_MAX_BYTES, are removed after each upload.
+UPLOAD_DIR = os.getenv("ATLAS_UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "atlas_uploads"))
+UPLOAD_MAX_BYTES = int(os.getenv("ATLAS_UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+UPLOAD_DIR_MAX_BYTES = int(os.getenv("ATLAS_UPLOAD_DIR_MAX_BYTES", str(1024 * 1024 * 1024)))
+UPLOAD_MAX_AGE_S = float(os.getenv("ATLAS_UPLOAD_MAX_AGE_S", str(24 * 3600)))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Multipart boundaries and part headers on top of the file itself
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+# Interrupted uploads leave .part files behind
+_PART_MAX_AGE_S = 3600
+
+_DOC_ID_RE = re.compile(r"^[0-9a-f]{64}$")
+
+log = get_logger(__name__)
+_cleanup_lock = threading.Lock()
+upload_stats: Dict[str, int] = {"rejected_too_large": 0, "evictions": 0}
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+@dataclass
+class UploadedDocument:
+    document_id: str
+    name: str
+    content_type: str
+    size: int
+
+
+def upload_path(document_id: str) -> Optional[str]:
+    """Path of a stored upload, or None for malformed / unknown ids.
+
+    Resolving an upload marks it as recently used, so cleanup keeps it.
+    """
+    if not _DOC_ID_RE.match(document_id or ""):
+        return None
+    path = os.path.join(UPLOAD_DIR, document_id)
+    try:
+        os.utime(path)  # in use: recency for cleanup_uploads
+    except OSError:
+        return None
+    return path
+
+
+def read_upload(document_id: str) -> bytes:
+    path = upload_path(document_id)
+    if path is None:
+        raise FileNotFoundError(f"unknown documentId {document_id!r}")
+    with open(path, "rb") as f:
+        return f.read()
+
+
+async def read_upload_form(request: Request, max_bytes: int = UPLOAD_MAX_BYTES) -> UploadFile:
+    """The `file` part of a multipart upload, refusing bodies over `max_bytes`.
+
+    Checks Content-Length before reading anything, then counts body bytes as
+    the form is parsed (chunked requests carry no length).
+    """
+    limit = max_bytes + UPLOAD_FORM_OVERHEAD if max_bytes else 0
+    length = request.headers.get("content-length", "")
+    if limit and length.isdigit() and int(length) > limit:
+        upload_stats["rejected_too_large"] += 1
+        raise UploadTooLarge(f"upload exceeds {max_bytes} bytes")
+
+    received = 0
+    receive = request.receive
+
+    async def limited_receive() -> Dict[str, Any]:
+        nonlocal received
+        message = await receive()
+        if message.get("type") == "http.request":
+            received += len(message.get("body", b""))
+            if limit and received > limit:
+                upload_stats["rejected_too_large"] += 1
+                raise UploadTooLarge(f"upload exceeds {max_bytes} bytes")
+        return message
+
+    form = await Request(request.scope, limited_receive).form(max_files=1)
+    file = form.get("file")
+    if not isinstance(file, FormFile):
+        raise ValueError("multipart field 'file' is required")
+    return file
+
+
+async def save_upload(file: UploadFile, max_bytes: int = UPLOAD_MAX_BYTES) -> UploadedDocument:
+    """Stream an uploaded file to disk chunk by chunk; returns its content id."""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=UPLOAD_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise UploadTooLarge(f"upload exceeds {max_bytes} bytes")
+                digest.update(chunk)
+                await asyncio.to_thread(out.write, chunk)
+        document_id = digest.hexdigest()
+        final = os.path.join(UPLOAD_DIR, document_id)
+        if os.path.exists(final):
+            os.remove(tmp)  # identical content already stored
+        else:
+            os.replace(tmp, final)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    finally:
+        await file.close()
+    await asyncio.to_thread(cleanup_uploads, keep=document_id)
+
+    return UploadedDocument(
+        document_id=document_id,
+        name=file.filename or "upload",
+        content_type=file.content_type or "application/octet-stream",
+        size=size,
+    )
+
+
+def cleanup_uploads(keep: Optional[str] = None, max_bytes: int = UPLOAD_DIR_MAX_BYTES,
+                    max_age_s: float = UPLOAD_MAX_AGE_S) -> int:
+    """Delete expired uploads, then least recently used ones until the directory fits `max_bytes`."""
+    if not os.path.isdir(UPLOAD_DIR):
+        return 0
+    now = time.time()
+    removed = 0
+    with _cleanup_lock:
+        entries = []
+        total = 0
+        for entry in os.scandir(UPLOAD_DIR):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            if entry.name.endswith(".part"):
+                expired = now - st.st_mtime > _PART_MAX_AGE_S
+            elif _DOC_ID_RE.match(entry.name):
+                expired = bool(max_age_s) and now - st.st_mtime > max_age_s and entry.name != keep
+            else:
+                continue
+            if expired:
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except OSError:
+                    pass
+            elif not entry.name.endswith(".part"):
+                entries.append((st.st_mtime, entry.name, st.st_size))
+                total += st.st_size
+        for _mtime, document_id, size in sorted(entries):
+            if not max_bytes or total <= max_bytes:
+                break
+            if document_id == keep:
+                continue
+            try:
+                os.remove(os.path.join(UPLOAD_DIR, document_id))
+            except OSError:
+                pass
+            total -= size
+            removed += 1
+        upload_stats["evictions"] += removed
+    if removed:
+        log.info("upload cleanup removed %d files", removed)
+    return removed
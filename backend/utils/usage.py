@@ -0,0 +1,77 @@
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from .context import RequestContext, current_request
+from .metrics import Counter
+
+
+# Token usage per agent, split into prompt-cache hits (input tokens the API
+# served from its prefix cache) and uncached input. Every agent run reports
+# here: the streamed orchestrator turn from its response.completed events,
+# nested Runner.run calls from their raw responses. A falling cached share
+# means a prompt prefix stopped being byte-stable.
+INPUT_TOKENS = Counter("atlas_model_input_tokens_total", "Model input tokens by agent and prompt-cache status")
+OUTPUT_TOKENS = Counter("atlas_model_output_tokens_total", "Model output tokens by agent")
+MODEL_RESPONSES = Counter("atlas_model_responses_total", "Model responses by agent")
+
+_lock = threading.Lock()
+_totals: Dict[str, Dict[str, int]] = {}
+
+
+def _tokens(usage: Any) -> Dict[str, int]:
+    # Works for the Responses API `ResponseUsage` and the Agents SDK `Usage`
+    details = getattr(usage, "input_tokens_details", None)
+    return {
+        "input_tokens": int(getattr(usage, "input_tokens", 0) or 0),
+        "cached_tokens": int(getattr(details, "cached_tokens", 0) or 0),
+        "output_tokens": int(getattr(usage, "output_tokens", 0) or 0),
+    }
+
+
+def _add(into: Dict[str, Dict[str, int]], agent: str, tokens: Dict[str, int]) -> None:
+    entry = into.setdefault(agent, {"responses": 0, "input_tokens": 0, "cached_tokens": 0, "output_tokens": 0})
+    entry["responses"] += 1
+    for key, value in tokens.items():
+        entry[key] += value
+
+
+def record_usage(agent: str, usage: Any, ctx: Optional[RequestContext] = None) -> None:
+    """Count one model response's usage for `agent` (and the current request, if any)."""
+    if usage is None:
+        return
+    tokens = _tokens(usage)
+    MODEL_RESPONSES.inc(agent=agent)
+    INPUT_TOKENS.inc(tokens["cached_tokens"], agent=agent, cache="hit")
+    INPUT_TOKENS.inc(max(tokens["input_tokens"] - tokens["cached_tokens"], 0), agent=agent, cache="miss")
+    OUTPUT_TOKENS.inc(tokens["output_tokens"], agent=agent)
+    with _lock:
+        _add(_totals, agent, tokens)
+    ctx = ctx or current_request()
+    if ctx is not None:
+        _add(ctx.usage, agent, tokens)
+
+
+def record_run(agent: str, raw_responses: Iterable[Any]) -> None:
+    """Record every model response of a finished Runner.run for `agent`."""
+    for response in raw_responses or []:
+        record_usage(agent, getattr(response, "usage", None))
+
+
+def _with_ratio(entry: Dict[str, int]) -> Dict[str, Any]:
+    inputs = entry["input_tokens"]
+    return {**entry, "cached_ratio": round(entry["cached_tokens"] / inputs, 4) if inputs else 0.0}
+
+
+def request_usage(ctx: RequestContext) -> Dict[str, Any]:
+    """Per-request summary for the `usage` thinking event."""
+    agents = {agent: _with_ratio(entry) for agent, entry in ctx.usage.items()}
+    total = {"responses": 0, "input_tokens": 0, "cached_tokens": 0, "output_tokens": 0}
+    for entry in ctx.usage.values():
+        for key in total:
+            total[key] += entry[key]
+    return {"type": "usage", **_with_ratio(total), "agents": agents}
+
+
+def usage_stats() -> Dict[str, Any]:
+    with _lock:
+        return {agent: _with_ratio(dict(entry)) for agent, entry in _totals.items()}
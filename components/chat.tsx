@@ -74,6 +74,7 @@ export function Chat() {
       ],
       data: { attachments },
       chatId,
+      streamMode: "delta",
     };
 
     // Prepare assistant placeholder to attach thinking logs to
@@ -87,6 +88,11 @@ export function Chat() {
         body: JSON.stringify(requestBody),
       });
 
+      if (!res.ok) {
+        const body = await res.json().catch(() => ({}));
+        throw new Error(body?.error || `Request failed (${res.status})`);
+      }
+
       if (!res.body) {
         throw new Error("No response body");
       }
@@ -94,6 +100,7 @@ export function Chat() {
       const reader = res.body.getReader();
       const decoder = new TextDecoder();
       let buffer = "";
+      let streamedText = "";
 
       // Insert assistant placeholder
       setMessages((prev) => [
@@ -115,10 +122,16 @@ export function Chat() {
             if (evt.event === "thinking") {
               const msg = typeof evt.data === "string" ? evt.data : JSON.stringify(evt.data);
               thinkingLogsByIdRef.current[assistantId].push(msg);
+            } else if (evt.event === "queued") {
+              thinkingLogsByIdRef.current[assistantId].push(`Queued (position ${evt.position})`);
             } else if (evt.event === "resume_ready") {
               const { url, name, contentType } = evt.data || {};
               // Only store; attach after final to avoid duplicates during stream
               resumeByIdRef.current[assistantId] = { url, name, contentType };
+            } else if (evt.event === "delta") {
+              streamedText += typeof evt.delta === "string" ? evt.delta : "";
+              const content = streamedText;
+              setMessages((prev) => prev.map((m) => (m.id === assistantId ? { ...m, content } as Message : m)));
             } else if (evt.event === "final") {
               const content = typeof evt.response === "string" ? evt.response : JSON.stringify(evt.response);
               const resume = resumeByIdRef.current[assistantId];
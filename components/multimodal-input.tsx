@@ -238,13 +238,36 @@ export function MultimodalInput({
       });
     };
 
+    // PDFs go through the binary upload endpoint and are referenced by id;
+    // fall back to an inline data URL if the upload fails.
+    const uploadFile = async (file: File): Promise<string | null> => {
+      try {
+        const form = new FormData();
+        form.append("file", file);
+        const res = await fetch("/api/upload", { method: "POST", body: form });
+        if (!res.ok) return null;
+        const json = await res.json();
+        return typeof json.documentId === "string" ? json.documentId : null;
+      } catch {
+        return null;
+      }
+    };
+
     const processSubmit = async () => {
       const attachmentData = await Promise.all(
-        attachments.map(async (file) => ({
-          name: file.name,
-          type: file.type,
-          content: await fileToDataUrl(file),
-        })),
+        attachments.map(async (file) => {
+          if (file.type === "application/pdf") {
+            const documentId = await uploadFile(file);
+            if (documentId) {
+              return { name: file.name, type: file.type, documentId };
+            }
+          }
+          return {
+            name: file.name,
+            type: file.type,
+            content: await fileToDataUrl(file),
+          };
+        }),
       );
 
       handleSubmit(undefined, {